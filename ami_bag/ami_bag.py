@@ -1,12 +1,14 @@
-import os, csv, re, logging
+import os, csv, re, time, logging
+from collections import OrderedDict
 
 import ami_bag.update_bag as update_bag
 import bagit
 
 # ami modules
 import ami_bag.ami_bag_constants as ami_bag_constants
-from ami_md.ami_excel import ami_excel
-import ami_md.ami_json as aj
+from ami_bag.bag_profiles import DEFAULT_PROFILES
+from ami_bag.manifest_store import ManifestStore
+from ami_metrics.metrics import METRICS, stage
 
 
 LOGGER = logging.getLogger(__name__)
@@ -22,131 +24,154 @@ class ami_bagValidationError(ami_BagError):
 
 class ami_bag(update_bag.Repairable_Bag):
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, lazy = False, profiles = None, **kwargs):
+        start = time.perf_counter()
         super(ami_bag, self).__init__(*args, **kwargs)
 
+        if profiles:
+            self.profiles = profiles
+        else:
+            self.profiles = DEFAULT_PROFILES
+
+        self._metadata_files = None
+        self._media_files_md = None
+        self.metadata_objects = {}
+        self.validation_results = OrderedDict()
+
         try:
             self.validate(completeness_only = True)
         except bagit.BagValidationError as e:
             raise ami_BagError("Unable to load bag, oxum or manifest is invalid")
 
-        self.data_files = set(self.payload_entries().keys())
-        self.data_exts = set([os.path.splitext(filename)[1].lower() for filename in self.data_files])
+        # the completeness check above means the manifest lists exactly
+        # the payload, so the checks can work from the compact manifest
+        self.manifest_store = ManifestStore.from_entries(self.payload_entries())
+        if self.manifest_store.malformed:
+            raise ami_BagError("Manifests contain malformed digests for: {}".format(
+                ", ".join(sorted(self.manifest_store.malformed))))
+        self.data_files = self.manifest_store
+        self.data_exts = self.manifest_store.extensions()
+        self.data_dirs = set(dirname[5:] for dirname in self.manifest_store.directories())
 
-        self.data_dirs = set([os.path.split(path)[0][5:] for path in self.data_files])
         if "PreservationMasters" not in self.data_dirs:
             raise ami_BagError("Payload does not contain a PreservationMasters directory")
 
-        self.media_filepaths = set([os.path.join(self.path, path) for
-            path in self.data_files if any(path.lower().endswith(ext) for ext in ami_bag_constants.MEDIA_EXTS)])
-        if not self.media_filepaths:
+        if not self.data_exts.intersection(ami_bag_constants.MEDIA_EXTS):
             raise ami_BagError("Payload does not contain files with accepted extensions: {}".format(
                 ami_bag_constants.MEDIA_EXTS
             ))
 
         self.set_type()
-        if self.type == "excel":
-            self.set_subtype_excel()
-            self.set_metadata_excel()
-        if self.type == "json":
-            self.set_subtype_json()
-            self.set_metadata_json()
-        if self.type == "excel-json":
-            self.set_subtype_exceljson()
-            self.set_metadata_json()
+        self.set_subtype()
+
+        if not lazy:
+            self.set_metadata()
 
+        METRICS.add("load_bag", time.perf_counter() - start, bag = self.path)
         LOGGER.info("{} successfully loaded as {} {} bag".format(
             self.path, self.type, self.subtype
         ))
 
 
-    def validate_amibag(self, fast = True, metadata = False):
+    @property
+    def media_filepaths(self):
         '''
-        run each of the validation checks against an AMI Bag
+        absolute paths of the media files, built when needed rather than
+        kept for the life of the bag
         '''
+        return set(os.path.join(self.path, path) for path in self.data_files
+            if os.path.splitext(path)[1].lower() in ami_bag_constants.MEDIA_EXTS)
+
 
+    def validate_amibag(self, fast = True, metadata = False, sample = None,
+        seed = 0, confidence = 0.95, quick = False):
+        '''
+        run each of the validation checks against an AMI Bag. With fast and
+        quick, also hash the files whose size or mtime changed since they
+        were last hashed; with fast and a sample fraction, a seeded sample
+        of the payload. The outcome of each check is kept in
+        validation_results.
+        '''
+
+        self.validation_results = OrderedDict()
         valid = True
         try:
-            self.validate(fast = fast, completeness_only = fast)
+            with stage("validate_bag", bag = self.path):
+                self.validate(fast = fast, completeness_only = True)
+            if not fast:
+                with stage("validate_fixity", bag = self.path) as record:
+                    record["bytes"] = self.inventory.total_bytes()
+                    self.validate_fixity()
+            elif quick:
+                with stage("validate_quick", bag = self.path):
+                    self.validate_quick()
+            elif sample:
+                with stage("validate_sample", bag = self.path):
+                    self.validate_sample(sample, seed = seed,
+                        confidence = confidence)
         except bagit.BagValidationError as e:
             LOGGER.warning("Error in bag: {0}".format(e.message))
+            self.validation_results["bag"] = e.message
             valid = False
+        else:
+            self.validation_results["bag"] = None
 
-        try:
-            self.check_filenames()
-        except ami_bagValidationError as e:
-            LOGGER.warning("Error in filenames: {0}".format(e.message))
-            valid = False
-
-        try:
-            self.check_simple_filenames()
-        except ami_bagValidationError as e:
-            LOGGER.warning("Error in filenames: {0}".format(e.message))
-            valid = False
-
-        try:
-            self.check_directory_depth()
-        except ami_bagValidationError as e:
-            LOGGER.error("Error in path names: {0}".format(e.message))
-            valid = False
-
-        try:
-            self.check_type()
-        except ami_bagValidationError as e:
-            LOGGER.error("Error in AMI bag type: {0}".format(e.message))
-            valid = False
+        valid &= self.run_check("filenames", self.check_filenames,
+            "Error in filenames", logging.WARNING)
+        valid &= self.run_check("simple_filenames", self.check_simple_filenames,
+            "Error in filenames", logging.WARNING)
+        valid &= self.run_check("directory_depth", self.check_directory_depth,
+            "Error in path names")
+        valid &= self.run_check("type", self.check_type,
+            "Error in AMI bag type")
 
         if self.type == "excel":
-            try:
-                self.check_bagstructure_excel()
-            except ami_bagValidationError as e:
-                LOGGER.error("Error in bag structure: {0}".format(e.message))
-                valid = False
+            valid &= self.run_check("bag_structure", self.check_bagstructure_excel,
+                "Error in bag structure")
 
             if metadata:
-                try:
-                    self.check_metadata_excel()
-                except ami_bagValidationError as e:
-                    LOGGER.error("Error in bag metadata: {0}".format(e.message))
-                    valid = False
-
-                try:
-                    self.check_filenames_manifest_and_metadata_excel()
-                except ami_bagValidationError as e:
-                    LOGGER.error("Error in bag metadata: {0}".format(e.message))
-                    valid = False
+                with stage("check_metadata", bag = self.path):
+                    valid &= self.run_check("metadata", self.check_metadata_excel,
+                        "Error in bag metadata")
+                    valid &= self.run_check("metadata_filenames",
+                        self.check_filenames_manifest_and_metadata_excel,
+                        "Error in bag metadata")
 
         else:
             if self.type == "json":
-                try:
-                    self.check_bagstructure_json()
-                except ami_bagValidationError as e:
-                    LOGGER.error("Error in AMI bag type: {0}".format(e.message))
-                    valid = False
+                valid &= self.run_check("bag_structure", self.check_bagstructure_json,
+                    "Error in AMI bag type")
 
             elif self.type == "excel-json":
-                try:
-                    self.check_bagstructure_exceljson()
-                except ami_bagValidationError as e:
-                    LOGGER.error("Error in AMI bag type: {0}".format(e.message))
-                    valid = False
+                valid &= self.run_check("bag_structure", self.check_bagstructure_exceljson,
+                    "Error in AMI bag type")
 
             if metadata:
-                try:
-                    self.check_metadata_json()
-                except ami_bagValidationError as e:
-                    LOGGER.error("Error in bag metadata: {0}".format(e.message))
-                    valid = False
-
-                try:
-                    self.check_filenames_manifest_and_metadata_json()
-                except ami_bagValidationError as e:
-                    LOGGER.error("Error in bag metadata: {0}".format(e.message))
-                    valid = False
+                with stage("check_metadata", bag = self.path):
+                    valid &= self.run_check("metadata", self.check_metadata_json,
+                        "Error in bag metadata")
+                    valid &= self.run_check("metadata_filenames",
+                        self.check_filenames_manifest_and_metadata_json,
+                        "Error in bag metadata")
 
         return valid
 
 
+    def run_check(self, name, check, description, level = logging.ERROR):
+        '''
+        run one check, log and record its outcome, and return whether it passed
+        '''
+        try:
+            check()
+        except ami_bagValidationError as e:
+            LOGGER.log(level, "{0}: {1}".format(description, e.message))
+            self.validation_results[name] = e.message
+            return False
+
+        self.validation_results[name] = None
+        return True
+
+
     def check_filenames(self):
         bad_filenames = []
 
@@ -224,51 +249,33 @@ class ami_bag(update_bag.Repairable_Bag):
         return True
 
 
-    def set_subtype_excel(self):
-        self.subtype = None
-
-        if (self.compare_structure(set(["Metadata", "PreservationMasters"])) and
-            self.compare_content(set([".mov", ".xlsx", ".old"]))):
-            self.subtype = "video"
-        elif (self.compare_structure(set(["Metadata", "PreservationMasters"])) and
-              self.compare_content(set([".iso", ".xlsx", ".old"]))):
-            self.subtype = "dvd"
-        elif (self.compare_structure(set(["Metadata", "PreservationMasters", "EditMasters"])) and
-              self.compare_content(set([".wav", ".xlsx", ".old"]))):
-            self.subtype = "audio"
-        elif (self.compare_structure(set(["Metadata", "PreservationMasters"])) and
-              self.compare_content(set([".wav", ".xlsx", ".old"]))):
-            self.subtype = "audio w/o edit masters"
-        elif (self.compare_structure(set(["Metadata", "ArchiveOriginals", "PreservationMasters", "EditMasters", "ProjectFiles", "ProjectFile"])) and
-              self.compare_content(set([".tar", ".mov", ".xlsx", ".fcp", ".prproj"]))):
-            self.subtype = "born-digital video"
-        elif (self.compare_structure(set(["Metadata", "ArchiveOriginals", "EditMasters"])) and
-              self.compare_content(set([".wav", ".xlsx", ".old"]))):
-            self.subtype = "born-digital audio"
+    def set_subtype(self):
+        self.subtype = self.profiles.match(self.type, self.data_dirs, self.data_exts)
 
         return True
 
 
+    def profile_candidates(self, bag_type = None):
+        '''
+        every known profile with the reasons this bag does not fit it
+        '''
+        return self.profiles.candidates(self.data_dirs, self.data_exts,
+            bag_type = bag_type)
+
+
+    def profile_mismatches(self):
+        return "\n".join("{} {}: {}".format(candidate.profile.type,
+            candidate.profile.subtype, "; ".join(candidate.reasons))
+            for candidate in self.profile_candidates(self.type))
+
+
     def check_bagstructure_excel(self):
         expected_dirs = set(["Metadata", "PreservationMasters", "EditMasters", "ArchiveOriginals", "ProjectFiles"])
         if not self.compare_structure(expected_dirs):
             self.raise_bagerror("AMI Excel bags may only have the following directories\nFound: {0}\nExpected: {1}".format(self.data_dirs, expected_dirs))
 
         if not self.subtype:
-            self.raise_bagerror("Bag does not match an existing profile for AMI Excel bags\nExtensions Found: {0}\nDirectories Found: {1}".format(self.data_exts, self.data_dirs))
-
-        return True
-
-
-    def set_subtype_json(self):
-        self.subtype = None
-
-        if (self.compare_structure(set(["Metadata", "PreservationMasters", "ServiceCopies", "Images"])) and
-            self.compare_content(set([".mov", ".json", ".mp4", ".jpeg", ".jpg"]))):
-            self.subtype = "video"
-        elif (self.compare_structure(set(["Metadata", "PreservationMasters", "EditMasters", "Images"])) and
-            self.compare_content(set([".wav", ".json", ".jpeg", ".jpg"]))):
-            self.subtype = "audio"
+            self.raise_bagerror("Bag does not match an existing profile for AMI Excel bags\nExtensions Found: {0}\nDirectories Found: {1}\n{2}".format(self.data_exts, self.data_dirs, self.profile_mismatches()))
 
         return True
 
@@ -280,20 +287,7 @@ class ami_bag(update_bag.Repairable_Bag):
             self.raise_bagerror("JSON bags may only have the following directories - {}".format(expected_dirs))
 
         if not self.subtype:
-            self.raise_bagerror("Bag does not match an existing profile for JSON bags\nExtensions Found: {0}\nDirectories Found: {1}".format(self.data_exts, self.data_dirs))
-
-        return True
-
-
-    def set_subtype_exceljson(self):
-        self.subtype = None
-
-        if (self.compare_structure(set(["Metadata", "PreservationMasters", "ServiceCopies", "Images"])) and
-            self.compare_content(set([".mov", ".xlsx", ".json", ".mp4", ".jpeg"]))):
-            self.subtype = "video"
-        elif (self.compare_structure(set(["Metadata", "PreservationMasters", "EditMasters", "Images"])) and
-            self.compare_content(set([".wav", ".xlsx", ".json", ".jpeg"]))):
-            self.subtype = "audio"
+            self.raise_bagerror("Bag does not match an existing profile for JSON bags\nExtensions Found: {0}\nDirectories Found: {1}\n{2}".format(self.data_exts, self.data_dirs, self.profile_mismatches()))
 
         return True
 
@@ -305,29 +299,70 @@ class ami_bag(update_bag.Repairable_Bag):
             self.raise_bagerror("Excel JSON bags may only have the following directories - {}".format(expected_dirs))
 
         if not self.subtype:
-            self.raise_bagerror("Bag does not match an existing profile for Excel JSON bags\nExtensions Found: {0}\nDirectories Found: {1}".format(self.data_exts, self.data_dirs))
+            self.raise_bagerror("Bag does not match an existing profile for Excel JSON bags\nExtensions Found: {0}\nDirectories Found: {1}\n{2}".format(self.data_exts, self.data_dirs, self.profile_mismatches()))
 
         return True
 
 
+    @property
+    def metadata_files(self):
+        if self._metadata_files is None:
+            self.set_metadata()
+        return self._metadata_files
+
+
+    @property
+    def media_files_md(self):
+        if self._media_files_md is None:
+            self.set_metadata()
+        return self._media_files_md
+
+
+    def set_metadata(self):
+        '''
+        parse the metadata files for the bag type, normally on first use
+        '''
+        if self.type == "excel":
+            self.set_metadata_excel()
+        else:
+            self.set_metadata_json()
+
+
+    def get_metadata_object(self, filename):
+        '''
+        parse an Excel or JSON metadata file once and keep it for later checks
+        '''
+        if filename not in self.metadata_objects:
+            filepath = os.path.join(self.path, filename)
+            # importing ami_md pulls in pandas, so wait until metadata is needed
+            if os.path.splitext(filename)[1] == ".xlsx":
+                from ami_md.ami_excel import ami_excel
+                self.metadata_objects[filename] = ami_excel(filepath)
+            else:
+                import ami_md.ami_json as aj
+                self.metadata_objects[filename] = aj.ami_json(filepath = filepath)
+
+        return self.metadata_objects[filename]
+
+
     def set_metadata_excel(self):
-        self.metadata_files = [filename for filename in self.data_files if os.path.splitext(filename)[1] == ".xlsx"]
+        self._metadata_files = [filename for filename in self.data_files if os.path.splitext(filename)[1] == ".xlsx"]
 
-        self.media_files_md = []
+        media_files_md = []
 
-        for filename in self.metadata_files:
-            excel = ami_excel(os.path.join(self.path, filename))
+        for filename in self._metadata_files:
+            excel = self.get_metadata_object(filename)
 
             # collect list of filenames in metadata
             if excel.pres_sheet:
                 paths = excel.pres_sheet.sheet_values["asset.referenceFilename"].tolist()
-                self.media_files_md.extend(paths)
+                media_files_md.extend(paths)
             if excel.edit_sheet:
                 if "asset.referenceFilename" in excel.edit_sheet.sheet_values.columns:
                     paths = excel.edit_sheet.sheet_values["asset.referenceFilename"].tolist()
-                    self.media_files_md.extend(paths)
+                    media_files_md.extend(paths)
 
-        self.media_files_md = set(self.media_files_md)
+        self._media_files_md = set(media_files_md)
 
         return
 
@@ -339,7 +374,7 @@ class ami_bag(update_bag.Repairable_Bag):
         bad_excel = []
 
         for filename in self.metadata_files:
-            excel = ami_excel(os.path.join(self.path, filename))
+            excel = self.get_metadata_object(filename)
             if not excel.validate_workbook():
                 bad_excel.append(filename)
 
@@ -359,17 +394,17 @@ class ami_bag(update_bag.Repairable_Bag):
 
 
     def set_metadata_json(self):
-        self.metadata_files = [filename for filename in self.data_files if os.path.splitext(filename)[1] == ".json"]
+        self._metadata_files = [filename for filename in self.data_files if os.path.splitext(filename)[1] == ".json"]
 
-        self.media_files_md = []
+        media_files_md = []
 
-        for filename in self.metadata_files:
-            json = aj.ami_json(filepath = os.path.join(self.path, filename))
+        for filename in self._metadata_files:
+            json = self.get_metadata_object(filename)
             filename = json.dict["technical"]["filename"]
             ext = json.dict["technical"]["extension"]
-            self.media_files_md.append(filename + '.' + ext)
+            media_files_md.append(filename + '.' + ext)
 
-        self.media_files_md = set(self.media_files_md)
+        self._media_files_md = set(media_files_md)
 
         return
 
@@ -382,12 +417,12 @@ class ami_bag(update_bag.Repairable_Bag):
 
         for filename in self.metadata_files:
             json_filepath = os.path.join(self.path, filename)
-            json = aj.ami_json(filepath = json_filepath)
+            json = self.get_metadata_object(filename)
             ext = json.dict['technical']['extension']
-            json.set_mediafilepath(json_filepath.replace('json', ext))
+            json.set_mediafilepath(os.path.splitext(json_filepath)[0] + '.' + ext)
             try:
                 json.validate_json()
-            except:
+            except Exception:
                 bad_json.append(filename)
 
         if bad_json:
@@ -409,7 +444,7 @@ class ami_bag(update_bag.Repairable_Bag):
         self.excel_metadata = [filename for filename in self.data_files if os.path.splitext(filename)[1] == ".xlsx"]
 
         for filename in self.excel_metadata:
-            excel = ami_excel(os.path.join(self.path, filename))
+            excel = self.get_metadata_object(filename)
 
             if excel.edit_sheet:
                 em_path = os.path.join(self.path, "data/EditMasters")
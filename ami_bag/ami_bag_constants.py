@@ -1,4 +1,5 @@
 import re
+from collections import OrderedDict
 
 FILENAME_REGEX = re.compile(
     "[a-z]{3}_[a-z0-9]+_v\d{2}(([frspt]\d{2})+)?_(pm|em|sc|pf|assetfront|assetback|ephemera)\.[a-z0-9]+",
@@ -23,32 +24,44 @@ EXCEL_EXT = ".xlsx"
 EDITEDEXCEL_EXT = ".old"
 JSON_EXT = ".json"
 JPEG_EXT = ".jpeg"
+JPG_EXT = ".jpg"
 
 MEDIA_EXTS = [MOV_EXT, MKV_EXT, MP4_EXT, ISO_EXT, TAR_EXT, WAV_EXT]
 
-EXCEL_SUBTYPES = {
-    "video": ([MD_DIR, PM_DIR],
-        [EXCEL_EXT, EDITEDEXCEL_EXT, MOV_EXT]),
-    "dvd": ([MD_DIR, PM_DIR],
-        [EXCEL_EXT, EDITEDEXCEL_EXT, ISO_EXT]),
-    "audio": ([MD_DIR, PM_DIR, EM_DIR],
-        [EXCEL_EXT, EDITEDEXCEL_EXT, WAV_EXT]),
-    "audio w/o edit masters": ([MD_DIR, PM_DIR],
-        [EXCEL_EXT, EDITEDEXCEL_EXT, WAV_EXT]),
-    "born-digital video": ([MD_DIR, AO_DIR, EM_DIR],
-        [EXCEL_EXT, EDITEDEXCEL_EXT, TAR_EXT, MOV_EXT]),
-    "born-digital audio": ([MD_DIR, AO_DIR, EM_DIR],
-        [EXCEL_EXT, EDITEDEXCEL_EXT, WAV_EXT])
-}
-
-EXCEL_SUBTYPES = {
-    "video": ([PM_DIR, SC_DIR, IM_DIR],
-        [JSON_EXT, MOV_EXT, MKV_EXT, MP4_EXT, JPEG_EXT]),
-    "audio": ([PM_DIR, SC_DIR, IM_DIR],
-        [JSON_EXT, WAV_EXT, JPEG_EXT])
-}
-
-EXCELJSON_SUBTYPES = {
-    "audio": ([MD_DIR, PM_DIR, SC_DIR, IM_DIR],
-        [EXCEL_EXT, EDITEDEXCEL_EXT, JSON_EXT, WAV_EXT, JPEG_EXT])
-}
+# Profiles are checked in order and the first match sets the subtype. A
+# bag matches when its data/ directories and file extensions are subsets of
+# the profile's.
+EXCEL_SUBTYPES = OrderedDict([
+    ("video", ([MD_DIR, PM_DIR],
+        [EXCEL_EXT, EDITEDEXCEL_EXT, MOV_EXT])),
+    ("dvd", ([MD_DIR, PM_DIR],
+        [EXCEL_EXT, EDITEDEXCEL_EXT, ISO_EXT])),
+    ("audio", ([MD_DIR, PM_DIR, EM_DIR],
+        [EXCEL_EXT, EDITEDEXCEL_EXT, WAV_EXT])),
+    ("audio w/o edit masters", ([MD_DIR, PM_DIR],
+        [EXCEL_EXT, EDITEDEXCEL_EXT, WAV_EXT])),
+    ("born-digital video", ([MD_DIR, AO_DIR, PM_DIR, EM_DIR, PF_DIR, "ProjectFile"],
+        [EXCEL_EXT, TAR_EXT, MOV_EXT, ".fcp", ".prproj"])),
+    ("born-digital audio", ([MD_DIR, AO_DIR, EM_DIR],
+        [EXCEL_EXT, EDITEDEXCEL_EXT, WAV_EXT]))
+])
+
+JSON_SUBTYPES = OrderedDict([
+    ("video", ([MD_DIR, PM_DIR, SC_DIR, IM_DIR],
+        [JSON_EXT, MOV_EXT, MP4_EXT, JPEG_EXT, JPG_EXT])),
+    ("audio", ([MD_DIR, PM_DIR, EM_DIR, IM_DIR],
+        [JSON_EXT, WAV_EXT, JPEG_EXT, JPG_EXT]))
+])
+
+EXCELJSON_SUBTYPES = OrderedDict([
+    ("video", ([MD_DIR, PM_DIR, SC_DIR, IM_DIR],
+        [EXCEL_EXT, JSON_EXT, MOV_EXT, MP4_EXT, JPEG_EXT])),
+    ("audio", ([MD_DIR, PM_DIR, EM_DIR, IM_DIR],
+        [EXCEL_EXT, JSON_EXT, WAV_EXT, JPEG_EXT]))
+])
+
+BAG_SUBTYPES = OrderedDict([
+    ("excel", EXCEL_SUBTYPES),
+    ("json", JSON_SUBTYPES),
+    ("excel-json", EXCELJSON_SUBTYPES)
+])
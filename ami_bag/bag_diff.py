@@ -0,0 +1,110 @@
+import os, logging
+from collections import namedtuple
+
+import bagit
+
+from ami_bag.manifest_store import ManifestStore
+from ami_bag.duplicate_index import find_bags
+
+
+LOGGER = logging.getLogger(__name__)
+
+BagDiff = namedtuple("BagDiff",
+  ["added", "missing", "changed", "size_changed", "malformed", "oxum"])
+
+RootDiff = namedtuple("RootDiff", ["added", "missing", "bags"])
+
+
+def read_oxum(bag_path):
+  """
+  Payload-Oxum from a bag's bag-info.txt, or None
+  """
+  info_path = os.path.join(bag_path, "bag-info.txt")
+  if not os.path.isfile(info_path):
+    return None
+  oxum = bagit._load_tag_file(info_path).get("Payload-Oxum")
+  if isinstance(oxum, list):
+    oxum = oxum[0]
+  return oxum
+
+
+def file_size(bag_path, rel_path):
+  try:
+    return os.stat(os.path.join(bag_path, rel_path)).st_size
+  except OSError:
+    return None
+
+
+def diff_bags(bag_a, bag_b, sizes = True, store_a = None, store_b = None):
+  """
+  compare two bags by their manifests, Payload-Oxums and, with sizes,
+  the sizes of their files, without reading any payload. Returns a
+  BagDiff of the paths only in bag_b (added), only in bag_a (missing),
+  with different digests for a shared algorithm (changed), and with
+  matching digests but different sizes on disk (size_changed), with a
+  malformed manifest digest in either bag (malformed), and the pair of
+  Payload-Oxums. Malformed digests are left out of the comparison, so
+  they do not throw off the other entries. Both stores are sorted, so
+  they are walked together once.
+  """
+  if store_a is None:
+    store_a = ManifestStore.from_manifests(bag_a)
+  if store_b is None:
+    store_b = ManifestStore.from_manifests(bag_b)
+
+  if not set(store_a.algs) & set(store_b.algs):
+    LOGGER.warning("{} and {} have no manifest algorithm in common, comparing sizes only".format(
+      bag_a, bag_b))
+
+  added = []
+  missing = []
+  changed = []
+  size_changed = []
+
+  items_a = store_a.items()
+  items_b = store_b.items()
+  entry_a = next(items_a, None)
+  entry_b = next(items_b, None)
+  while entry_a or entry_b:
+    if entry_b is None or (entry_a and entry_a[0] < entry_b[0]):
+      missing.append(entry_a[0])
+      entry_a = next(items_a, None)
+    elif entry_a is None or entry_b[0] < entry_a[0]:
+      added.append(entry_b[0])
+      entry_b = next(items_b, None)
+    else:
+      path, hashes_a = entry_a
+      hashes_b = entry_b[1]
+      shared = set(hashes_a) & set(hashes_b)
+      if any(hashes_a[alg].lower() != hashes_b[alg].lower() for alg in shared):
+        changed.append(path)
+      elif sizes and file_size(bag_a, path) != file_size(bag_b, path):
+        size_changed.append(path)
+      entry_a = next(items_a, None)
+      entry_b = next(items_b, None)
+
+  malformed = sorted(set(store_a.malformed) | set(store_b.malformed))
+  return BagDiff(added, missing, changed, size_changed, malformed,
+    (read_oxum(bag_a), read_oxum(bag_b)))
+
+
+def bags_match(diff):
+  return (not (diff.added or diff.missing or diff.changed or diff.size_changed
+    or diff.malformed) and diff.oxum[0] == diff.oxum[1])
+
+
+def diff_roots(root_a, root_b, sizes = True):
+  """
+  pair the bags under two roots by their path below the root and diff
+  each pair. Returns a RootDiff of the bags only under root_b (added),
+  only under root_a (missing), and {relative path: BagDiff}.
+  """
+  bags_a = set(os.path.relpath(bag_path, root_a) for bag_path in find_bags(root_a))
+  bags_b = set(os.path.relpath(bag_path, root_b) for bag_path in find_bags(root_b))
+
+  diffs = {}
+  for rel_path in sorted(bags_a & bags_b):
+    diffs[rel_path] = diff_bags(os.path.join(root_a, rel_path),
+      os.path.join(root_b, rel_path), sizes = sizes)
+
+  return RootDiff(sorted(bags_b - bags_a), sorted(bags_a - bags_b), diffs)
@@ -0,0 +1,151 @@
+import json, logging
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+import ami_bag.ami_bag_constants as ami_bag_constants
+
+
+LOGGER = logging.getLogger(__name__)
+
+BagProfile = namedtuple("BagProfile",
+    ["type", "subtype", "directories", "extensions", "dir_mask", "ext_mask"])
+
+ProfileCandidate = namedtuple("ProfileCandidate", ["profile", "reasons"])
+
+
+class ProfileRegistry:
+    '''
+    Ordered AMI bag profiles compiled to bitmasks. A bag matches a profile
+    when its data/ directories and extensions are subsets of the profile's,
+    which is a pair of mask tests, and the first match for each signature is
+    remembered so surveys of many similar bags skip the comparisons.
+    '''
+
+    def __init__(self, subtypes):
+        '''
+        subtypes maps a bag type to an ordered mapping of subtype to a
+        (directories, extensions) pair, like ami_bag_constants.BAG_SUBTYPES
+        '''
+        self.dir_bits = {}
+        self.ext_bits = {}
+        self.profiles = OrderedDict()
+        self.matches = {}
+
+        for bag_type, profiles in subtypes.items():
+            self.profiles[bag_type] = []
+            for subtype, (directories, extensions) in profiles.items():
+                profile = BagProfile(bag_type, subtype,
+                    frozenset(directories), frozenset(extensions),
+                    self.compile(directories, self.dir_bits),
+                    self.compile(extensions, self.ext_bits))
+                self.profiles[bag_type].append(profile)
+
+
+    @classmethod
+    def from_constants(cls):
+        return cls(ami_bag_constants.BAG_SUBTYPES)
+
+
+    @classmethod
+    def from_file(cls, path):
+        '''
+        load profiles from JSON shaped like
+        {"json": {"video": {"directories": [...], "extensions": [...]}}}
+        '''
+        with open(path, 'r') as f:
+            data = json.load(f, object_pairs_hook = OrderedDict)
+
+        subtypes = OrderedDict()
+        for bag_type, profiles in data.items():
+            subtypes[bag_type] = OrderedDict(
+                (subtype, (profile["directories"], profile["extensions"]))
+                for subtype, profile in profiles.items())
+
+        return cls(subtypes)
+
+
+    def compile(self, names, bits):
+        mask = 0
+        for name in names:
+            if name not in bits:
+                bits[name] = 1 << len(bits)
+            mask |= bits[name]
+        return mask
+
+
+    def signature(self, directories, extensions):
+        '''
+        masks for a bag's directories and extensions. Names that no profile
+        allows set a bit beyond every profile's mask so nothing matches.
+        '''
+        return (self.mask(directories, self.dir_bits),
+            self.mask(extensions, self.ext_bits))
+
+
+    def mask(self, names, bits):
+        mask = 0
+        unknown = 1 << len(bits)
+        for name in names:
+            mask |= bits.get(name, unknown)
+        return mask
+
+
+    def match(self, bag_type, directories, extensions):
+        '''
+        subtype of the first profile for bag_type that fits, or None
+        '''
+        dir_mask, ext_mask = self.signature(directories, extensions)
+        key = (bag_type, dir_mask, ext_mask)
+        if key not in self.matches:
+            self.matches[key] = None
+            for profile in self.profiles.get(bag_type, []):
+                if (not dir_mask & ~profile.dir_mask and
+                    not ext_mask & ~profile.ext_mask):
+                    self.matches[key] = profile.subtype
+                    break
+
+        return self.matches[key]
+
+
+    def candidates(self, directories, extensions, bag_type = None):
+        '''
+        every profile, or every profile for bag_type, in order with the
+        reasons the bag does not fit it. Matches have no reasons.
+        '''
+        directories = set(directories)
+        extensions = set(extensions)
+
+        if bag_type:
+            profiles = self.profiles.get(bag_type, [])
+        else:
+            profiles = [profile for profiles in self.profiles.values()
+                for profile in profiles]
+
+        candidates = []
+        for profile in profiles:
+            reasons = []
+            extra_dirs = directories - profile.directories
+            if extra_dirs:
+                reasons.append("unexpected directories: {}".format(
+                    ", ".join(sorted(extra_dirs))))
+            extra_exts = extensions - profile.extensions
+            if extra_exts:
+                reasons.append("unexpected extensions: {}".format(
+                    ", ".join(sorted(extra_exts))))
+            candidates.append(ProfileCandidate(profile, reasons))
+
+        return candidates
+
+
+DEFAULT_PROFILES = ProfileRegistry.from_constants()
+
+
+@lru_cache(maxsize = None)
+def load_profiles(path = None):
+    '''
+    registry from a profile file, or the default one, shared by every bag
+    checked in a process so matches are remembered across bags
+    '''
+    if path:
+        return ProfileRegistry.from_file(path)
+    return DEFAULT_PROFILES
@@ -0,0 +1,40 @@
+import os, csv, json, logging
+
+
+LOGGER = logging.getLogger(__name__)
+
+REPORT_EXTENSIONS = (".json", ".csv")
+
+
+def report_file(report_path):
+    '''
+    report path from the command line, checked before any bag is run
+    '''
+    if os.path.splitext(report_path)[1].lower() not in REPORT_EXTENSIONS:
+        raise ValueError("Report must be a .json or .csv file: {}".format(report_path))
+    return report_path
+
+
+def write_report(results, report_path):
+    '''
+    write one row per bag to a JSON or CSV file, chosen by the extension
+    '''
+    results = sorted(results, key = lambda result: result["path"])
+    ext = os.path.splitext(report_path)[1].lower()
+
+    if ext == ".json":
+        with open(report_path, 'w') as f:
+            json.dump(results, f, indent = 2)
+    elif ext == ".csv":
+        fields = []
+        for result in results:
+            fields.extend(key for key in result.keys() if key not in fields)
+        with open(report_path, 'w', newline = '') as f:
+            csvwriter = csv.DictWriter(f, fieldnames = fields,
+                quoting = csv.QUOTE_ALL)
+            csvwriter.writeheader()
+            csvwriter.writerows(results)
+    else:
+        raise ValueError("Report must be a .json or .csv file: {}".format(report_path))
+
+    LOGGER.info("Report written to {}".format(report_path))
@@ -0,0 +1,173 @@
+import os, time, logging
+
+from ami_bag.ami_bag import ami_bag
+from ami_bag.fixity_cache import FixityCache, default_cache_path
+from ami_bag.hash_checkpoint import HashCheckpoint, default_checkpoint_path
+from ami_bag.bag_profiles import load_profiles
+from ami_bag.fixity_io import STRATEGIES, parse_size, read_options
+from ami_bag.results_store import ResultsStore, default_results_path, bag_digest, fixity_level
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def configure_logging(args):
+    log_format = "%(asctime)s - %(levelname)s - %(message)s"
+    if args.quiet:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+    if args.log:
+        logging.basicConfig(filename=args.log, level=level, format=log_format)
+    else:
+        logging.basicConfig(level=level, format=log_format)
+
+
+def add_validation_arguments(parser):
+    '''
+    options read by validate_bag, shared by the scripts that validate AMI bags
+    '''
+    parser.add_argument("--slow", action='store_false',
+                        help = "Recalculate hashes (very slow)")
+    parser.add_argument("--quick", action='store_true',
+                        help = "Hash only files whose size or mtime changed since they were last hashed into the fixity cache")
+    parser.add_argument("--sample", type=float, nargs='?', default=None, const=0.05,
+                        help = "Hash this fraction of each bag's files, more of the PreservationMasters (default: 0.05)")
+    parser.add_argument("--sample-seed", type=int, default=0,
+                        help = "Seed for choosing the sample, to repeat a run")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help = "Confidence level for the number of bad files a sample could miss")
+    parser.add_argument("--metadata", action='store_true',
+                        help = "Validate Excel metadata files")
+    parser.add_argument("--profiles",
+                        help = "Path to a .json file of bag profiles to use instead of the built-in ones")
+    parser.add_argument("--fixity-cache", nargs='?', default=None,
+                        const=default_cache_path(),
+                        help = "Reuse digests of unchanged files from a cache (default location if no path is given)")
+    parser.add_argument("--cache-max-age", type=float, default=None,
+                        help = "Re-read files whose cached digests are older than this many days. Without it, --slow runs that use the cache are recorded as quick")
+    parser.add_argument("--resume-hashing", action='store_true',
+                        help = "Reuse the digests of unchanged files hashed by an interrupted run of each bag")
+    parser.add_argument("--read-block-size", type=parse_size, default=None,
+                        help = "Bytes to read at a time when hashing, e.g. 64K or 8M (default: 1M)")
+    parser.add_argument("--read-strategy", choices=STRATEGIES, default=None,
+                        help = "How to read files when hashing (default: fadvise)")
+    parser.add_argument("--drop-cache", action='store_true',
+                        help = "Evict hashed files from the page cache as they are read")
+    parser.add_argument("--results-db", nargs='?', default=None,
+                        const=default_results_path(),
+                        help = "Record results in a database (default location if no path is given)")
+    parser.add_argument("--skip-unchanged", action='store_true',
+                        help = "Skip bags whose manifests and bag-info.txt match a passing run in --results-db")
+    return parser
+
+
+def apply_validation_defaults(args):
+    '''
+    fill in the databases implied by other options
+    '''
+    if args.skip_unchanged and not args.results_db:
+        args.results_db = default_results_path()
+    if args.quick and not args.fixity_cache:
+        args.fixity_cache = default_cache_path()
+    return args
+
+
+def validate_bag(bagpath, args):
+    '''
+    validate one AMI bag with the options from add_validation_arguments and
+    return a result for reports, recording it in the results database
+    '''
+    result = {"bag": os.path.basename(bagpath), "path": bagpath,
+        "valid": False, "type": None, "subtype": None, "error": None}
+    start = time.time()
+    fast = args.slow
+    metadata = args.metadata
+    checks = {}
+
+    if args.results_db:
+        store = ResultsStore(args.results_db)
+        digest = bag_digest(bagpath)
+        level = fixity_level(fast, args.sample, args.quick,
+            unbounded_cache = bool(args.fixity_cache) and args.cache_max_age is None)
+        previous = None
+        if args.skip_unchanged:
+            previous = store.lookup(bagpath, digest, level, metadata)
+        if previous:
+            store.close()
+            LOGGER.info("Skipping {}, unchanged since it passed on {}".format(
+                bagpath, previous["validated"]))
+            result.update(valid = True, type = previous["type"],
+                subtype = previous["subtype"], skipped = True,
+                seconds = round(time.time() - start, 3))
+            return result
+    else:
+        store = None
+
+    if args.fixity_cache:
+        cache = FixityCache(args.fixity_cache, max_age = args.cache_max_age)
+    else:
+        cache = None
+
+    if not fast:
+        checkpoint = HashCheckpoint(default_checkpoint_path(bagpath),
+            resume = args.resume_hashing)
+    else:
+        checkpoint = None
+
+    LOGGER.info("Checking: {}".format(bagpath))
+    try:
+        bag = ami_bag(path = bagpath, fixity_cache = cache,
+            checkpoint = checkpoint, lazy = not metadata,
+            profiles = load_profiles(args.profiles),
+            read_options = read_options(args.read_block_size,
+                args.read_strategy, args.drop_cache))
+    except Exception as e:
+        LOGGER.error("Following error encountered while loading {}: {}".format(bagpath, e))
+        result["error"] = str(e)
+    else:
+        result["type"] = bag.type
+        result["subtype"] = bag.subtype
+        try:
+            valid = bag.validate_amibag(fast = fast, metadata = metadata,
+                sample = args.sample, seed = args.sample_seed,
+                confidence = args.confidence, quick = args.quick)
+        except Exception as e:
+            LOGGER.error("Following error encountered while validating {}: {}".format(bagpath, e))
+            result["error"] = str(e)
+            valid = False
+
+        if valid:
+            LOGGER.info("Valid {} {} bag: {}".format(bag.type, bag.subtype, bagpath))
+            result["valid"] = True
+        else:
+            LOGGER.error("Invalid bag: {}".format(bagpath))
+
+        checks = bag.validation_results
+        if bag.sample_summary:
+            result["sampled_files"] = bag.sample_summary["sampled"]
+            result["max_bad_files"] = bag.sample_summary["max_bad_files"]
+        if bag.quick_summary:
+            result["hashed_files"] = bag.quick_summary["hashed"]
+    finally:
+        if cache:
+            cache.close()
+        if checkpoint:
+            checkpoint.close(remove = checkpoint.empty())
+
+    result["seconds"] = round(time.time() - start, 3)
+    if store:
+        store.record(result, digest, level, metadata, checks)
+        store.close()
+    return result
+
+
+def record_result(record):
+    '''
+    result of a batch record, standing in for bags that failed or timed out
+    before validate_bag returned
+    '''
+    if record["outcome"]:
+        return record["outcome"]
+    return {"bag": os.path.basename(record["bag"]), "path": record["bag"],
+        "valid": False, "type": None, "subtype": None, "error": record["error"]}
@@ -0,0 +1,285 @@
+import os, glob, time, errno, select, struct, logging
+import ctypes, ctypes.util
+
+
+LOGGER = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+    IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+def list_bags(root):
+    '''
+    directories directly under root, each a bag or a bag being copied
+    '''
+    return [entry.path for entry in os.scandir(root)
+        if entry.is_dir() and not entry.name.startswith(".")]
+
+
+def has_tagmanifest(bag_path):
+    return bool(glob.glob(os.path.join(glob.escape(bag_path), "tagmanifest-*.txt")))
+
+
+def bag_signature(bag_path):
+    '''
+    number of files, total bytes and latest mtime under a directory, which
+    stop changing once a copy is finished
+    '''
+    files = 0
+    total = 0
+    latest = 0
+    stack = [bag_path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks = False):
+                    stack.append(entry.path)
+                    continue
+                stat = entry.stat(follow_symlinks = False)
+            except OSError:
+                continue
+            files += 1
+            total += stat.st_size
+            latest = max(latest, stat.st_mtime_ns)
+
+    return (files, total, latest)
+
+
+class InotifyWatcher:
+    '''
+    Linux inotify through ctypes. Watches root and every directory below it
+    and reports which top level directories saw changes.
+    '''
+
+    def __init__(self, root):
+        self.root = root
+        self.watches = {}
+
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError(errno.ENOSYS, "C library not found")
+        self.libc = ctypes.CDLL(libc_name, use_errno = True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        self.add_tree(root)
+
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                LOGGER.warning("Out of inotify watches, raise fs.inotify.max_user_watches to watch {}".format(path))
+            elif err != errno.ENOENT:
+                LOGGER.warning("Unable to watch {}: {}".format(path, os.strerror(err)))
+            return False
+
+        self.watches[wd] = path
+        return True
+
+
+    def add_tree(self, path):
+        self.add_watch(path)
+        for dirpath, dirnames, filenames in os.walk(path):
+            for dirname in dirnames:
+                self.add_watch(os.path.join(dirpath, dirname))
+
+
+    def bag_for(self, path):
+        relpath = os.path.relpath(path, self.root)
+        if relpath == "." or relpath.startswith(".."):
+            return None
+        return os.path.join(self.root, relpath.split(os.sep)[0])
+
+
+    def changes(self, timeout):
+        '''
+        top level directories changed within timeout seconds
+        '''
+        changed = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed
+
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    LOGGER.warning("inotify queue overflowed, rechecking every bag")
+                    changed.update(list_bags(self.root))
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+
+                directory = self.watches.get(wd)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, name) if name else directory
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    # files copied in before the watch was added have no events
+                    self.add_tree(path)
+                bag = self.bag_for(path)
+                if bag:
+                    changed.add(bag)
+
+        return changed
+
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    '''
+    Fallback for systems or filesystems without inotify, such as network
+    shares mounted from another host: compare every bag's signature each
+    interval.
+    '''
+
+    def __init__(self, root):
+        self.root = root
+        self.signatures = {}
+
+
+    def changes(self, timeout):
+        time.sleep(timeout)
+        changed = set()
+        bags = list_bags(self.root)
+        for bag in bags:
+            signature = bag_signature(bag)
+            if self.signatures.get(bag) != signature:
+                self.signatures[bag] = signature
+                changed.add(bag)
+        for bag in set(self.signatures) - set(bags):
+            del self.signatures[bag]
+            changed.add(bag)
+
+        return changed
+
+
+    def close(self):
+        pass
+
+
+class BagWatcher:
+    '''
+    Watch a directory that bags are copied into and hand back each bag once
+    its copy looks finished: it has a tag manifest, nothing under it changed
+    for settle seconds, and its file count, size and mtimes were the same at
+    two checks settle seconds apart. A bag is handed back again only if it
+    changes afterwards.
+    '''
+
+    def __init__(self, root, settle = 60, interval = 5, polling = False,
+        clock = time.monotonic):
+        self.root = os.path.abspath(root)
+        self.settle = settle
+        self.interval = interval
+        self.clock = clock
+        self.pending = {}
+        self.validated = {}
+
+        self.backend = None
+        if not polling:
+            try:
+                self.backend = InotifyWatcher(self.root)
+            except OSError as e:
+                LOGGER.warning("inotify unavailable ({}), polling {} every {} seconds".format(
+                    e, self.root, interval))
+        if not self.backend:
+            self.backend = PollingWatcher(self.root)
+
+        for bag in list_bags(self.root):
+            self.mark(bag)
+
+
+    def mark(self, bag):
+        signature = self.pending.get(bag, (None, None))[1]
+        self.pending[bag] = (self.clock(), signature)
+
+
+    def ready(self):
+        '''
+        pending bags that have settled
+        '''
+        now = self.clock()
+        ready = []
+        for bag, (changed_at, signature) in sorted(self.pending.items()):
+            if now - changed_at < self.settle:
+                continue
+
+            if not os.path.isdir(bag):
+                del self.pending[bag]
+                self.validated.pop(bag, None)
+                continue
+
+            current = bag_signature(bag)
+            if not has_tagmanifest(bag) or current != signature:
+                self.pending[bag] = (now, current)
+                continue
+
+            del self.pending[bag]
+            if self.validated.get(bag) != current:
+                self.validated[bag] = current
+                ready.append(bag)
+
+        return ready
+
+
+    def poll(self, timeout = None):
+        '''
+        wait up to timeout seconds (default: interval) for changes and
+        return the bags that are ready
+        '''
+        if timeout is None:
+            timeout = self.interval
+        for bag in self.backend.changes(timeout):
+            self.mark(bag)
+
+        return self.ready()
+
+
+    def __iter__(self):
+        while True:
+            for bag in self.poll():
+                yield bag
+
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,245 @@
+import os, json, time, signal, hashlib, logging, threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from tqdm import tqdm
+
+from ami_bag.fixity_cache import default_cache_path
+from ami_bag.device_scheduler import DeviceScheduler
+from ami_metrics.metrics import METRICS, measured, collect
+
+
+LOGGER = logging.getLogger(__name__)
+
+# done: the bag's function returned a result that counts as a success,
+# failed: it raised or returned a failure, timeout: it ran out of time
+STATUSES = ("done", "failed", "timeout")
+
+
+class BagTimeout(BaseException):
+    # not an Exception, so handlers for Exception let it through. Bare
+    # excepts still catch it, and an interrupted write can leave a bag
+    # invalid, so only scripts that do not change bags take a time limit
+    pass
+
+
+def default_journal_path(name, sources):
+    '''
+    journal location for a script run over some directories or bags, in
+    the user's cache directory
+    '''
+    key = hashlib.sha1("\0".join([name] + sorted(
+        os.path.abspath(source) for source in sources)).encode('utf-8')).hexdigest()
+    return os.path.join(os.path.dirname(default_cache_path()), "batches",
+        "{}-{}.jsonl".format(name, key[:16]))
+
+
+def add_batch_arguments(parser, time_limit = True):
+    '''
+    options for journaling, resuming and time limits shared by the scripts.
+    Scripts that change bags leave out the time limit.
+    '''
+    parser.add_argument("--journal",
+                        help = "Path to the journal of finished bags (default: one per script and directory in the user's cache)")
+    parser.add_argument("--resume", action='store_true',
+                        help = "Skip bags finished by an interrupted run")
+    parser.add_argument("--retry-failed", action='store_true',
+                        help = "Like --resume, but run the bags that failed or timed out again")
+    if time_limit:
+        parser.add_argument("--time-limit", type=float, default=None,
+                            help = "Give up on a bag after this many seconds")
+    return parser
+
+
+def _alarm(signum, frame):
+    raise BagTimeout()
+
+
+def run_bag(path, time_limit, fn, *args):
+    '''
+    run fn(path, *args), stopping it after time_limit seconds when running
+    on a main thread, and return a journal record of how it went
+    '''
+    record = {"bag": path, "status": "done", "outcome": None, "error": None}
+    start = time.time()
+
+    use_alarm = (time_limit and hasattr(signal, "setitimer") and
+        threading.current_thread() is threading.main_thread())
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _alarm)
+        signal.setitimer(signal.ITIMER_REAL, time_limit)
+    try:
+        record["outcome"] = fn(path, *args)
+    except BagTimeout:
+        LOGGER.error("{}: stopped after {} seconds".format(path, time_limit))
+        record.update(status = "timeout",
+            error = "Stopped after {} seconds".format(time_limit))
+    except Exception as e:
+        LOGGER.error("{}: {}".format(path, e))
+        record.update(status = "failed", error = str(e))
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+    record["seconds"] = round(time.time() - start, 3)
+    return record
+
+
+def run_in_worker(path, initializer, initargs, enabled, time_limit, fn, *args):
+    '''
+    run_bag in a worker process, calling initializer(*initargs) first (e.g.
+    to configure logging) and returning the worker's metrics with the record
+    '''
+    if initializer:
+        initializer(*initargs)
+    return measured(path, enabled, run_bag, time_limit, fn, *args)
+
+
+class BatchJournal:
+    '''
+    Append-only record of each bag a batch has finished, with its status
+    and outcome. Lines are synced as they are written, so a run that is
+    killed or interrupted loses at most the bags it was working on. With
+    resume, the records of the earlier run are loaded and added to.
+    '''
+
+    def __init__(self, path, resume = False):
+        self.path = os.path.abspath(path)
+        self.records = {}
+
+        journal_dir = os.path.dirname(self.path)
+        if not os.path.isdir(journal_dir):
+            os.makedirs(journal_dir)
+
+        if resume and os.path.isfile(self.path):
+            self.load()
+            LOGGER.info("Resuming from {} finished bags in {}".format(
+                len(self.records), self.path))
+            mode = 'a'
+        else:
+            mode = 'w'
+
+        self.journal = open(self.path, mode, encoding = 'utf-8')
+
+
+    def load(self):
+        with open(self.path, 'r', encoding = 'utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line may be cut short if the run was killed
+                    continue
+                self.records[record["bag"]] = record
+
+
+    def finished(self, path, retry_failed = False):
+        '''
+        whether a bag needs no further run
+        '''
+        record = self.records.get(path)
+        if not record:
+            return False
+        return record["status"] == "done" or not retry_failed
+
+
+    def record(self, record):
+        record = dict(record, finished = time.strftime("%Y-%m-%dT%H:%M:%S"))
+        self.records[record["bag"]] = record
+        self.journal.write(json.dumps(record, default = str) + "\n")
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+
+    def close(self):
+        self.journal.close()
+
+
+class BatchRunner:
+    '''
+    Run a function over a list of bags, journaling each bag's outcome. Bags
+    run one at a time, or with jobs on a pool of processes (or threads)
+    through a DeviceScheduler. The runner skips bags the journal already
+    has, stops a bag that runs past time_limit, and merges the metrics of
+    worker processes.
+    '''
+
+    def __init__(self, journal, jobs = 1, rotational_limit = 1,
+        solid_state_limit = None, threaded = False, time_limit = None,
+        retry_failed = False, initializer = None, initargs = (),
+        succeeded = None):
+        self.journal = journal
+        self.jobs = jobs
+        self.rotational_limit = rotational_limit
+        self.solid_state_limit = solid_state_limit
+        self.threaded = threaded
+        self.time_limit = time_limit
+        self.retry_failed = retry_failed
+        self.initializer = initializer
+        self.initargs = initargs
+        self.succeeded = succeeded
+
+
+    @classmethod
+    def from_args(cls, name, args, **kwargs):
+        '''
+        runner configured from the options added by add_batch_arguments and
+        the scripts' -j, --rotational-jobs and --ssd-jobs
+        '''
+        sources = [source for source in (args.directory, args.bagpath) if source]
+        journal = BatchJournal(args.journal or default_journal_path(name, sources),
+            resume = args.resume or args.retry_failed)
+        return cls(journal, jobs = args.jobs,
+            rotational_limit = args.rotational_jobs,
+            solid_state_limit = args.ssd_jobs,
+            time_limit = getattr(args, "time_limit", None),
+            retry_failed = args.retry_failed, **kwargs)
+
+
+    def finish(self, record):
+        if (record["status"] == "done" and self.succeeded and
+            not self.succeeded(record["outcome"])):
+            record["status"] = "failed"
+        self.journal.record(record)
+        return record
+
+
+    def run(self, fn, bags, *args):
+        '''
+        call fn(bag, *args) for each bag not finished in the journal and
+        return the journal record of every bag, in the order given
+        '''
+        pending = [bag for bag in bags
+            if not self.journal.finished(bag, self.retry_failed)]
+        if len(pending) < len(bags):
+            LOGGER.info("Skipping {} bag(s) finished by an earlier run".format(
+                len(bags) - len(pending)))
+
+        if self.jobs > 1 and self.threaded:
+            if self.time_limit:
+                LOGGER.warning("Time limits do not apply to bags run on threads")
+            with ThreadPoolExecutor(max_workers = self.jobs) as executor:
+                scheduler = DeviceScheduler(executor, self.jobs,
+                    rotational_limit = self.rotational_limit,
+                    solid_state_limit = self.solid_state_limit)
+                for record in tqdm(scheduler.map(run_bag, pending, None, fn,
+                    *args), total = len(pending)):
+                    self.finish(record)
+        elif self.jobs > 1:
+            with ProcessPoolExecutor(max_workers = self.jobs) as executor:
+                scheduler = DeviceScheduler(executor, self.jobs,
+                    rotational_limit = self.rotational_limit,
+                    solid_state_limit = self.solid_state_limit)
+                for record in tqdm(collect(scheduler.map(run_in_worker, pending,
+                    self.initializer, self.initargs, METRICS.enabled,
+                    self.time_limit, fn, *args)), total = len(pending)):
+                    self.finish(record)
+        else:
+            for bag in tqdm(pending):
+                self.finish(run_bag(bag, self.time_limit, fn, *args))
+
+        return [self.journal.records[bag] for bag in bags
+            if bag in self.journal.records]
+
+
+    def close(self):
+        self.journal.close()
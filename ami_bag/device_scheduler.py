@@ -0,0 +1,123 @@
+import os, logging
+from collections import OrderedDict, deque
+from concurrent.futures import wait, FIRST_COMPLETED
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def job_count(value):
+    '''
+    parallel job limit from the command line, at least 1
+    '''
+    count = int(value)
+    if count < 1:
+        raise ValueError("job limits must be at least 1")
+    return count
+
+
+def device_id(path):
+    '''
+    block device that holds a path
+    '''
+    return os.stat(path).st_dev
+
+
+def is_rotational(dev):
+    '''
+    ask sysfs whether a device is a spinning disk, checking the parent disk
+    for partitions. Returns None if the kernel does not say (e.g. network
+    mounts or non-Linux systems).
+    '''
+    sys_path = os.path.realpath("/sys/dev/block/{}:{}".format(
+        os.major(dev), os.minor(dev)))
+
+    for candidate in (sys_path, os.path.dirname(sys_path)):
+        rotational_path = os.path.join(candidate, "queue", "rotational")
+        try:
+            with open(rotational_path, 'r') as f:
+                return f.read().strip() == "1"
+        except (OSError, IOError):
+            continue
+
+    return None
+
+
+class DeviceScheduler:
+    '''
+    Run a function over many bag paths on an executor while limiting how
+    many run against the same block device at once. Spinning disks and
+    devices that cannot be identified, including network and virtual
+    filesystems, get rotational_limit workers; disks the kernel reports as
+    solid state get solid_state_limit. Work is
+    handed out round-robin across devices so every device stays busy.
+    '''
+
+    def __init__(self, executor, max_workers, rotational_limit = 1,
+        solid_state_limit = None):
+        if rotational_limit < 1 or (solid_state_limit is not None and
+            solid_state_limit < 1):
+            raise ValueError("device limits must be at least 1")
+        self.executor = executor
+        self.max_workers = max_workers
+        self.rotational_limit = rotational_limit
+        if solid_state_limit:
+            self.solid_state_limit = solid_state_limit
+        else:
+            self.solid_state_limit = max_workers
+
+
+    def device_limit(self, dev):
+        # only trust sysfs: major number 0 covers btrfs, ZFS, overlayfs and
+        # NFS alike, which may well sit on spinning disks
+        if is_rotational(dev) is False:
+            return self.solid_state_limit
+        return self.rotational_limit
+
+
+    def group_by_device(self, paths):
+        queues = OrderedDict()
+        for path in paths:
+            try:
+                dev = device_id(path)
+            except OSError:
+                dev = None
+            queues.setdefault(dev, deque()).append(path)
+
+        return queues
+
+
+    def map(self, fn, paths, *args):
+        '''
+        yield fn(path, *args) for each path as the calls complete
+        '''
+        queues = self.group_by_device(paths)
+        limits = dict((dev, self.device_limit(dev) if dev is not None
+            else self.rotational_limit) for dev in queues)
+        running = dict((dev, 0) for dev in queues)
+        futures = {}
+
+        for dev, queue in queues.items():
+            LOGGER.info("{} bag(s) on device {} with up to {} worker(s)".format(
+                len(queue), dev, limits[dev]))
+
+        while queues or futures:
+            submitted = True
+            while submitted and len(futures) < self.max_workers:
+                submitted = False
+                for dev in list(queues.keys()):
+                    if len(futures) >= self.max_workers:
+                        break
+                    if running[dev] >= limits[dev]:
+                        continue
+                    path = queues[dev].popleft()
+                    if not queues[dev]:
+                        del queues[dev]
+                    futures[self.executor.submit(fn, path, *args)] = dev
+                    running[dev] += 1
+                    submitted = True
+
+            done, _ = wait(futures, return_when = FIRST_COMPLETED)
+            for future in done:
+                running[futures.pop(future)] -= 1
+                yield future.result()
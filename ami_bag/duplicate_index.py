@@ -0,0 +1,271 @@
+import os, re, glob, time, hashlib, sqlite3, logging
+from collections import OrderedDict
+
+from ami_bag.fixity_cache import default_cache_path
+from ami_bag.update_bag import read_manifest_lines
+
+
+LOGGER = logging.getLogger(__name__)
+
+MANIFEST_REGEX = re.compile(r"^manifest-(\w+)\.txt$")
+
+
+def default_index_path():
+  """
+  location of the shared duplicate index in the user's cache directory
+  """
+  return os.path.join(os.path.dirname(default_cache_path()), "duplicates.sqlite")
+
+
+def find_bags(root):
+  """
+  every directory under root with a bagit.txt, without looking inside bags
+  """
+  for dirpath, dirnames, filenames in os.walk(root):
+    dirnames.sort()
+    if "bagit.txt" in filenames:
+      dirnames[:] = []
+      yield dirpath
+
+
+def payload_manifests(bag_path):
+  """
+  algorithm and path of each payload manifest in a bag
+  """
+  manifests = OrderedDict()
+  for manifest_path in sorted(glob.glob(os.path.join(glob.escape(bag_path),
+    "manifest-*.txt"))):
+    match = MANIFEST_REGEX.match(os.path.basename(manifest_path))
+    if match:
+      manifests[match.group(1).lower()] = manifest_path
+  return manifests
+
+
+def manifests_digest(manifests):
+  digest = hashlib.sha256()
+  for alg, manifest_path in manifests.items():
+    digest.update(alg.encode('utf-8') + b"\0")
+    with open(manifest_path, 'rb') as f:
+      for block in iter(lambda: f.read(1024 * 1024), b""):
+        digest.update(block)
+  return digest.hexdigest()
+
+
+class DuplicateIndex:
+  """
+  On-disk index of payload digests read from bag manifests, for finding
+  files stored in more than one bag and bags that hold the same files.
+  Nothing is hashed: bags are indexed from their manifests, and files are
+  only stat'ed for their size.
+  """
+
+  def __init__(self, path = None):
+    if not path:
+      path = default_index_path()
+    self.path = os.path.abspath(path)
+
+    index_dir = os.path.dirname(self.path)
+    if not os.path.isdir(index_dir):
+      os.makedirs(index_dir)
+
+    self.conn = sqlite3.connect(self.path, timeout = 60)
+    self.conn.execute("PRAGMA journal_mode = WAL")
+    self.conn.execute("PRAGMA synchronous = NORMAL")
+    self.conn.execute("PRAGMA foreign_keys = ON")
+    self.conn.execute("""
+      CREATE TABLE IF NOT EXISTS bags (
+        bag_id INTEGER PRIMARY KEY,
+        bag_path TEXT NOT NULL UNIQUE,
+        manifests_digest TEXT NOT NULL,
+        indexed REAL NOT NULL
+      )""")
+    self.conn.execute("""
+      CREATE TABLE IF NOT EXISTS bag_contents (
+        bag_id INTEGER NOT NULL REFERENCES bags (bag_id) ON DELETE CASCADE,
+        alg TEXT NOT NULL,
+        contents_digest TEXT NOT NULL,
+        files INTEGER NOT NULL,
+        PRIMARY KEY (bag_id, alg)
+      )""")
+    self.conn.execute("""
+      CREATE TABLE IF NOT EXISTS files (
+        bag_id INTEGER NOT NULL REFERENCES bags (bag_id) ON DELETE CASCADE,
+        rel_path TEXT NOT NULL,
+        alg TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        size INTEGER,
+        PRIMARY KEY (bag_id, rel_path, alg)
+      )""")
+    self.conn.execute("""
+      CREATE INDEX IF NOT EXISTS files_digest ON files (alg, digest)""")
+    self.conn.commit()
+
+
+  def index_bag(self, bag_path):
+    """
+    add or refresh a bag from its manifests. Returns False if the manifests
+    have not changed since the bag was last indexed.
+    """
+    bag_path = os.path.abspath(bag_path)
+    manifests = payload_manifests(bag_path)
+    digest = manifests_digest(manifests)
+
+    row = self.conn.execute("SELECT manifests_digest FROM bags WHERE bag_path = ?",
+      (bag_path,)).fetchone()
+    if row and row[0] == digest:
+      return False
+
+    self.conn.execute("DELETE FROM bags WHERE bag_path = ?", (bag_path,))
+    bag_id = self.conn.execute("""
+      INSERT INTO bags (bag_path, manifests_digest, indexed) VALUES (?, ?, ?)""",
+      (bag_path, digest, time.time())).lastrowid
+
+    sizes = {}
+    for alg, manifest_path in manifests.items():
+      entries = sorted((entry_path, entry_hash.lower()) for _, entry_hash, entry_path
+        in read_manifest_lines(manifest_path))
+      for entry_path, _ in entries:
+        if entry_path not in sizes:
+          try:
+            sizes[entry_path] = os.stat(os.path.join(bag_path, entry_path)).st_size
+          except OSError:
+            sizes[entry_path] = None
+
+      self.conn.executemany("""
+        INSERT OR REPLACE INTO files (bag_id, rel_path, alg, digest, size)
+        VALUES (?, ?, ?, ?, ?)""",
+        [(bag_id, entry_path, alg, entry_hash, sizes[entry_path])
+        for entry_path, entry_hash in entries])
+
+      contents = hashlib.sha256()
+      for entry_path, entry_hash in entries:
+        contents.update("{} {}\n".format(entry_hash, entry_path).encode('utf-8'))
+      self.conn.execute("""
+        INSERT INTO bag_contents (bag_id, alg, contents_digest, files)
+        VALUES (?, ?, ?, ?)""", (bag_id, alg, contents.hexdigest(), len(entries)))
+
+    self.conn.commit()
+    return True
+
+
+  def index_root(self, root):
+    """
+    index every bag under root and return (bags found, bags reindexed)
+    """
+    found = 0
+    indexed = 0
+    for bag_path in find_bags(root):
+      found += 1
+      try:
+        if self.index_bag(bag_path):
+          indexed += 1
+      except (OSError, UnicodeDecodeError) as e:
+        LOGGER.error("Unable to index {}: {}".format(bag_path, e))
+    return found, indexed
+
+
+  def prune(self, root = None):
+    """
+    drop indexed bags, under root if given, that no longer exist
+    """
+    removed = []
+    for bag_path, in self.conn.execute("SELECT bag_path FROM bags").fetchall():
+      if root and os.path.commonpath([os.path.abspath(root), bag_path]) != os.path.abspath(root):
+        continue
+      if not os.path.isfile(os.path.join(bag_path, "bagit.txt")):
+        removed.append(bag_path)
+    self.conn.executemany("DELETE FROM bags WHERE bag_path = ?",
+      [(bag_path,) for bag_path in removed])
+    self.conn.commit()
+    return removed
+
+
+  def duplicate_files(self, min_size = 0):
+    """
+    groups of indexed files that share a digest, largest first, as dicts
+    with the digest, size, reclaimable bytes and (bag, path) copies. A
+    group found under several algorithms is reported once.
+    """
+    rows = self.conn.execute("""
+      SELECT f.alg, f.digest, MAX(f.size), b.bag_path, f.rel_path
+      FROM files f JOIN bags b ON f.bag_id = b.bag_id
+      WHERE (f.alg, f.digest) IN (
+        SELECT alg, digest FROM files GROUP BY alg, digest HAVING COUNT(*) > 1)
+      GROUP BY f.alg, f.digest, b.bag_path, f.rel_path
+      ORDER BY f.alg, f.digest, b.bag_path, f.rel_path""")
+
+    groups = OrderedDict()
+    for alg, digest, size, bag_path, rel_path in rows:
+      group = groups.setdefault((alg, digest), {"alg": alg, "digest": digest,
+        "size": size, "copies": []})
+      group["copies"].append((bag_path, rel_path))
+
+    seen = set()
+    duplicates = []
+    for group in groups.values():
+      copies = tuple(group["copies"])
+      if copies in seen or (group["size"] or 0) < min_size:
+        continue
+      seen.add(copies)
+      group["reclaimable"] = (group["size"] or 0) * (len(copies) - 1)
+      duplicates.append(group)
+
+    return sorted(duplicates, key = lambda group: -group["reclaimable"])
+
+
+  def identical_bags(self):
+    """
+    lists of bags whose manifests list the same paths and digests
+    """
+    rows = self.conn.execute("""
+      SELECT c.alg, c.contents_digest, b.bag_path
+      FROM bag_contents c JOIN bags b ON c.bag_id = b.bag_id
+      WHERE (c.alg, c.contents_digest) IN (
+        SELECT alg, contents_digest FROM bag_contents
+        GROUP BY alg, contents_digest HAVING COUNT(*) > 1)
+      ORDER BY c.alg, c.contents_digest, b.bag_path""")
+
+    groups = OrderedDict()
+    for alg, contents_digest, bag_path in rows:
+      groups.setdefault((alg, contents_digest), []).append(bag_path)
+
+    identical = []
+    for bags in groups.values():
+      if bags not in identical:
+        identical.append(bags)
+    return identical
+
+
+  def similar_bags(self, threshold = 0.5, min_size = 0):
+    """
+    pairs of bags whose sets of payload digests have a Jaccard similarity
+    of at least threshold, most similar first, as (similarity, bag, bag).
+    Files smaller than min_size are left out of both sets, as in
+    duplicate_files, so that small files common to many bags do not pair
+    every bag with every other.
+    """
+    counts = dict(((bag_id, alg), files) for bag_id, alg, files in
+      self.conn.execute("""
+        SELECT bag_id, alg, COUNT(DISTINCT digest) FROM files
+        WHERE COALESCE(size, 0) >= ?
+        GROUP BY bag_id, alg""", (min_size,)))
+    paths = dict(self.conn.execute("SELECT bag_id, bag_path FROM bags"))
+
+    best = {}
+    for bag_a, bag_b, alg, shared in self.conn.execute("""
+      SELECT a.bag_id, b.bag_id, a.alg, COUNT(DISTINCT a.digest)
+      FROM files a JOIN files b
+        ON a.alg = b.alg AND a.digest = b.digest AND a.bag_id < b.bag_id
+      WHERE COALESCE(a.size, 0) >= ? AND COALESCE(b.size, 0) >= ?
+      GROUP BY a.bag_id, b.bag_id, a.alg""", (min_size, min_size)):
+      union = counts[(bag_a, alg)] + counts[(bag_b, alg)] - shared
+      similarity = shared / union if union else 1.0
+      best[(bag_a, bag_b)] = max(similarity, best.get((bag_a, bag_b), 0))
+
+    similar = [(round(similarity, 4), paths[bag_a], paths[bag_b])
+      for (bag_a, bag_b), similarity in best.items() if similarity >= threshold]
+    return sorted(similar, key = lambda pair: (-pair[0], pair[1], pair[2]))
+
+
+  def close(self):
+    self.conn.close()
@@ -0,0 +1,117 @@
+import os, time, sqlite3, logging
+
+
+LOGGER = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+
+def default_cache_path():
+  """
+  location of the shared cache in the user's cache directory
+  """
+  cache_dir = os.environ.get("XDG_CACHE_HOME",
+    os.path.join(os.path.expanduser("~"), ".cache"))
+  return os.path.join(cache_dir, "ami-tools", "fixity.sqlite")
+
+
+class FixityCache:
+  """
+  On-disk store of payload file digests, keyed by the bag, the path in the
+  bag, and the size, mtime, and inode of the file when it was last read.
+  A file whose stat still matches does not need to be read again, unless
+  its digests were recorded more than max_age days ago.
+  """
+
+  def __init__(self, path = None, max_age = None):
+    if not path:
+      path = default_cache_path()
+    self.path = os.path.abspath(path)
+    self.max_age = max_age
+
+    cache_dir = os.path.dirname(self.path)
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+
+    self.conn = sqlite3.connect(self.path, timeout = 60)
+    self.conn.execute("PRAGMA journal_mode = WAL")
+    self.conn.execute("PRAGMA synchronous = NORMAL")
+    self.conn.execute("""
+      CREATE TABLE IF NOT EXISTS fixity (
+        bag_path TEXT NOT NULL,
+        rel_path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        inode INTEGER NOT NULL,
+        alg TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        recorded REAL NOT NULL,
+        PRIMARY KEY (bag_path, rel_path, alg)
+      )""")
+    self.conn.commit()
+
+
+  def lookup(self, bag_path, rel_path, stat, algs):
+    """
+    return cached digests for every algorithm in algs, or None if the file
+    changed, an algorithm is missing, or an entry is too old
+    """
+    rows = self.conn.execute("""
+      SELECT alg, digest, recorded FROM fixity
+      WHERE bag_path = ? AND rel_path = ? AND size = ? AND mtime_ns = ?
+        AND inode = ?""",
+      (bag_path, rel_path, stat.st_size, stat.st_mtime_ns, stat.st_ino))
+
+    if self.max_age is not None:
+      oldest = time.time() - self.max_age * SECONDS_PER_DAY
+    else:
+      oldest = None
+
+    digests = {}
+    for alg, digest, recorded in rows:
+      if oldest is not None and recorded < oldest:
+        return None
+      digests[alg] = digest
+
+    if not set(algs) <= set(digests.keys()):
+      return None
+
+    return dict((alg, digests[alg]) for alg in algs)
+
+
+  def record(self, bag_path, rel_path, stat, hashes):
+    """
+    store freshly read digests for a file
+    """
+    recorded = time.time()
+    self.conn.execute("DELETE FROM fixity WHERE bag_path = ? AND rel_path = ?",
+      (bag_path, rel_path))
+    self.conn.executemany("""
+      INSERT INTO fixity
+        (bag_path, rel_path, size, mtime_ns, inode, alg, digest, recorded)
+      VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+      [(bag_path, rel_path, stat.st_size, stat.st_mtime_ns, stat.st_ino,
+        alg, digest, recorded) for alg, digest in hashes.items()])
+    self.conn.commit()
+
+
+  def snapshot(self, bag_path):
+    """
+    size and mtime of each file in a bag when its digests were recorded
+    """
+    rows = self.conn.execute("""
+      SELECT DISTINCT rel_path, size, mtime_ns FROM fixity
+      WHERE bag_path = ?""", (bag_path,))
+    return dict((rel_path, (size, mtime_ns)) for rel_path, size, mtime_ns in rows)
+
+
+  def forget_bag(self, bag_path):
+    """
+    drop every cached digest for a bag
+    """
+    self.conn.execute("DELETE FROM fixity WHERE bag_path = ?", (bag_path,))
+    self.conn.commit()
+
+
+  def close(self):
+    self.conn.close()
@@ -0,0 +1,153 @@
+import os, mmap, time, hashlib, logging
+from collections import namedtuple
+
+
+LOGGER = logging.getLogger(__name__)
+
+# read: plain reads, fadvise: reads with a sequential readahead hint,
+# mmap: map the file and hash slices of the mapping
+STRATEGIES = ("read", "fadvise", "mmap")
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# with drop_cache, evict pages behind the reader every this many bytes
+DROP_CACHE_INTERVAL = 64 * 1024 * 1024
+
+ReadOptions = namedtuple("ReadOptions", ["block_size", "strategy", "drop_cache"])
+
+DEFAULT_READ_OPTIONS = ReadOptions(DEFAULT_BLOCK_SIZE, "fadvise", False)
+
+
+def read_options(block_size = None, strategy = None, drop_cache = False):
+  """
+  ReadOptions from command line values, falling back to the defaults
+  """
+  if strategy and strategy not in STRATEGIES:
+    raise ValueError("Unknown read strategy {}, expected one of {}".format(
+      strategy, ", ".join(STRATEGIES)))
+
+  return ReadOptions(block_size or DEFAULT_BLOCK_SIZE,
+    strategy or DEFAULT_READ_OPTIONS.strategy, drop_cache)
+
+
+def parse_size(value):
+  """
+  byte count from strings like 65536, 64K, 1M or 1G
+  """
+  units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+  value = value.strip().upper().rstrip("B")
+  if value and value[-1] in units:
+    return int(float(value[:-1]) * units[value[-1]])
+  return int(value)
+
+
+def advise(fd, offset, length, advice):
+  """
+  posix_fadvise where the platform and filesystem support it
+  """
+  if not hasattr(os, "posix_fadvise"):
+    return False
+  try:
+    os.posix_fadvise(fd, offset, length, advice)
+  except OSError:
+    return False
+  return True
+
+
+def drop_cached_pages(path):
+  """
+  ask the kernel to evict a file's clean pages from the page cache
+  """
+  if not hasattr(os, "POSIX_FADV_DONTNEED"):
+    return False
+  fd = os.open(path, os.O_RDONLY)
+  try:
+    return advise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+  finally:
+    os.close(fd)
+
+
+def _read_blocks(f, options):
+  fd = f.fileno()
+  if options.strategy == "fadvise" and hasattr(os, "POSIX_FADV_SEQUENTIAL"):
+    advise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+  drop_cache = options.drop_cache and hasattr(os, "POSIX_FADV_DONTNEED")
+  buffer = bytearray(options.block_size)
+  view = memoryview(buffer)
+  offset = dropped = 0
+  while True:
+    n = f.readinto(buffer)
+    if not n:
+      break
+    yield view[:n]
+    offset += n
+    if drop_cache and offset - dropped >= DROP_CACHE_INTERVAL:
+      advise(fd, dropped, offset - dropped, os.POSIX_FADV_DONTNEED)
+      dropped = offset
+
+
+def _mmap_blocks(f, options):
+  size = os.fstat(f.fileno()).st_size
+  if not size:
+    return
+
+  with mmap.mmap(f.fileno(), size, access = mmap.ACCESS_READ) as mapping:
+    if hasattr(mapping, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+      mapping.madvise(mmap.MADV_SEQUENTIAL)
+    view = memoryview(mapping)
+    try:
+      for offset in range(0, size, options.block_size):
+        block = view[offset:offset + options.block_size]
+        try:
+          yield block
+        finally:
+          block.release()
+    finally:
+      view.release()
+
+
+def iter_blocks(filepath, options = DEFAULT_READ_OPTIONS):
+  """
+  yield a file's contents in options.block_size pieces using the chosen
+  strategy. Blocks are views into a reused buffer or a mapping, so consume
+  each one before asking for the next.
+  """
+  if options.strategy not in STRATEGIES:
+    raise ValueError("Unknown read strategy {}".format(options.strategy))
+
+  with open(filepath, 'rb', buffering = 0) as f:
+    if options.strategy == "mmap":
+      blocks = _mmap_blocks(f, options)
+    else:
+      blocks = _read_blocks(f, options)
+
+    try:
+      for block in blocks:
+        yield block
+    finally:
+      blocks.close()
+      if options.drop_cache and hasattr(os, "POSIX_FADV_DONTNEED"):
+        advise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def measure_throughput(filepaths, options, algs = ("md5",), cold = True):
+  """
+  read, and hash with algs, a list of files and return (bytes, seconds).
+  With cold, each file is evicted from the page cache first so the numbers
+  reflect the drive rather than memory.
+  """
+  nbytes = 0
+  seconds = 0.0
+  for filepath in filepaths:
+    if cold:
+      drop_cached_pages(filepath)
+    hashers = [hashlib.new(alg) for alg in algs]
+    start = time.perf_counter()
+    for block in iter_blocks(filepath, options):
+      nbytes += len(block)
+      for hasher in hashers:
+        hasher.update(block)
+    seconds += time.perf_counter() - start
+
+  return nbytes, seconds
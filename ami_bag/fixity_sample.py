@@ -0,0 +1,79 @@
+import os, math, random, logging
+from collections import OrderedDict, namedtuple
+
+
+LOGGER = logging.getLogger(__name__)
+
+# payload directories sampled more heavily than the rest, as a multiple of
+# the requested fraction
+SAMPLE_WEIGHTS = {"PreservationMasters": 4}
+
+SampleStratum = namedtuple("SampleStratum", ["name", "files", "sample"])
+
+
+def stratum_name(entry):
+  """
+  top level payload directory of a manifest entry
+  """
+  parts = entry.replace(os.sep, "/").split("/")
+  if len(parts) > 2:
+    return parts[1]
+  return ""
+
+
+def choose_sample(entries, fraction, seed, weights = SAMPLE_WEIGHTS):
+  """
+  split entries by payload directory and draw a seeded random sample from
+  each, at fraction times the directory's weight and at least one file
+  """
+  strata = OrderedDict()
+  for entry in sorted(entries):
+    strata.setdefault(stratum_name(entry), []).append(entry)
+
+  rng = random.Random(seed)
+  samples = OrderedDict()
+  for name, files in strata.items():
+    rate = min(1.0, fraction * weights.get(name, 1))
+    size = min(len(files), max(1, math.ceil(rate * len(files))))
+    samples[name] = SampleStratum(name, files, sorted(rng.sample(files, size)))
+
+  return samples
+
+
+def max_undetected(files, sampled, alpha):
+  """
+  largest number of bad files among files that a sample of sampled files
+  with no bad ones still leaves more likely than alpha (hypergeometric)
+  """
+  if sampled >= files:
+    return 0
+
+  miss = 1.0
+  for bad in range(1, files - sampled + 1):
+    # chance that none of bad files were drawn, from the chance for bad - 1
+    miss *= (files - bad + 1 - sampled) / (files - bad + 1)
+    if miss <= alpha:
+      return bad - 1
+
+  return files - sampled
+
+
+def sample_summary(strata, confidence):
+  """
+  files sampled and the most bad files each directory could still hold at
+  the given confidence, which is split across the directories so the total
+  holds at that confidence too
+  """
+  alpha = (1 - confidence) / max(1, len(strata))
+  summary = {"files": 0, "sampled": 0, "max_bad_files": 0,
+    "confidence": confidence, "strata": OrderedDict()}
+
+  for name, stratum in strata.items():
+    bound = max_undetected(len(stratum.files), len(stratum.sample), alpha)
+    summary["strata"][name] = {"files": len(stratum.files),
+      "sampled": len(stratum.sample), "max_bad_files": bound}
+    summary["files"] += len(stratum.files)
+    summary["sampled"] += len(stratum.sample)
+    summary["max_bad_files"] += bound
+
+  return summary
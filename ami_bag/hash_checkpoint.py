@@ -0,0 +1,100 @@
+import os, json, time, hashlib, logging
+
+from ami_bag.fixity_cache import default_cache_path
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def default_checkpoint_path(bag_path):
+  """
+  journal location for a bag in the user's cache directory
+  """
+  bag_id = hashlib.sha1(os.path.abspath(bag_path).encode('utf-8')).hexdigest()
+  return os.path.join(os.path.dirname(default_cache_path()), "checkpoints",
+    "{}.jsonl".format(bag_id))
+
+
+class HashCheckpoint:
+  """
+  Append-only journal of the files hashed during one validation or update
+  run. If the run is interrupted, a later run opened with resume = True
+  reuses the digests of files whose size and mtime have not changed. A
+  run without resume ignores the earlier entries but appends after them,
+  so they are only dropped once a run finishes.
+  """
+
+  def __init__(self, path, resume = False, sync_interval = 1.0):
+    self.path = os.path.abspath(path)
+    self.sync_interval = sync_interval
+    self.completed = {}
+
+    checkpoint_dir = os.path.dirname(self.path)
+    if not os.path.isdir(checkpoint_dir):
+      os.makedirs(checkpoint_dir)
+
+    if resume and os.path.isfile(self.path):
+      self.load()
+      LOGGER.info("Resuming from {} files in {}".format(
+        len(self.completed), self.path))
+
+    self.journal = open(self.path, 'a', encoding = 'utf-8')
+    self.last_sync = time.time()
+
+
+  def load(self):
+    with open(self.path, 'r', encoding = 'utf-8') as f:
+      for line in f:
+        try:
+          record = json.loads(line)
+        except ValueError:
+          # the last line may be cut short if the run was killed
+          continue
+        self.completed[(record["bag"], record["path"])] = record
+
+
+  def lookup(self, bag_path, rel_path, stat, algs):
+    record = self.completed.get((bag_path, rel_path))
+    if not record:
+      return None
+    if record["size"] != stat.st_size or record["mtime_ns"] != stat.st_mtime_ns:
+      return None
+    if not set(algs) <= set(record["hashes"].keys()):
+      return None
+
+    return dict((alg, record["hashes"][alg]) for alg in algs)
+
+
+  def record(self, bag_path, rel_path, stat, hashes):
+    record = {"bag": bag_path, "path": rel_path, "size": stat.st_size,
+      "mtime_ns": stat.st_mtime_ns, "hashes": hashes}
+    self.completed[(bag_path, rel_path)] = record
+    self.journal.write(json.dumps(record) + "\n")
+    self.journal.flush()
+
+    if time.time() - self.last_sync >= self.sync_interval:
+      os.fsync(self.journal.fileno())
+      self.last_sync = time.time()
+
+
+  def clear(self):
+    """
+    forget the journal once a run finishes
+    """
+    self.completed = {}
+    self.journal.seek(0)
+    self.journal.truncate()
+    self.journal.flush()
+
+
+  def empty(self):
+    """
+    whether the journal holds no entries from this or an earlier run
+    """
+    return self.journal.tell() == 0
+
+
+  def close(self, remove = False):
+    self.journal.close()
+    if remove and os.path.isfile(self.path):
+      os.remove(self.path)
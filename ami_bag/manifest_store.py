@@ -0,0 +1,325 @@
+import os, glob, json, struct, bisect, hashlib, logging, tempfile
+from array import array
+
+import bagit
+
+from ami_bag.fixity_cache import default_cache_path
+from ami_bag.update_bag import read_manifest_lines
+
+
+LOGGER = logging.getLogger(__name__)
+
+SIDECAR_MAGIC = b"AMIMANIFEST2\n"
+HEADER_SIZE = struct.Struct("<I")
+
+
+def default_sidecar_path(bag_path):
+  """
+  location of a bag's saved manifest store in the user's cache directory
+  """
+  bag_id = hashlib.sha1(os.path.abspath(bag_path).encode('utf-8')).hexdigest()
+  return os.path.join(os.path.dirname(default_cache_path()), "manifests",
+    "{}.bin".format(bag_id))
+
+
+def parse_digest(digest, size):
+  """
+  raw bytes of a hex digest, or None if it is not size bytes of hex
+  """
+  if len(digest) != 2 * size:
+    return None
+  try:
+    return bytes.fromhex(digest)
+  except ValueError:
+    return None
+
+
+def manifest_sources(bag_path):
+  """
+  size and mtime of each payload manifest, to tell whether a saved store
+  is still current
+  """
+  sources = {}
+  for manifest_path in glob.glob(os.path.join(glob.escape(bag_path), "manifest-*.txt")):
+    stat = os.stat(manifest_path)
+    sources[os.path.basename(manifest_path)] = [stat.st_size, stat.st_mtime_ns]
+  return sources
+
+
+class PathIndex:
+  """
+  sequence view of a store's paths for bisect
+  """
+
+  def __init__(self, store):
+    self.store = store
+
+  def __len__(self):
+    return len(self.store)
+
+  def __getitem__(self, i):
+    return self.store.path(i)
+
+
+class ManifestStore:
+  """
+  Payload paths and digests of a bag kept compactly: paths sorted in one
+  UTF-8 buffer with each directory stored once, and digests as raw bytes in
+  one buffer per algorithm, with a flag per entry for whether it has a
+  digest for that algorithm. Manifest digests that are not valid hex of
+  the algorithm's length are left out of the buffers and kept in
+  malformed. Supports the set-like use the bag checks make of data_files
+  (iteration, len and membership by binary search), lookups of an entry's
+  digests, and saving to a binary sidecar for fast reloads.
+  """
+
+  def __init__(self, algs = ()):
+    self.algs = sorted(algs)
+    self.dirs = []
+    self.dir_ids = array('I')
+    self.names = b""
+    self.name_offsets = array('Q', [0])
+    self.digests = dict((alg, b"") for alg in self.algs)
+    self.present = dict((alg, bytearray()) for alg in self.algs)
+    self.malformed = {}
+    self.digest_sizes = dict((alg, hashlib.new(alg).digest_size)
+      for alg in self.algs)
+    self.index = PathIndex(self)
+
+
+  @classmethod
+  def from_entries(cls, entries, algs = None):
+    """
+    build from a mapping of path to {alg: hex digest}, like bagit's
+    entries. Digests of the wrong length or not in hex are recorded in
+    malformed as {path: {alg: digest}} instead of being stored.
+    """
+    if algs is None:
+      algs = set(alg for hashes in entries.values() for alg in hashes)
+    store = cls(algs)
+
+    dir_lookup = {}
+    names = []
+    digests = dict((alg, []) for alg in store.algs)
+    for path in sorted(entries):
+      dirname, name = path.rsplit("/", 1) if "/" in path else ("", path)
+      if dirname not in dir_lookup:
+        dir_lookup[dirname] = len(store.dirs)
+        store.dirs.append(dirname)
+      store.dir_ids.append(dir_lookup[dirname])
+      encoded = name.encode('utf-8')
+      names.append(encoded)
+      store.name_offsets.append(store.name_offsets[-1] + len(encoded))
+      for alg in store.algs:
+        digest = entries[path].get(alg)
+        raw = None
+        if digest is not None:
+          raw = parse_digest(digest, store.digest_sizes[alg])
+          if raw is None:
+            LOGGER.warning("Malformed {} digest for {}: {}".format(alg, path, digest))
+            store.malformed.setdefault(path, {})[alg] = digest
+        store.present[alg].append(raw is not None)
+        digests[alg].append(raw if raw is not None else bytes(store.digest_sizes[alg]))
+
+    store.names = b"".join(names)
+    for alg in store.algs:
+      store.digests[alg] = b"".join(digests[alg])
+
+    return store
+
+
+  @classmethod
+  def from_manifests(cls, bag_path):
+    """
+    build from a bag's payload manifests without loading the bag
+    """
+    entries = {}
+    for manifest_path in sorted(glob.glob(os.path.join(glob.escape(bag_path),
+      "manifest-*.txt"))):
+      alg = os.path.basename(manifest_path)[9:-4]
+      for _, entry_hash, entry_path in read_manifest_lines(manifest_path):
+        entries.setdefault(bagit.normalize_unicode(entry_path), {})[alg] = entry_hash
+
+    return cls.from_entries(entries)
+
+
+  @classmethod
+  def for_bag(cls, bag_path, sidecar_path = None):
+    """
+    load a bag's saved store if its manifests have not changed since it was
+    saved, otherwise read the manifests and save a new one
+    """
+    if not sidecar_path:
+      sidecar_path = default_sidecar_path(bag_path)
+    sources = manifest_sources(bag_path)
+
+    if os.path.isfile(sidecar_path):
+      try:
+        store, header = cls.load(sidecar_path)
+      except (OSError, ValueError) as e:
+        LOGGER.warning("Unable to read {}: {}".format(sidecar_path, e))
+      else:
+        if header.get("sources") == sources:
+          return store
+
+    store = cls.from_manifests(bag_path)
+    try:
+      store.save(sidecar_path, sources = sources)
+    except OSError as e:
+      LOGGER.warning("Unable to save {}: {}".format(sidecar_path, e))
+    return store
+
+
+  def __len__(self):
+    return len(self.dir_ids)
+
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self.path(i)
+
+
+  def __contains__(self, path):
+    return self.find(path) is not None
+
+
+  def path(self, i):
+    name = self.names[self.name_offsets[i]:self.name_offsets[i + 1]].decode('utf-8')
+    dirname = self.dirs[self.dir_ids[i]]
+    if dirname:
+      return dirname + "/" + name
+    return name
+
+
+  def find(self, path):
+    """
+    position of a path in the sorted index, or None
+    """
+    i = bisect.bisect_left(self.index, path)
+    if i < len(self) and self.path(i) == path:
+      return i
+    return None
+
+
+  def hashes(self, i):
+    hashes = {}
+    for alg in self.algs:
+      if self.present[alg][i]:
+        size = self.digest_sizes[alg]
+        hashes[alg] = self.digests[alg][i * size:(i + 1) * size].hex()
+    return hashes
+
+
+  def get(self, path):
+    """
+    {alg: hex digest} for a path, or None if it is not in the store
+    """
+    i = self.find(path)
+    if i is None:
+      return None
+    return self.hashes(i)
+
+
+  def items(self):
+    for i in range(len(self)):
+      yield self.path(i), self.hashes(i)
+
+
+  def directories(self):
+    """
+    every directory holding a file, each stored once
+    """
+    return set(self.dirs)
+
+
+  def extensions(self):
+    """
+    lowercased extensions of every file
+    """
+    exts = set()
+    for i in range(len(self)):
+      name = self.names[self.name_offsets[i]:self.name_offsets[i + 1]]
+      exts.add(os.path.splitext(name.decode('utf-8'))[1].lower())
+    return exts
+
+
+  def manifest_lines(self, alg):
+    """
+    lines of a manifest for one algorithm, in path order
+    """
+    for path, hashes in self.items():
+      if alg in hashes:
+        yield "{} {}\n".format(hashes[alg], bagit._encode_filename(path))
+
+
+  def nbytes(self):
+    """
+    approximate size of the store's buffers
+    """
+    return (len(self.names) + self.name_offsets.itemsize * len(self.name_offsets) +
+      self.dir_ids.itemsize * len(self.dir_ids) +
+      sum(len(dirname) for dirname in self.dirs) +
+      sum(len(digests) for digests in self.digests.values()) +
+      sum(len(present) for present in self.present.values()))
+
+
+  def save(self, path, sources = None):
+    """
+    write the store to a binary sidecar: a JSON header followed by the
+    name, offset, directory id, digest and presence buffers
+    """
+    header = json.dumps({"algs": self.algs, "dirs": self.dirs,
+      "count": len(self), "names": len(self.names),
+      "malformed": self.malformed, "sources": sources or {}}).encode('utf-8')
+
+    dirname = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(dirname):
+      os.makedirs(dirname)
+    fd, tmp_path = tempfile.mkstemp(dir = dirname, prefix = ".manifest.")
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        f.write(SIDECAR_MAGIC)
+        f.write(HEADER_SIZE.pack(len(header)))
+        f.write(header)
+        f.write(self.names)
+        f.write(self.name_offsets.tobytes())
+        f.write(self.dir_ids.tobytes())
+        for alg in self.algs:
+          f.write(self.digests[alg])
+          f.write(self.present[alg])
+      os.replace(tmp_path, path)
+    except:
+      if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+      raise
+
+
+  @classmethod
+  def load(cls, path):
+    """
+    read a sidecar written by save and return (store, header)
+    """
+    with open(path, 'rb') as f:
+      if f.read(len(SIDECAR_MAGIC)) != SIDECAR_MAGIC:
+        raise ValueError("not a manifest store")
+      header_size, = HEADER_SIZE.unpack(f.read(HEADER_SIZE.size))
+      header = json.loads(f.read(header_size).decode('utf-8'))
+
+      store = cls(header["algs"])
+      store.dirs = header["dirs"]
+      store.malformed = header["malformed"]
+      count = header["count"]
+      store.names = f.read(header["names"])
+      store.name_offsets = array('Q')
+      store.name_offsets.frombytes(f.read(store.name_offsets.itemsize * (count + 1)))
+      store.dir_ids.frombytes(f.read(store.dir_ids.itemsize * count))
+      for alg in store.algs:
+        store.digests[alg] = f.read(store.digest_sizes[alg] * count)
+        store.present[alg] = bytearray(f.read(count))
+
+    if (len(store.name_offsets) != count + 1 or len(store.dir_ids) != count or
+      any(len(store.digests[alg]) != store.digest_sizes[alg] * count or
+      len(store.present[alg]) != count for alg in store.algs)):
+      raise ValueError("truncated manifest store")
+
+    return store, header
@@ -0,0 +1,91 @@
+import os, logging
+from collections import OrderedDict, namedtuple
+
+
+LOGGER = logging.getLogger(__name__)
+
+PayloadFile = namedtuple("PayloadFile", ["path", "size", "mtime_ns", "ext"])
+
+
+class PayloadInventory:
+  """
+  Path, size, mtime and extension of every file in a bag's data directory,
+  collected in a single os.scandir walk so the bag checks do not need to
+  walk or stat the payload again. Files that cannot be stat'ed, such as
+  broken symlinks, are still listed, as os.walk would list them, with no
+  size or mtime, and their paths are kept in unreadable.
+  """
+
+  def __init__(self, bag_path):
+    self.bag_path = os.path.abspath(bag_path)
+    self.files = OrderedDict()
+    self.unreadable = []
+    self.scan()
+
+
+  def scan(self):
+    self.files.clear()
+    del self.unreadable[:]
+
+    # like os.walk, do not descend into symlinked directories
+    stack = ["data"]
+    while stack:
+      rel_dir = stack.pop()
+      try:
+        entries = sorted(os.scandir(os.path.join(self.bag_path, rel_dir)),
+          key = lambda entry: entry.name)
+      except OSError as e:
+        LOGGER.warning("Unable to list {}: {}".format(rel_dir, e))
+        continue
+
+      subdirs = []
+      for entry in entries:
+        rel_path = os.path.join(rel_dir, os.path.normpath(entry.name))
+        if entry.is_dir():
+          if not entry.is_symlink():
+            subdirs.append(rel_path)
+          continue
+        ext = os.path.splitext(entry.name)[1].lower()
+        try:
+          stat = entry.stat()
+        except OSError as e:
+          LOGGER.warning("Unable to read {}: {}".format(rel_path, e))
+          self.unreadable.append(rel_path)
+          self.files[rel_path] = PayloadFile(rel_path, None, None, ext)
+          continue
+        self.files[rel_path] = PayloadFile(rel_path, stat.st_size,
+          stat.st_mtime_ns, ext)
+
+      stack.extend(reversed(subdirs))
+
+    return self.files
+
+
+  def __iter__(self):
+    return iter(self.files)
+
+
+  def __len__(self):
+    return len(self.files)
+
+
+  def __contains__(self, path):
+    return path in self.files
+
+
+  def get(self, path):
+    return self.files.get(path)
+
+
+  def remove(self, path):
+    self.files.pop(path, None)
+    if path in self.unreadable:
+      self.unreadable.remove(path)
+
+
+  def total_bytes(self):
+    return sum(payload_file.size or 0 for payload_file in self.files.values())
+
+
+  def oxum(self):
+    return "{0}.{1}".format(self.total_bytes(), len(self.files))
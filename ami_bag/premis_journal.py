@@ -0,0 +1,108 @@
+import os, json, logging
+
+
+LOGGER = logging.getLogger(__name__)
+
+PREMIS_JSON = 'premis-events.json'
+PREMIS_JOURNAL = 'premis-events.jsonl'
+
+READ_SIZE = 64 * 1024
+
+
+def iter_json_array(f, read_size = READ_SIZE):
+  """
+  yield the items of a JSON array one at a time without loading the
+  whole file
+  """
+  decoder = json.JSONDecoder()
+  buffer = ""
+  started = False
+  eof = False
+
+  while True:
+    buffer = buffer.lstrip(" \t\r\n" + ("," if started else ""))
+    if buffer and not started:
+      if not buffer.startswith("["):
+        raise ValueError("{} is not a JSON array".format(f.name))
+      buffer = buffer[1:]
+      started = True
+      continue
+    if buffer.startswith("]"):
+      return
+    if buffer:
+      try:
+        item, end = decoder.raw_decode(buffer)
+      except ValueError:
+        if eof:
+          raise
+      else:
+        yield item
+        buffer = buffer[end:]
+        continue
+    elif eof:
+      return
+
+    chunk = f.read(read_size)
+    if not chunk:
+      eof = True
+    buffer += chunk
+
+
+def iter_premis_events(bag_path):
+  """
+  stream the events in a bag's premis-events.json, then the ones appended
+  to premis-events.jsonl since it was last compacted
+  """
+  json_path = os.path.join(bag_path, PREMIS_JSON)
+  if os.path.isfile(json_path):
+    with open(json_path, 'r', encoding = 'utf-8') as f:
+      for event in iter_json_array(f):
+        yield event
+
+  journal_path = os.path.join(bag_path, PREMIS_JOURNAL)
+  if os.path.isfile(journal_path):
+    with open(journal_path, 'r', encoding = 'utf-8') as f:
+      for line in f:
+        if not line.strip():
+          continue
+        try:
+          yield json.loads(line)
+        except ValueError:
+          # the last line may be cut short if a run was killed
+          LOGGER.warning("Skipping unreadable line in {}".format(journal_path))
+
+
+def append_premis_events(bag_path, events):
+  """
+  append events to the bag's journal and fsync it
+  """
+  journal_path = os.path.join(bag_path, PREMIS_JOURNAL)
+  created = not os.path.exists(journal_path)
+
+  with open(journal_path, 'a', encoding = 'utf-8') as f:
+    for event in events:
+      f.write(json.dumps(event) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+  if created:
+    dir_fd = os.open(bag_path, os.O_RDONLY)
+    try:
+      os.fsync(dir_fd)
+    finally:
+      os.close(dir_fd)
+
+  return journal_path
+
+
+def premis_json_lines(events):
+  """
+  serialize events as the canonical premis-events.json array, one chunk
+  at a time
+  """
+  yield "["
+  for i, event in enumerate(events):
+    if i:
+      yield ", "
+    yield json.dumps(event)
+  yield "]"
@@ -0,0 +1,160 @@
+import os, glob, json, time, hashlib, sqlite3, logging
+
+from ami_bag.fixity_cache import default_cache_path
+
+
+LOGGER = logging.getLogger(__name__)
+
+# how thoroughly payload fixity was checked, weakest first
+FIXITY_LEVELS = ["none", "sample", "quick", "full"]
+
+KEY_FILE_PATTERNS = ["bag-info.txt", "manifest-*.txt", "tagmanifest-*.txt"]
+
+
+def default_results_path():
+  """
+  location of the shared results store in the user's cache directory
+  """
+  return os.path.join(os.path.dirname(default_cache_path()), "results.sqlite")
+
+
+def bag_digest(bag_path):
+  """
+  sha256 over the names and contents of a bag's bag-info.txt, manifests
+  and tag manifests, which change whenever the bag is rebagged or repaired
+  """
+  paths = set()
+  for pattern in KEY_FILE_PATTERNS:
+    paths.update(glob.glob(os.path.join(glob.escape(bag_path), pattern)))
+
+  digest = hashlib.sha256()
+  for path in sorted(paths):
+    digest.update(os.path.basename(path).encode('utf-8') + b"\0")
+    with open(path, 'rb') as f:
+      for block in iter(lambda: f.read(1024 * 1024), b""):
+        digest.update(block)
+    digest.update(b"\0")
+
+  return digest.hexdigest()
+
+
+def fixity_level(fast, sample = None, quick = False, unbounded_cache = False):
+  """
+  how much of a bag's fixity a run checked. A full run that reuses cached
+  digests with no maximum age never re-reads unchanged files, so it checks
+  no more than a quick run.
+  """
+  if not fast:
+    return "quick" if unbounded_cache else "full"
+  if quick:
+    return "quick"
+  if sample:
+    return "sample"
+  return "none"
+
+
+class ResultsStore:
+  """
+  On-disk history of validate_amibag results, keyed by the bag's path and
+  the digest of its manifests and bag-info.txt. A bag whose digest matches
+  a passing run that checked at least as much does not need to be
+  validated again.
+  """
+
+  def __init__(self, path = None):
+    if not path:
+      path = default_results_path()
+    self.path = os.path.abspath(path)
+
+    store_dir = os.path.dirname(self.path)
+    if not os.path.isdir(store_dir):
+      os.makedirs(store_dir)
+
+    self.conn = sqlite3.connect(self.path, timeout = 60)
+    self.conn.row_factory = sqlite3.Row
+    self.conn.execute("PRAGMA journal_mode = WAL")
+    self.conn.execute("PRAGMA synchronous = NORMAL")
+    self.conn.execute("""
+      CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY,
+        bag_path TEXT NOT NULL,
+        bag_digest TEXT NOT NULL,
+        fixity TEXT NOT NULL,
+        metadata INTEGER NOT NULL,
+        valid INTEGER NOT NULL,
+        type TEXT,
+        subtype TEXT,
+        checks TEXT,
+        error TEXT,
+        seconds REAL,
+        validated REAL NOT NULL
+      )""")
+    self.conn.execute("""
+      CREATE INDEX IF NOT EXISTS results_bag
+      ON results (bag_path, bag_digest)""")
+    self.conn.commit()
+
+
+  def record(self, result, digest, fixity, metadata, checks = None):
+    """
+    store one validate_ami_bags.py result and the outcome of each check
+    """
+    self.conn.execute("""
+      INSERT INTO results
+        (bag_path, bag_digest, fixity, metadata, valid, type, subtype,
+        checks, error, seconds, validated)
+      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+      (result["path"], digest, fixity, int(metadata), int(result["valid"]),
+      result["type"], result["subtype"], json.dumps(checks or {}),
+      result["error"], result.get("seconds"), time.time()))
+    self.conn.commit()
+
+
+  def lookup(self, bag_path, digest, fixity, metadata):
+    """
+    latest passing result for an unchanged bag that checked fixity and
+    metadata at least as thoroughly as requested, or None
+    """
+    levels = FIXITY_LEVELS[FIXITY_LEVELS.index(fixity):]
+    row = self.conn.execute("""
+      SELECT * FROM results
+      WHERE bag_path = ? AND bag_digest = ? AND valid = 1 AND metadata >= ?
+        AND fixity IN ({})
+      ORDER BY validated DESC LIMIT 1""".format(", ".join("?" for level in levels)),
+      [bag_path, digest, int(metadata)] + levels).fetchone()
+
+    if row:
+      return self.row_to_result(row)
+    return None
+
+
+  def history(self, bag_path = None, limit = None):
+    """
+    recorded results, newest first, for one bag or every bag
+    """
+    query = "SELECT * FROM results"
+    params = []
+    if bag_path:
+      query += " WHERE bag_path = ?"
+      params.append(bag_path)
+    query += " ORDER BY validated DESC, id DESC"
+    if limit:
+      query += " LIMIT ?"
+      params.append(limit)
+
+    return [self.row_to_result(row) for row in self.conn.execute(query, params)]
+
+
+  def row_to_result(self, row):
+    return {"bag": os.path.basename(row["bag_path"]), "path": row["bag_path"],
+      "valid": bool(row["valid"]), "type": row["type"],
+      "subtype": row["subtype"], "error": row["error"],
+      "seconds": row["seconds"], "fixity": row["fixity"],
+      "metadata": bool(row["metadata"]), "checks": json.loads(row["checks"]),
+      "digest": row["bag_digest"],
+      "validated": time.strftime("%Y-%m-%dT%H:%M:%S",
+        time.localtime(row["validated"]))}
+
+
+  def close(self):
+    self.conn.close()
@@ -0,0 +1,362 @@
+import os, glob, shutil, hashlib, logging, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+
+import bagit
+
+from ami_metrics.metrics import stage
+from ami_bag.fixity_io import DEFAULT_READ_OPTIONS, iter_blocks
+from ami_bag.update_bag import Repairable_Bag, find_tag_files, hash_file
+
+
+LOGGER = logging.getLogger(__name__)
+
+# auto: reflink, else copy_file_range, else stream. reflink and
+# copy_file_range fall back to stream when the filesystems cannot do them.
+# stream: read and write through a buffer, hashing on the way
+COPY_METHODS = ("auto", "reflink", "copy_file_range", "stream")
+
+# how files copied in the kernel are checked. full: hash the copy, size:
+# compare sizes and trust the manifest digests, none: no check. Streamed
+# copies are always hashed, since the bytes pass through anyway.
+VERIFY_POLICIES = ("full", "size", "none")
+
+# linux ioctl to share a file's extents with another file (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+
+COPY_RANGE_CHUNK = 1024 * 1024 * 1024
+
+
+class SizeMismatch(bagit.ManifestErrorDetail):
+  def __init__(self, path, expected, found):
+    super(SizeMismatch, self).__init__(path)
+    self.expected = expected
+    self.found = found
+
+  def __str__(self):
+    return "{} size validation failed: expected={} found={}".format(
+      self.path, self.expected, self.found)
+
+
+def partial_path(destination):
+  """
+  hidden directory next to the destination that a bag is copied into
+  before it is renamed into place
+  """
+  dirname, basename = os.path.split(os.path.abspath(destination))
+  return os.path.join(dirname, ".{}.partial".format(basename))
+
+
+def fsync_directory(path):
+  try:
+    dir_fd = os.open(path, os.O_RDONLY)
+  except OSError:
+    return
+  try:
+    os.fsync(dir_fd)
+  except OSError:
+    pass
+  finally:
+    os.close(dir_fd)
+
+
+def reflink(src_fd, dst_fd):
+  """
+  make dst share src's extents, on filesystems that support it (Btrfs,
+  XFS with reflink=1)
+  """
+  if fcntl is None:
+    return False
+  try:
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+  except OSError:
+    return False
+  return True
+
+
+def copy_range(src_fd, dst_fd):
+  """
+  copy a file inside the kernel with copy_file_range, which never passes
+  the bytes through user space and can be offloaded by the filesystem.
+  On failure, dst is emptied for a fallback copy.
+  """
+  if not hasattr(os, "copy_file_range"):
+    return False
+  try:
+    while os.copy_file_range(src_fd, dst_fd, COPY_RANGE_CHUNK):
+      pass
+  except OSError:
+    os.ftruncate(dst_fd, 0)
+    os.lseek(dst_fd, 0, os.SEEK_SET)
+    return False
+  return True
+
+
+def kernel_copy(src, dst_fd, method = "auto"):
+  """
+  copy src into an empty dst_fd without reading it into user space and
+  return the method used, or None if the filesystems support neither
+  """
+  with open(src, 'rb', buffering = 0) as f:
+    if method in ("auto", "reflink") and reflink(f.fileno(), dst_fd):
+      return "reflink"
+    if method in ("auto", "copy_file_range") and copy_range(f.fileno(), dst_fd):
+      return "copy_file_range"
+  return None
+
+
+def stream_copy(src, f, algs, read_options = None, record = None):
+  """
+  write src to f block by block, feeding every block to a hasher for each
+  algorithm on the way, and return the digests
+  """
+  hashers = dict((alg, hashlib.new(alg)) for alg in algs)
+  for block in iter_blocks(src, read_options or DEFAULT_READ_OPTIONS):
+    f.write(block)
+    if record is not None:
+      record["bytes"] += len(block)
+    for hasher in hashers.values():
+      hasher.update(block)
+  return dict((alg, hasher.hexdigest()) for alg, hasher in hashers.items())
+
+
+def copy_file(src, dst, algs, method = "auto", verify = "full",
+  read_options = None, bag = None):
+  """
+  copy a file to a temporary file next to dst and return (temporary path,
+  digests, method used). Digests are None if the copy was made in the
+  kernel and verify is not full. The caller renames the temporary file
+  into place once the copy checks out.
+  """
+  if method not in COPY_METHODS:
+    raise ValueError("Unknown copy method {}".format(method))
+  if verify not in VERIFY_POLICIES:
+    raise ValueError("Unknown verification policy {}".format(verify))
+
+  dirname, basename = os.path.split(dst)
+  fd, tmp_path = tempfile.mkstemp(dir = dirname, prefix = "." + basename + ".")
+  try:
+    with stage("transfer", bag = bag, path = src) as record:
+      with os.fdopen(fd, 'wb') as f:
+        used = None
+        if method != "stream":
+          used = kernel_copy(src, f.fileno(), method)
+        if used:
+          hashes = None
+          record["bytes"] += os.fstat(f.fileno()).st_size
+        else:
+          used = "stream"
+          hashes = stream_copy(src, f, algs, read_options, record)
+        f.flush()
+        os.fsync(f.fileno())
+    shutil.copystat(src, tmp_path)
+    if hashes is None and verify == "full":
+      hashes = hash_file(tmp_path, algs, read_options, bag = bag)
+  except:
+    if os.path.exists(tmp_path):
+      os.remove(tmp_path)
+    raise
+
+  return tmp_path, hashes, used
+
+
+def bag_files(bag):
+  """
+  path of every file in a bag relative to it, payload first
+  """
+  for payload_file in sorted(bag.inventory):
+    yield payload_file
+  for tag_file in find_tag_files(bag.path):
+    yield tag_file
+  for tagmanifest in sorted(glob.glob(os.path.join(glob.escape(bag.path),
+    "tagmanifest-*.txt"))):
+    yield os.path.basename(tagmanifest)
+
+
+class BagTransfer:
+  """
+  Copy of one bag to a destination that reads every file once. Each file
+  is copied by reflink or copy_file_range where the filesystems allow,
+  otherwise hashed as it is written, checked against the source manifests
+  according to the verification policy, and only then renamed to its own
+  name. The bag is assembled in a hidden
+  directory next to the destination and renamed into place when every
+  file has been verified, so a destination bag is always complete. Payload
+  files already verified by an interrupted transfer are not copied again.
+  """
+
+  def __init__(self, bag_path, destination, threads = 1, read_options = None,
+    fixity_cache = None, repairer = None, method = "auto", verify = "full"):
+    self.bag = Repairable_Bag(path = bag_path)
+    self.destination = os.path.abspath(destination)
+    self.partial = partial_path(self.destination)
+    self.threads = threads
+    self.read_options = read_options
+    self.fixity_cache = fixity_cache
+    self.repairer = repairer
+    self.method = method
+    self.verify = verify
+    self.algs = set(self.bag.algorithms)
+    self.entries = dict((bagit.normalize_unicode(entry), hashes)
+      for entry, hashes in self.bag.entries.items())
+    self.summary = {"bag": self.bag.path, "destination": self.destination,
+      "files": 0, "bytes": 0, "resumed": 0,
+      "methods": dict((method, 0) for method in COPY_METHODS[1:])}
+    self.lock = threading.Lock()
+
+
+  def check_source(self):
+    """
+    refuse to copy a bag whose payload does not match its manifests
+    """
+    diff = self.bag.diff_payload()
+    if diff.new or diff.missing:
+      raise bagit.BagValidationError("Cannot transfer an incomplete bag: "
+        "{} files not in the manifests, {} files missing".format(
+        len(diff.new), len(diff.missing)))
+    if not self.bag.check_oxum():
+      raise bagit.BagValidationError("Cannot transfer a bag whose "
+        "Payload-Oxum does not match its payload")
+
+
+  def remove_stale_files(self, rel_paths):
+    """
+    delete temporary and unknown files left in the partial bag by an
+    interrupted transfer
+    """
+    for dirpath, dirnames, filenames in os.walk(self.partial):
+      for filename in filenames:
+        path = os.path.join(dirpath, filename)
+        if os.path.relpath(path, self.partial) not in rel_paths:
+          LOGGER.info("Removing {} left by an earlier transfer".format(path))
+          os.remove(path)
+
+
+  def transfer_file(self, rel_path):
+    """
+    copy one file into the partial bag and return a ChecksumMismatch for
+    each digest that differs from the source manifests
+    """
+    src = os.path.join(self.bag.path, rel_path)
+    dst = os.path.join(self.partial, rel_path)
+    dst_dir = os.path.dirname(dst)
+    if not os.path.isdir(dst_dir):
+      os.makedirs(dst_dir, exist_ok = True)
+
+    expected = self.entries.get(bagit.normalize_unicode(rel_path), {})
+    tmp_path, hashes, method = copy_file(src, dst, self.algs | set(expected),
+      self.method, self.verify, self.read_options, self.bag.path)
+
+    errors = []
+    if hashes is not None:
+      for alg, stored_hash in expected.items():
+        if stored_hash.lower() != hashes[alg]:
+          e = bagit.ChecksumMismatch(rel_path, alg, stored_hash.lower(), hashes[alg])
+          LOGGER.warning(str(e))
+          errors.append(e)
+    elif self.verify == "size":
+      expected_size = os.path.getsize(src)
+      found_size = os.path.getsize(tmp_path)
+      if expected_size != found_size:
+        e = SizeMismatch(rel_path, expected_size, found_size)
+        LOGGER.warning(str(e))
+        errors.append(e)
+
+    if errors:
+      os.remove(tmp_path)
+      return errors
+
+    os.replace(tmp_path, dst)
+    if self.fixity_cache and hashes is not None and rel_path in self.bag.inventory:
+      self.fixity_cache.record(self.destination, rel_path, os.stat(dst),
+        dict((alg, hashes[alg]) for alg in self.algs))
+    with self.lock:
+      self.summary["files"] += 1
+      self.summary["bytes"] += os.path.getsize(dst)
+      self.summary["methods"][method] += 1
+    return errors
+
+
+  def run(self):
+    """
+    copy, verify and rename the bag into place, then record the transfer
+    in its PREMIS events. Raises a BagValidationError, leaving the partial
+    bag for a later run to resume, if any file does not match.
+    """
+    if os.path.exists(self.destination):
+      raise bagit.BagError("Destination already exists: {}".format(self.destination))
+
+    self.check_source()
+
+    rel_paths = list(bag_files(self.bag))
+    self.remove_stale_files(set(rel_paths))
+
+    to_copy = []
+    for rel_path in rel_paths:
+      if (rel_path in self.bag.inventory and
+        os.path.isfile(os.path.join(self.partial, rel_path))):
+        self.summary["resumed"] += 1
+      else:
+        to_copy.append(rel_path)
+    if self.summary["resumed"]:
+      LOGGER.info("Resuming transfer of {}, {} files already verified".format(
+        self.bag.path, self.summary["resumed"]))
+
+    if self.threads == 1:
+      results = (self.transfer_file(rel_path) for rel_path in to_copy)
+    else:
+      executor = ThreadPoolExecutor(max_workers = self.threads)
+      futures = [executor.submit(self.transfer_file, rel_path)
+        for rel_path in to_copy]
+      results = (future.result() for future in futures)
+
+    errors = []
+    try:
+      for file_errors in results:
+        errors.extend(file_errors)
+    finally:
+      if self.threads != 1:
+        for future in futures:
+          future.cancel()
+        executor.shutdown()
+
+    if errors:
+      raise bagit.BagValidationError("Transfer verification failed", errors)
+
+    if self.verify == "full":
+      checked = "verifying every file against the manifests"
+    elif self.verify == "size":
+      checked = "checking the size of every file copied in the kernel"
+    else:
+      checked = "without verifying files copied in the kernel"
+
+    copied = Repairable_Bag(path = self.partial, repairer = self.repairer)
+    copied.add_premisevent(process = "Bag Transfer",
+      msg = "Copied from {} to {}, {}".format(
+        self.bag.path, self.destination, checked),
+      outcome = "Pass", sw_agent = "transfer_bag")
+    copied.write_premisjson()
+    copied.write_tag_manifests()
+
+    for dirpath, dirnames, filenames in os.walk(self.partial):
+      fsync_directory(dirpath)
+    os.rename(self.partial, self.destination)
+    fsync_directory(os.path.dirname(self.destination))
+
+    LOGGER.info("Transferred {} to {}: {} files, {} bytes ({})".format(
+      self.bag.path, self.destination, self.summary["files"],
+      self.summary["bytes"], ", ".join("{} by {}".format(count, method)
+      for method, count in self.summary["methods"].items() if count)))
+
+    return self.summary
+
+
+def transfer_bag(bag_path, destination, **kwargs):
+  """
+  copy a bag to destination, verifying it on the way; see BagTransfer
+  """
+  return BagTransfer(bag_path, destination, **kwargs).run()
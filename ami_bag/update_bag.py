@@ -1,9 +1,18 @@
-import os, re, json, shutil, logging
+import os, re, shutil, logging, hashlib, tempfile, itertools
 import datetime
 import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import bagit
 
+from ami_bag.payload_inventory import PayloadInventory
+from ami_metrics.metrics import stage
+from ami_bag.fixity_io import DEFAULT_READ_OPTIONS, iter_blocks
+from ami_bag.fixity_sample import SAMPLE_WEIGHTS, choose_sample, sample_summary
+from ami_bag.premis_journal import (PREMIS_JSON, PREMIS_JOURNAL,
+  iter_premis_events, append_premis_events, premis_json_lines)
+
 
 SYSTEM_FILE_PATTERNS = {
     "Thumbs.db": {
@@ -26,27 +35,157 @@ SYSTEM_FILE_PATTERNS = {
 
 LOGGER = logging.getLogger(__name__)
 
+PayloadDiff = namedtuple("PayloadDiff",
+  ["new", "missing", "size_changed", "mtime_changed"])
+
 #NEED EXCEPTION CLASS
 
+def hash_file(filepath, algs, read_options = None, bag = None):
+  """
+  read a file once and feed every block to a hasher for each algorithm
+  """
+  hashers = dict((alg, hashlib.new(alg)) for alg in algs)
+
+  with stage("hash", bag = bag, path = filepath) as record:
+    for block in iter_blocks(filepath, read_options or DEFAULT_READ_OPTIONS):
+      record["bytes"] += len(block)
+      for hasher in hashers.values():
+        hasher.update(block)
+
+  return dict((alg, hasher.hexdigest()) for alg, hasher in hashers.items())
+
+
+def stat_and_hash_file(filepath, algs, bag = None, read_options = None):
+  """
+  stat a file before hashing it so the digests can be cached against it
+  """
+  stat = os.stat(filepath)
+  return stat, hash_file(filepath, algs, read_options, bag = bag)
+
+
+def write_file_atomically(path, lines):
+  """
+  write lines to a temporary file next to path, fsync it, and rename it
+  over path so readers never see a partially written file
+  """
+  dirname, basename = os.path.split(path)
+  fd, tmp_path = tempfile.mkstemp(dir = dirname, prefix = "." + basename + ".")
+  try:
+    with os.fdopen(fd, 'w', encoding = 'utf-8') as f:
+      for line in lines:
+        f.write(line)
+      f.flush()
+      os.fsync(f.fileno())
+    if os.path.exists(path):
+      shutil.copymode(path, tmp_path)
+    else:
+      os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+  except:
+    if os.path.exists(tmp_path):
+      os.remove(tmp_path)
+    raise
+
+  try:
+    dir_fd = os.open(dirname, os.O_RDONLY)
+  except OSError:
+    return
+  try:
+    os.fsync(dir_fd)
+  except OSError:
+    pass
+  finally:
+    os.close(dir_fd)
+
+
+def read_manifest_lines(manifest_path):
+  """
+  yield (raw line, hash, decoded path) for each entry in a manifest
+  """
+  with open(manifest_path, 'r', encoding = 'utf-8-sig') as manifest:
+    for line in manifest:
+      entry = line.strip().split(None, 1)
+      if len(entry) != 2 or entry[0].startswith("#"):
+        continue
+      entry_path = bagit._decode_filename(
+        os.path.normpath(entry[1].lstrip("*")))
+      yield line if line.endswith("\n") else line + "\n", entry[0], entry_path
+
+
+def find_tag_files(bag_path):
+  """
+  tag files covered by a tagmanifest, relative to the bag, without
+  depending on the current working directory
+  """
+  for dirpath, dirnames, filenames in os.walk(bag_path):
+    rel_dir = os.path.relpath(dirpath, bag_path)
+    if rel_dir == os.curdir:
+      rel_dir = ""
+      dirnames[:] = [dirname for dirname in dirnames if dirname != "data"]
+    dirnames.sort()
+    for filename in sorted(filenames):
+      if not filename.startswith("tagmanifest-"):
+        yield os.path.join(rel_dir, filename)
+
+
 class Repairable_Bag(bagit.Bag):
 
-  def __init__(self, repairer = None, dryrun = False, *args, **kwargs):
+  def __init__(self, repairer = None, dryrun = False, hash_threads = 1,
+    fixity_cache = None, checkpoint = None, read_options = None,
+    *args, **kwargs):
     super(Repairable_Bag, self).__init__(*args, **kwargs)
-    self.old_dir = os.path.abspath(os.path.curdir)
     self.manifests_updated = False
     self.dryrun = dryrun
+    self.hash_threads = hash_threads
+    self.fixity_cache = fixity_cache
+    self.checkpoint = checkpoint
+    self.read_options = read_options
+    self.sample_summary = None
+    self.quick_summary = None
+    self._inventory = None
+    self.manifest_changes = {"added": set(), "changed": set(), "removed": set()}
+    self.tagfiles_updated = set()
+    self._payload_diff = None
 
     if repairer:
       self.repairer = repairer
     else:
       self.repairer = None
 
-    self.premis_path = os.path.join(self.path, 'premis-events.json')
-    if os.path.isfile(self.premis_path):
-      with open(self.premis_path, 'r') as f:
-        self.premis_events = json.load(f)
+    self.premis_path = os.path.join(self.path, PREMIS_JSON)
+    self.premis_journal_path = os.path.join(self.path, PREMIS_JOURNAL)
+    self._premis_events = None
+    self.pending_premis_events = []
+
+
+  @property
+  def premis_events(self):
+    """
+    every recorded and pending event, read on first use
+    """
+    if self._premis_events is None:
+      self._premis_events = (list(iter_premis_events(self.path)) +
+        self.pending_premis_events)
+    return self._premis_events
+
+
+  def iter_premis_events(self, event_type = None, since = None):
+    """
+    stream recorded and pending events, optionally only those of one type
+    or from a timestamp (YYYYmmddHHMMSS) onwards
+    """
+    if self._premis_events is not None:
+      events = self._premis_events
     else:
-      self.premis_events = []
+      events = itertools.chain(iter_premis_events(self.path),
+        list(self.pending_premis_events))
+
+    for event in events:
+      if event_type and event.get('Event-Type') != event_type:
+        continue
+      if since and event.get('Event-Date-Time', '') < since:
+        continue
+      yield event
 
 
   def add_premisevent(self, process, msg, outcome, sw_agent,
@@ -65,16 +204,96 @@ class Repairable_Bag(bagit.Bag):
     elif self.repairer:
       premis_event['Event-Human-Agent'] = self.repairer
 
-    self.premis_events.append(premis_event)
+    self.pending_premis_events.append(premis_event)
+    if self._premis_events is not None:
+      self._premis_events.append(premis_event)
 
 
   def write_premisjson(self):
-    with open(self.premis_path, 'w') as f:
-      json.dump(self.premis_events, f)
+    """
+    append pending events to premis-events.jsonl rather than rewriting
+    premis-events.json
+    """
+    if not self.pending_premis_events:
+      return False
+
+    append_premis_events(self.path, self.pending_premis_events)
+    self.pending_premis_events = []
+    self.tagfiles_updated.add(PREMIS_JOURNAL)
 
     return True
 
 
+  def compact_premisjson(self):
+    """
+    fold the journal into premis-events.json, remove it, and update the
+    tag manifests
+    """
+    if self.dryrun:
+      return False
+
+    self.write_premisjson()
+    if not os.path.isfile(self.premis_journal_path):
+      return False
+
+    write_file_atomically(self.premis_path,
+      premis_json_lines(iter_premis_events(self.path)))
+    os.remove(self.premis_journal_path)
+    self.tagfiles_updated.add(PREMIS_JSON)
+    self.entries.pop(PREMIS_JOURNAL, None)
+    self.write_tag_manifests()
+
+    return True
+
+
+  @property
+  def inventory(self):
+    """
+    single-walk listing of the payload, built on first use
+    """
+    if self._inventory is None:
+      self._inventory = PayloadInventory(self.path)
+      for payload_file in self._inventory:
+        self.normalized_filesystem_names[
+          bagit.normalize_unicode(payload_file)] = payload_file
+    return self._inventory
+
+
+  def refresh_inventory(self):
+    self._inventory = None
+    self._payload_diff = None
+
+
+  def payload_files(self):
+    return iter(self.inventory)
+
+
+  def validate(self, *args, **kwargs):
+    self.refresh_inventory()
+    return super(Repairable_Bag, self).validate(*args, **kwargs)
+
+
+  def _validate_oxum(self):
+    oxum = self.info.get("Payload-Oxum")
+    if oxum is None:
+      return
+
+    if isinstance(oxum, list):
+      LOGGER.warning("bag-info.txt defines multiple Payload-Oxum values!")
+      oxum = oxum[0]
+
+    oxum_byte_count, oxum_file_count = oxum.split(".", 1)
+    if not oxum_byte_count.isdigit() or not oxum_file_count.isdigit():
+      raise bagit.BagError("Malformed Payload-Oxum value: {}".format(oxum))
+
+    total_bytes = self.inventory.total_bytes()
+    total_files = len(self.inventory)
+    if int(oxum_file_count) != total_files or int(oxum_byte_count) != total_bytes:
+      raise bagit.BagValidationError("Payload-Oxum validation failed. "
+        "Expected {} files and {} bytes but found {} files and {} bytes".format(
+        oxum_file_count, oxum_byte_count, total_files, total_bytes))
+
+
   def check_oxum(self):
     try:
       self._validate_oxum()
@@ -87,15 +306,7 @@ class Repairable_Bag(bagit.Bag):
     if self.check_oxum():
       return False
 
-    total_bytes = 0
-    total_files = 0
-
-    for payload_file in self.payload_files():
-      payload_file = os.path.join(self.path, payload_file)
-      total_bytes += os.stat(payload_file).st_size
-      total_files += 1
-
-    generated_oxum = "{0}.{1}".format(total_bytes, total_files)
+    generated_oxum = self.inventory.oxum()
 
     if self.info["Payload-Oxum"] != generated_oxum:
 
@@ -111,6 +322,7 @@ class Repairable_Bag(bagit.Bag):
         LOGGER.error("Do not have permission to overwrite bag-info")
       else:
         LOGGER.info("bag-info.txt written")
+        self.tagfiles_updated.add("bag-info.txt")
 
     return True
 
@@ -129,6 +341,7 @@ class Repairable_Bag(bagit.Bag):
       except:
         LOGGER.error("Do not have permission to write new manifests")
       else:
+        self.tagfiles_updated.add(os.path.basename(copy_manifest_path))
         self.add_premisevent(process = "Copy Bag Manifest",
           msg = "{} copied to {} before writing new manifest".format(
             os.path.basename(manifest_path),
@@ -136,29 +349,88 @@ class Repairable_Bag(bagit.Bag):
           outcome = "Pass", sw_agent = sys._getframe().f_code.co_name)
 
       try:
-        with open(manifest_path, 'w') as manifest:
-          for payload_file, hashes in self.entries.items():
-            if payload_file.startswith("data" + os.sep):
-              manifest.write("{} {}\n".format(hashes[alg], bagit._encode_filename(payload_file)))
+        write_file_atomically(manifest_path,
+          self.updated_manifest_lines(manifest_path, alg))
       except:
         LOGGER.error("Do not have permission to overwrite hash manifests")
       else:
         LOGGER.info("{} written".format(manifest_path))
+        self.tagfiles_updated.add(os.path.basename(manifest_path))
         self.add_premisevent(process = "Write Bag Manifest",
           msg = "{} written as a result of new or updated payload files".format(
             os.path.basename(manifest_path)),
           outcome = "Pass", sw_agent = sys._getframe().f_code.co_name)
 
+    self.manifest_changes = {"added": set(), "changed": set(), "removed": set()}
+
     return True
 
 
+  def updated_manifest_lines(self, manifest_path, alg):
+    """
+    apply the pending change set to an existing manifest, keeping every
+    untouched line as it was
+    """
+    if not os.path.isfile(manifest_path):
+      return ["{} {}\n".format(hashes[alg], bagit._encode_filename(payload_file))
+        for payload_file, hashes in sorted(self.payload_entries().items())]
+
+    lines = []
+    written = set()
+    for line, entry_hash, entry_path in read_manifest_lines(manifest_path):
+      if entry_path in self.manifest_changes["removed"]:
+        continue
+      if entry_path in self.manifest_changes["changed"] or entry_path in self.manifest_changes["added"]:
+        line = "{} {}\n".format(self.entries[entry_path][alg],
+          bagit._encode_filename(entry_path))
+      lines.append(line)
+      written.add(entry_path)
+
+    for payload_file in sorted(self.manifest_changes["added"] - written):
+      lines.append("{} {}\n".format(self.entries[payload_file][alg],
+        bagit._encode_filename(payload_file)))
+
+    return lines
+
+
   def write_tag_manifests(self):
-    for alg in set(self.algs):
+    """
+    rewrite the tag manifests. A tag file's digests are reused from the
+    fixity cache only when the file has the size, mtime and inode it had
+    when they were recorded and this bag has not rewritten it since;
+    every other tag file is hashed, so edits made outside this instance
+    are picked up
+    """
+    algs = set(self.algs)
+    tag_hashes = {}
+    for tag_file in find_tag_files(self.path):
+      filepath = os.path.join(self.path, tag_file)
+      cached = None
+      if self.fixity_cache and tag_file not in self.tagfiles_updated:
+        cached = self.fixity_cache.lookup(self.path, tag_file,
+          os.stat(filepath), algs)
+      if cached:
+        tag_hashes[tag_file] = cached
+        continue
+      stat, hashes = stat_and_hash_file(filepath, algs, self.path,
+        self.read_options)
+      tag_hashes[tag_file] = hashes
+      if self.fixity_cache:
+        self.fixity_cache.record(self.path, tag_file, stat, hashes)
+
+    for alg in algs:
+      tagmanifest_path = os.path.join(self.path, 'tagmanifest-{}.txt'.format(alg))
+      lines = []
+      for tag_file, hashes in tag_hashes.items():
+        self.entries.setdefault(tag_file, {})[alg] = hashes[alg]
+        lines.append("{} {}\n".format(hashes[alg], tag_file))
       try:
-        bagit._make_tagmanifest_file(alg, self.path)
+        write_file_atomically(tagmanifest_path, lines)
       except:
         LOGGER.error("Do not have permission to overwrite tag manifests")
 
+    self.tagfiles_updated = set()
+
     return True
 
 
@@ -170,35 +442,282 @@ class Repairable_Bag(bagit.Bag):
       self.write_tag_manifests()
 
 
-  '''
-  def remove_manifestentry(self):
-  '''
+  def remove_manifest_entry(self, payload_file):
+    """
+    drop a payload file from the manifests, e.g. after deleting it
+    """
+    if payload_file not in self.entries:
+      return False
+
+    del self.entries[payload_file]
+    self._payload_diff = None
+    self.manifest_changes["added"].discard(payload_file)
+    self.manifest_changes["changed"].discard(payload_file)
+    self.manifest_changes["removed"].add(payload_file)
+    self.manifests_updated = True
+    return True
+
+
+  def diff_payload(self, snapshot = None):
+    """
+    compare the manifests with the payload in one walk and return the new,
+    missing, size-changed and mtime-changed files. Sizes and mtimes are
+    compared with a snapshot of {path: (size, mtime_ns)}, by default the one
+    in the fixity cache; without either, files modified after the oldest
+    manifest count as mtime-changed.
+    """
+    if self._payload_diff is not None and snapshot is None:
+      return self._payload_diff
+
+    only_in_manifest, only_on_fs = self.compare_manifests_with_fs()
+
+    if snapshot is None and self.fixity_cache:
+      snapshot = self.fixity_cache.snapshot(self.path)
+
+    size_changed = []
+    mtime_changed = []
+    if snapshot:
+      for payload_file in self.inventory.files.values():
+        if payload_file.path not in snapshot:
+          continue
+        size, mtime_ns = snapshot[payload_file.path]
+        if payload_file.size != size:
+          size_changed.append(payload_file.path)
+        elif payload_file.mtime_ns != mtime_ns:
+          mtime_changed.append(payload_file.path)
+    else:
+      manifest_mtimes = [os.stat(manifest).st_mtime_ns for
+        manifest in self.manifest_files()]
+      if manifest_mtimes:
+        written = min(manifest_mtimes)
+        new_files = set(only_on_fs)
+        mtime_changed = [payload_file.path for payload_file in
+          self.inventory.files.values() if payload_file.mtime_ns is not None
+          and payload_file.mtime_ns > written and payload_file.path not in new_files]
+
+    self._payload_diff = PayloadDiff(sorted(only_on_fs),
+      sorted(only_in_manifest), sorted(size_changed), sorted(mtime_changed))
+
+    return self._payload_diff
 
 
   def payload_files_not_in_manifest(self):
     """
     find all dem new files
     """
-    if self.compare_manifests_with_fs()[1]:
-      for payload_file in self.compare_manifests_with_fs()[1]:
-        yield payload_file
+    for payload_file in self.diff_payload().new:
+      yield payload_file
 
 
-  def add_new_hashes_for_file(self, payload_file):
+  def generate_hashes(self, payload_files, threads = None):
     """
-    add new hashes for each new files
+    hash payload files on a pool of threads, reading each file once for
+    all manifest algorithms, and return a dict shaped like self.entries.
+    Digests of unchanged files are taken from the fixity cache or the
+    checkpoint journal when either is attached.
     """
-    new_hashes = {}
-    results = bagit.generate_manifest_lines(payload_file, self.algs)
+    if not threads:
+      threads = self.hash_threads
+    algs = set(self.algs)
+    entries = {}
+    digest_stores = [store for store in (self.fixity_cache, self.checkpoint)
+      if store]
+
+    to_hash = {}
+    for payload_file in payload_files:
+      filepath = os.path.join(self.path, payload_file)
+      if digest_stores:
+        stat = os.stat(filepath)
+        for store in digest_stores:
+          cached = store.lookup(self.path, payload_file, stat, algs)
+          if cached:
+            entries[payload_file] = cached
+            break
+        if cached:
+          continue
+      to_hash[payload_file] = filepath
+
+    if digest_stores:
+      LOGGER.info("{} of {} files already hashed".format(
+        len(entries), len(entries) + len(to_hash)))
+
+    if threads == 1:
+      results = ((payload_file, stat_and_hash_file(filepath, algs, self.path,
+        self.read_options))
+        for payload_file, filepath in to_hash.items())
+    else:
+      executor = ThreadPoolExecutor(max_workers = threads)
+      futures = dict((executor.submit(stat_and_hash_file, filepath, algs,
+        self.path, self.read_options), payload_file) for payload_file, filepath in to_hash.items())
+      results = ((futures[future], future.result())
+        for future in as_completed(futures))
+
+    try:
+      for payload_file, (stat, hashes) in results:
+        entries[payload_file] = hashes
+        for store in digest_stores:
+          store.record(self.path, payload_file, stat, hashes)
+    finally:
+      if threads != 1:
+        for future in futures:
+          future.cancel()
+        executor.shutdown()
+
+    if self.checkpoint:
+      self.checkpoint.clear()
 
-    for line in results:
-        new_hashes[line[0]] = line[1]
+    return entries
+
+
+  def validate_fixity(self, threads = None):
+    """
+    recalculate hashes for every manifest entry, reusing the fixity cache
+    when one is attached, and raise a BagValidationError on mismatches
+    """
+    errors = self.fixity_errors(self.entries, threads)
+    if errors:
+      raise bagit.BagValidationError("Bag validation failed", errors)
+
+    return True
 
+
+  def fixity_errors(self, entries, threads = None):
+    """
+    hash the files behind a list of manifest entries and return a
+    ChecksumMismatch for each digest that differs from the manifest
+    """
+    fs_names = dict((entry, self.normalized_filesystem_names.get(
+      bagit.normalize_unicode(entry), entry)) for entry in entries)
+
+    try:
+      fs_hashes = self.generate_hashes(fs_names.values(), threads)
+    except OSError as e:
+      raise bagit.BagValidationError("Could not read {}".format(e.filename))
+
+    errors = []
+    for entry in fs_names:
+      errors.extend(self.checksum_mismatches(entry, fs_hashes[fs_names[entry]]))
+
+    return errors
+
+
+  def checksum_mismatches(self, entry, computed_hashes):
+    """
+    a ChecksumMismatch for each manifest digest of an entry that differs
+    from the digests computed for its file
+    """
+    errors = []
+    for alg, stored_hash in self.entries[entry].items():
+      if stored_hash.lower() != computed_hashes.get(alg):
+        e = bagit.ChecksumMismatch(entry, alg, stored_hash.lower(),
+          computed_hashes.get(alg))
+        LOGGER.warning(str(e))
+        errors.append(e)
+
+    return errors
+
+
+  def validate_sample(self, fraction, seed = 0, confidence = 0.95,
+    weights = SAMPLE_WEIGHTS, threads = None):
+    """
+    hash a seeded random sample of each payload directory, check that no
+    file is empty unless its manifest digest is the empty digest, and
+    return a summary of how many bad files the sample could have missed.
+    Raise a BagValidationError on mismatches.
+    """
+    entries = self.payload_entries()
+    errors = []
+    for entry, stored_hashes in entries.items():
+      fs_name = self.normalized_filesystem_names.get(
+        bagit.normalize_unicode(entry), entry)
+      payload_file = self.inventory.get(fs_name)
+      if not payload_file or payload_file.size != 0:
+        continue
+      for alg, stored_hash in stored_hashes.items():
+        empty_hash = hashlib.new(alg).hexdigest()
+        if stored_hash.lower() != empty_hash:
+          e = bagit.ChecksumMismatch(entry, alg, stored_hash.lower(), empty_hash)
+          LOGGER.warning(str(e))
+          errors.append(e)
+
+    strata = choose_sample(entries, fraction,
+      "{}:{}".format(seed, os.path.basename(self.path)), weights)
+    errors.extend(self.fixity_errors([entry for stratum in strata.values()
+      for entry in stratum.sample], threads))
+
+    self.sample_summary = sample_summary(strata, confidence)
+    LOGGER.info("{}: hashed {} of {} files, at {:.0%} confidence at most {} "
+      "unsampled files are bad".format(self.path, self.sample_summary["sampled"],
+      self.sample_summary["files"], confidence,
+      self.sample_summary["max_bad_files"]))
+
+    if errors:
+      raise bagit.BagValidationError("Bag validation failed", errors)
+
+    return self.sample_summary
+
+
+  def validate_quick(self, snapshot = None, threads = None):
+    """
+    stat every payload file against the size and mtime it had when its
+    digests were last computed, by default as recorded in the fixity cache,
+    and hash only the files that differ or were never recorded. The cached
+    digests of unchanged files are still checked against the manifests,
+    and files whose digests the cache no longer trusts are hashed. Files
+    that are hashed are recorded in turn, so the next check skips them.
+    Raise a BagValidationError on mismatches.
+    """
+    if snapshot is None:
+      snapshot = self.fixity_cache.snapshot(self.path) if self.fixity_cache else {}
+
+    entries = self.payload_entries()
+    to_hash = []
+    errors = []
+    for entry in entries:
+      fs_name = self.normalized_filesystem_names.get(
+        bagit.normalize_unicode(entry), entry)
+      payload_file = self.inventory.get(fs_name)
+      if not payload_file:
+        continue
+      if snapshot.get(fs_name) != (payload_file.size, payload_file.mtime_ns):
+        to_hash.append(entry)
+      elif self.fixity_cache:
+        cached = self.fixity_cache.lookup(self.path, fs_name,
+          os.stat(os.path.join(self.path, fs_name)), self.algs)
+        if cached:
+          errors.extend(self.checksum_mismatches(entry, cached))
+        else:
+          to_hash.append(entry)
+
+    errors.extend(self.fixity_errors(to_hash, threads))
+
+    self.quick_summary = {"files": len(entries), "hashed": len(to_hash)}
+    LOGGER.info("{}: {} of {} files changed or unrecorded since they were "
+      "last hashed".format(self.path, len(to_hash), len(entries)))
+
+    if errors:
+      raise bagit.BagValidationError("Bag validation failed", errors)
+
+    return self.quick_summary
+
+
+  def add_new_hashes_for_file(self, payload_file, new_hashes = None):
+    """
+    add new hashes for each new files
+    """
+    if new_hashes is None:
+      new_hashes = hash_file(os.path.join(self.path, payload_file),
+        set(self.algs), self.read_options)
+
+    self._payload_diff = None
     if payload_file not in self.entries.keys():
       self.entries[payload_file] = new_hashes
+      self.manifest_changes["removed"].discard(payload_file)
+      self.manifest_changes["added"].add(payload_file)
       return True
     elif self.entries[payload_file] != new_hashes:
       self.entries[payload_file] = new_hashes
+      self.manifest_changes["changed"].add(payload_file)
       return True
     else:
       return False
@@ -208,16 +727,15 @@ class Repairable_Bag(bagit.Bag):
     """
     iterate through all dem new files
     """
-    os.chdir(self.path)
-
     new_payload_files = list(self.payload_files_not_in_manifest())
 
     if new_payload_files:
       LOGGER.info("Adding the following files to manifests: {}".format(", ".join(new_payload_files)))
       self.manifests_updated = True
 
-      for payload_file in self.payload_files_not_in_manifest():
-        self.add_new_hashes_for_file(payload_file)
+      new_entries = self.generate_hashes(new_payload_files)
+      for payload_file, new_hashes in new_entries.items():
+        self.add_new_hashes_for_file(payload_file, new_hashes)
 
       self.add_premisevent(process = "Bag Payload Update",
         msg = "Added the following files to the bag payload: {}".format(
@@ -226,13 +744,13 @@ class Repairable_Bag(bagit.Bag):
 
       self.write_bag_updates()
 
-    os.chdir(self.old_dir)
-
 
   def update_hashes(self, filename_pattern = None):
-    os.chdir(self.path)
+    missing_files = set(self.diff_payload().missing)
+    if missing_files:
+      LOGGER.warning("Cannot update hashes for files missing from the payload: {}".format(", ".join(sorted(missing_files))))
 
-    payload_files = set(self.payload_entries().keys())
+    payload_files = set(self.payload_entries().keys()) - missing_files
 
     if filename_pattern:
       regex = re.compile(filename_pattern)
@@ -243,9 +761,10 @@ class Repairable_Bag(bagit.Bag):
     if files_to_update:
       LOGGER.info("Potentially updating hashes for the following files: {}".format(", ".join(files_to_update)))
 
-      for payload_file in files_to_update:
-        updated_files = []
-        if self.add_new_hashes_for_file(payload_file):
+      updated_files = []
+      new_entries = self.generate_hashes(files_to_update)
+      for payload_file, new_hashes in new_entries.items():
+        if self.add_new_hashes_for_file(payload_file, new_hashes):
           self.manifests_updated = True
           updated_files.append(payload_file)
 
@@ -257,8 +776,6 @@ class Repairable_Bag(bagit.Bag):
 
       self.write_bag_updates()
 
-    os.chdir(self.old_dir)
-
 
   def delete_payload_files_not_in_manifest(self, rules = SYSTEM_FILE_PATTERNS):
     """
@@ -266,9 +783,9 @@ class Repairable_Bag(bagit.Bag):
     """
     new_payload_files = list(self.payload_files_not_in_manifest())
 
+    files_not_to_delete = list()
     if rules:
       files_to_delete = list()
-      files_not_to_delete = list()
       for payload_file in new_payload_files:
         for rulename, rule in rules.items():
           if bool(re.search(rule["regex"], payload_file)) != rule["match"]:
@@ -281,13 +798,14 @@ class Repairable_Bag(bagit.Bag):
     if files_not_to_delete:
       LOGGER.warning("Untracked files in payload directory do not match deletion rules: {}".format(", ".join(files_not_to_delete)))
 
-    os.chdir(self.path)
     if files_to_delete:
       LOGGER.warning("Will delete the following files: {}".format(", ".join(files_to_delete)))
       for payload_file in files_to_delete:
         try:
           LOGGER.warning("Deleting {}".format(payload_file))
-          os.remove(payload_file)
+          os.remove(os.path.join(self.path, payload_file))
+          self.inventory.remove(payload_file)
+          self._payload_diff = None
         except OSError:
           LOGGER.error("Do not have permission to delete {}".format(payload_file))
 
@@ -298,5 +816,3 @@ class Repairable_Bag(bagit.Bag):
 
       if not self.check_oxum():
         self.write_bag_updates()
-
-    os.chdir(self.old_dir)
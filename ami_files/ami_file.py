@@ -4,6 +4,8 @@ from pymediainfo import MediaInfo
 from datetime import datetime
 from dateutil import parser
 
+from ami_metrics.metrics import stage
+
 LOGGER = logging.getLogger(__name__)
 
 class AMIFileError(Exception):
@@ -31,7 +33,8 @@ class ami_file:
 
 
   def set_techmd_values(self):
-    techmd = MediaInfo.parse(self.filepath)
+    with stage("mediainfo", path = self.filepath):
+      techmd = MediaInfo.parse(self.filepath)
 
     md_track = None
     for track in techmd.tracks:
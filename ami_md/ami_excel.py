@@ -1,4 +1,4 @@
-import os, re, csv, json, datetime, logging
+import os, re, csv, json, time, datetime, logging
 
 # handling excel
 import xlrd
@@ -12,6 +12,7 @@ import numpy as np
 # ami modules
 import ami_md.ami_md_constants as ami_md_constants
 import ami_md.ami_json as ami_json
+from ami_metrics.metrics import METRICS
 
 
 LOGGER = logging.getLogger(__name__)
@@ -28,6 +29,7 @@ class ami_excel:
     """
     Initialize object as excel workbook
     """
+    start = time.perf_counter()
     self.path = os.path.abspath(filename)
     self.name = os.path.split(self.path)[1]
     if not os.path.exists(self.path):
@@ -65,6 +67,10 @@ class ami_excel:
           self.path)
       """
 
+    if METRICS.enabled:
+      METRICS.add("excel_parse", time.perf_counter() - start,
+        os.path.getsize(self.path), path = self.path)
+
 
   def validate_workbook(self):
     """
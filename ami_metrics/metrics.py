@@ -0,0 +1,129 @@
+import json, time, logging, threading
+from contextlib import contextmanager
+
+
+LOGGER = logging.getLogger(__name__)
+
+BYTES_PER_MB = 1024 * 1024
+
+
+class Metrics:
+    '''
+    Wall time, bytes read and call counts per stage, rolled up overall, per
+    bag and per file. Recording is a no-op until enabled, so instrumented
+    code costs nothing in normal runs.
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+
+    def reset(self):
+        self.stages = {}
+        self.bags = {}
+        self.files = {}
+
+
+    @contextmanager
+    def stage(self, name, bag = None, path = None):
+        '''
+        time a block of work; the block may add to record["bytes"]
+        '''
+        record = {"bytes": 0}
+        if not self.enabled:
+            yield record
+            return
+
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.add(name, time.perf_counter() - start, record["bytes"],
+                bag = bag, path = path)
+
+
+    def add(self, name, seconds, nbytes = 0, calls = 1, bag = None, path = None):
+        if not self.enabled:
+            return
+
+        with self.lock:
+            targets = [self.stages]
+            if bag:
+                targets.append(self.bags.setdefault(bag, {}))
+            if path:
+                targets.append(self.files.setdefault(path, {}))
+            for target in targets:
+                stats = target.setdefault(name,
+                    {"calls": 0, "seconds": 0.0, "bytes": 0})
+                stats["calls"] += calls
+                stats["seconds"] += seconds
+                stats["bytes"] += nbytes
+
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(
+                {"stages": self.stages, "bags": self.bags, "files": self.files}))
+
+
+    def merge(self, snapshot):
+        '''
+        fold in a snapshot taken in a worker process
+        '''
+        if not snapshot:
+            return
+
+        for name, stats in snapshot["stages"].items():
+            self.add(name, stats["seconds"], stats["bytes"], stats["calls"])
+        with self.lock:
+            for key in ("bags", "files"):
+                mine = getattr(self, key)
+                for item, stages in snapshot[key].items():
+                    for name, stats in stages.items():
+                        target = mine.setdefault(item, {}).setdefault(name,
+                            {"calls": 0, "seconds": 0.0, "bytes": 0})
+                        for field in ("calls", "seconds", "bytes"):
+                            target[field] += stats[field]
+
+
+    def write(self, metrics_path):
+        report = self.snapshot()
+        for level in [{"": report["stages"]}, report["bags"], report["files"]]:
+            for stages in level.values():
+                for stats in stages.values():
+                    if stats["bytes"] and stats["seconds"]:
+                        stats["mb_per_s"] = round(
+                            stats["bytes"] / BYTES_PER_MB / stats["seconds"], 3)
+
+        with open(metrics_path, 'w') as f:
+            json.dump(report, f, indent = 2)
+
+        LOGGER.info("Metrics written to {}".format(metrics_path))
+
+
+METRICS = Metrics()
+
+
+def stage(name, bag = None, path = None):
+    return METRICS.stage(name, bag = bag, path = path)
+
+
+def measured(path, enabled, fn, *args):
+    '''
+    run fn(path, *args) in a worker process and return its result along with
+    the metrics recorded while it ran
+    '''
+    METRICS.enabled = enabled
+    METRICS.reset()
+    return fn(path, *args), METRICS.snapshot()
+
+
+def collect(measured_results):
+    '''
+    merge worker metrics from (result, snapshot) pairs and yield the results
+    '''
+    for result, snapshot in measured_results:
+        METRICS.merge(snapshot)
+        yield result
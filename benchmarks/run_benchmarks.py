@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import statistics
+
+from ami_bag.ami_bag import ami_bag
+from ami_bag.update_bag import Repairable_Bag
+from benchmarks.synthetic_bags import BAG_PROFILES, make_bag, stub_mediainfo
+
+
+LOGGER = logging.getLogger(__name__)
+
+def _configure_logging(args):
+    log_format = "%(asctime)s - %(levelname)s - %(message)s"
+    if args.quiet:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+    if args.log:
+        logging.basicConfig(filename=args.log, level=level, format=log_format)
+    else:
+        logging.basicConfig(level=level, format=log_format)
+
+
+def _make_parser():
+    parser = argparse.ArgumentParser()
+    parser.description = "time bag loading, validation, hashing and conversion on synthetic AMI bags"
+    parser.add_argument("--types", nargs='+', default=["excel", "json", "excel-json"],
+                        help = "Bag types to generate")
+    parser.add_argument("--subtypes", nargs='+', default=["video", "audio", "dvd"],
+                        help = "Bag subtypes to generate where the type has them")
+    parser.add_argument("--files", type=int, default=10,
+                        help = "Media files per payload directory")
+    parser.add_argument("--file-size", type=int, default=1024 * 1024,
+                        help = "Size of each media file in bytes")
+    parser.add_argument("--rows", type=int, default=None,
+                        help = "Rows in each preservation sheet (default: --files)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help = "Times to run each operation, keeping the fastest")
+    parser.add_argument("--workdir",
+                        help = "Directory to build bags in (default: a temporary directory)")
+    parser.add_argument("--output",
+                        help = "Path to a .json file of results")
+    parser.add_argument("--baseline",
+                        help = "Path to earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help = "Fraction slower than the baseline that counts as a regression")
+    parser.add_argument('--log', help='The name of the log file')
+    parser.add_argument('--quiet', action='store_true')
+    return parser
+
+
+def load_bag(bag):
+    return ami_bag(path = bag.path, lazy = True)
+
+
+def parse_metadata(bag):
+    ami_bag(path = bag.path, lazy = True).set_metadata()
+
+
+def validate_fast(bag):
+    return ami_bag(path = bag.path).validate_amibag(fast = True, metadata = True)
+
+
+def validate_slow(bag):
+    return ami_bag(path = bag.path).validate_amibag(fast = False, metadata = True)
+
+
+def update_hashes(bag):
+    Repairable_Bag(path = bag.path).update_hashes()
+
+
+def add_json_from_excel(bag):
+    ami_bag(path = bag.path, lazy = True).add_json_from_excel()
+
+
+def convert_excel_to_json(bag):
+    loaded_bag = ami_bag(path = bag.path, lazy = True)
+    output_dir = tempfile.mkdtemp()
+    try:
+        for filename in loaded_bag.data_files:
+            if os.path.splitext(filename)[1] != ".xlsx":
+                continue
+            excel = loaded_bag.get_metadata_object(filename)
+            excel.pres_sheet.convert_amiExcelToJSON(output_dir)
+    finally:
+        shutil.rmtree(output_dir)
+
+
+# operations that change the bag run last, on a fresh copy each time
+OPERATIONS = [
+    ("load", load_bag, False, False),
+    ("parse_metadata", parse_metadata, False, False),
+    ("validate_fast", validate_fast, False, False),
+    ("validate_slow", validate_slow, True, False),
+    ("update_hashes", update_hashes, True, True),
+    ("convert_amiExcelToJSON", convert_excel_to_json, False, False),
+    ("add_json_from_excel", add_json_from_excel, False, True)
+]
+
+EXCEL_OPERATIONS = set(["convert_amiExcelToJSON", "add_json_from_excel"])
+
+
+def time_operation(fn, bag, repeat, modifies):
+    timings = []
+    for i in range(repeat):
+        if modifies:
+            run_path = bag.path + ".run"
+            shutil.copytree(bag.path, run_path)
+            run_bag = bag._replace(path = run_path)
+        else:
+            run_bag = bag
+
+        start = time.perf_counter()
+        try:
+            fn(run_bag)
+        finally:
+            timings.append(time.perf_counter() - start)
+            if modifies:
+                shutil.rmtree(run_path)
+
+    return timings
+
+
+def run_case(workdir, bag_type, subtype, args):
+    name = "{}/{}".format(bag_type, subtype)
+    LOGGER.info("Generating {} bag with {} files per directory".format(name, args.files))
+    bag = make_bag(workdir, bag_type, subtype, files = args.files,
+        file_size = args.file_size, rows = args.rows)
+
+    results = {}
+    for operation, fn, reads_payload, modifies in OPERATIONS:
+        if operation in EXCEL_OPERATIONS and bag_type == "json":
+            continue
+        key = "{}/{}".format(name, operation)
+        try:
+            timings = time_operation(fn, bag, args.repeat, modifies)
+        except Exception as e:
+            LOGGER.error("{} failed: {}".format(key, e))
+            results[key] = {"error": "{}: {}".format(type(e).__name__, e)}
+            continue
+
+        result = {"seconds": min(timings), "median": statistics.median(timings),
+            "files": bag.files, "bytes": bag.bytes}
+        if reads_payload:
+            result["mb_per_s"] = round(bag.bytes / 1024 / 1024 / min(timings), 3)
+        results[key] = result
+
+    shutil.rmtree(bag.path)
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    '''
+    return the operations that are more than tolerance slower than the baseline
+    '''
+    regressions = {}
+    for key, result in sorted(results.items()):
+        previous = baseline.get(key)
+        if not previous or "seconds" not in result or "seconds" not in previous:
+            continue
+        ratio = result["seconds"] / previous["seconds"] if previous["seconds"] else 1
+        result["baseline_ratio"] = round(ratio, 3)
+        if ratio > 1 + tolerance:
+            regressions[key] = ratio
+
+    return regressions
+
+
+def print_results(results):
+    for key, result in sorted(results.items()):
+        if "error" in result:
+            print("{:<50} {}".format(key, result["error"]))
+            continue
+        line = "{:<50} {:>10.4f}s".format(key, result["seconds"])
+        if "mb_per_s" in result:
+            line += " {:>10.1f} MB/s".format(result["mb_per_s"])
+        if "baseline_ratio" in result:
+            line += " {:>7.2f}x baseline".format(result["baseline_ratio"])
+        print(line)
+
+
+def main():
+    parser = _make_parser()
+    args = parser.parse_args()
+
+    _configure_logging(args)
+
+    if args.workdir:
+        workdir = os.path.abspath(args.workdir)
+        cleanup = False
+    else:
+        workdir = tempfile.mkdtemp(prefix = "ami-bench-")
+        cleanup = True
+
+    results = {}
+    try:
+        with stub_mediainfo():
+            for bag_type in args.types:
+                for subtype in args.subtypes:
+                    if (bag_type, subtype) in BAG_PROFILES:
+                        results.update(run_case(workdir, bag_type, subtype, args))
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir)
+
+    regressions = {}
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 2, sort_keys = True)
+        LOGGER.info("Results written to {}".format(args.output))
+
+    if regressions:
+        LOGGER.error("Slower than baseline: {}".format(", ".join(
+            "{} ({:.2f}x)".format(key, ratio) for key, ratio in sorted(regressions.items()))))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+'''
+Generate AMI bags of any size for benchmarking. Media files are filled with
+pseudo-random bytes and MediaInfo is replaced by stub_mediainfo(), which
+reports technical metadata that agrees with the generated JSON and Excel
+metadata.
+'''
+
+import os, json, random
+from collections import namedtuple
+from contextlib import contextmanager
+from unittest import mock
+
+import bagit
+from openpyxl import Workbook
+
+import ami_files.ami_file as ami_file
+import ami_md.ami_md_constants as ami_md_constants
+
+
+BAG_PROFILES = {
+    ("excel", "video"): {"PreservationMasters": "mov"},
+    ("excel", "dvd"): {"PreservationMasters": "iso"},
+    ("excel", "audio"): {"PreservationMasters": "wav", "EditMasters": "wav"},
+    ("json", "video"): {"PreservationMasters": "mov", "ServiceCopies": "mp4"},
+    ("json", "audio"): {"PreservationMasters": "wav", "EditMasters": "wav"},
+    ("excel-json", "video"): {"PreservationMasters": "mov", "ServiceCopies": "mp4"},
+    ("excel-json", "audio"): {"PreservationMasters": "wav", "EditMasters": "wav"}
+}
+
+ROLES = {"PreservationMasters": "pm", "EditMasters": "em", "ServiceCopies": "sc"}
+
+FORMATS = {"video": "VHS", "dvd": "Video DVD", "audio": "Compact cassette"}
+
+BLOCK_SIZE = 1024 * 1024
+
+DATE_CREATED = "2017-01-01"
+DURATION_MILLI = 1000
+DURATION_HUMAN = ami_file.parse_duration(DURATION_MILLI)
+
+MEDIA_TECHMD = {
+    "mov": {"format": "MPEG-4", "audio_codec": "PCM", "video_codec": "v210"},
+    "mp4": {"format": "MPEG-4", "audio_codec": "AAC LC", "video_codec": "AVC"},
+    "wav": {"format": "Wave", "audio_codec": "PCM", "video_codec": None},
+    "iso": {"format": "ISO 9660", "audio_codec": None, "video_codec": None}
+}
+
+PRES_HEADERS = [
+    (("Reference filename (automatic)", None, None), "reference"),
+    (("Original master", "Bibliographic Item", "Title"), "title"),
+    ((None, None, "Class mark/ID"), "classmark"),
+    ((None, None, "Division code"), "division"),
+    ((None, None, "Date"), "date"),
+    ((None, "Object", "Format"), "format"),
+    ((None, None, "Generation"), "generation"),
+    ((None, None, "Barcode"), "barcode"),
+    ((None, "Content specifications", "Broadcast\nstandard"), "standard"),
+    ((None, None, "Color"), "color"),
+    ((None, "Notes", "Condition notes"), None),
+    ((None, None, "Content notes"), None),
+    ((None, None, "Other notes"), None),
+    ((None, None, "Access note"), None),
+    (("File Information (AUTOMATIC)", "General Info", "Filename"), "filename"),
+    ((None, None, "Extension"), "extension"),
+    ((None, None, "File format"), "file_format"),
+    ((None, None, "Duration\n(hh:mm:ss:ff)"), "duration"),
+    ((None, None, "Date created"), "date_created"),
+    ((None, "Video content", "Video codec name"), "video_codec"),
+    ((None, "Audio content", "Audio codec name"), "audio_codec"),
+    (("Operator", "Notes", "Notes"), None),
+    ((None, "Operator", "Operator address, city"), "city"),
+    ((None, None, "Operator address, state"), "state")
+]
+
+EDIT_HEADERS = [
+    (("Reference filename (automatic)", None, None), "reference"),
+    (("Edit master file", "Edit master file", "Filename"), "filename"),
+    ((None, None, "Extension"), "extension"),
+    ((None, None, "File format"), "file_format"),
+    ((None, None, "File size (bytes)"), "size"),
+    ((None, None, "Duration (hh:mm:ss.sss)"), "duration"),
+    ((None, None, "Date created"), "date_created")
+]
+
+SyntheticBag = namedtuple("SyntheticBag", ["path", "type", "subtype", "files", "bytes"])
+
+
+def media_basename(division, index, role):
+    # volume numbers only have two digits, so roll over into a new object id
+    object_id = 100000 + index // 99
+    return "{0}_{1}_v{2:02d}_{3}".format(division, object_id, index % 99 + 1, role)
+
+
+def write_payload(path, size, block):
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+
+def media_record(basename, ext, size, subtype):
+    techmd = MEDIA_TECHMD[ext]
+    return {
+        "reference": basename,
+        "title": "Synthetic recording {}".format(basename),
+        "classmark": "*MGZ {}".format(basename.split("_")[1]),
+        "division": basename.split("_")[0],
+        "date": "1990",
+        "format": FORMATS[subtype],
+        "generation": "AO",
+        "barcode": "33433{}".format(basename.split("_")[1]),
+        "standard": "NTSC" if subtype == "video" else None,
+        "color": "color" if subtype == "video" else None,
+        "filename": basename,
+        "extension": ext,
+        "file_format": techmd["format"],
+        "size": size,
+        "duration": DURATION_HUMAN,
+        "date_created": DATE_CREATED,
+        "video_codec": techmd["video_codec"],
+        "audio_codec": techmd["audio_codec"],
+        "city": "New York",
+        "state": "NY"
+    }
+
+
+def media_json(record, format_type):
+    technical = {
+        "filename": record["filename"],
+        "extension": record["extension"],
+        "fileFormat": record["file_format"],
+        "fileSize": {"measure": record["size"], "unit": "B"},
+        "dateCreated": record["date_created"],
+        "durationHuman": record["duration"],
+        "durationMilli": {"measure": DURATION_MILLI, "unit": "ms"},
+        "audioCodec": record["audio_codec"]
+    }
+    if record["video_codec"]:
+        technical["videoCodec"] = record["video_codec"]
+
+    return {
+        "asset": {
+            "referenceFilename": "{}.{}".format(record["filename"], record["extension"]),
+            "fileRole": record["filename"].rsplit("_", 1)[1],
+            "schemaVersion": "x.0.0"
+        },
+        "bibliographic": {
+            "primaryID": record["barcode"],
+            "classmark": record["classmark"],
+            "barcode": record["barcode"],
+            "divisionCode": record["division"],
+            "title": record["title"],
+            "date": record["date"]
+        },
+        "technical": technical,
+        "source": {
+            "object": {
+                "type": format_type,
+                "format": record["format"],
+                "generation": record["generation"],
+                "volumeNumber": 1
+            }
+        },
+        "digitizer": {
+            "organization": {
+                "address": {"city": record["city"], "state": record["state"]}
+            }
+        }
+    }
+
+
+def write_sheet(sheet, headers, records, rows):
+    for column, (header, _) in enumerate(headers, 1):
+        for row, value in enumerate(header, 1):
+            if value:
+                sheet.cell(row = row, column = column, value = value)
+
+    for row in range(rows):
+        record = records[row % len(records)]
+        if row >= len(records):
+            # extra rows describe files that were not delivered
+            record = dict(record, reference = record["reference"] + "x{}".format(row),
+                filename = record["filename"] + "x{}".format(row))
+        for column, (_, field) in enumerate(headers, 1):
+            if field and record.get(field) is not None:
+                sheet.cell(row = row + 4, column = column, value = record[field])
+
+
+def write_workbook(path, pm_records, em_records, rows):
+    wb = Workbook()
+    pres_sheet = wb.active
+    pres_sheet.title = "Preservation"
+    write_sheet(pres_sheet, PRES_HEADERS, pm_records, max(rows, len(pm_records)))
+    if em_records:
+        edit_sheet = wb.create_sheet("Edit masters")
+        write_sheet(edit_sheet, EDIT_HEADERS, em_records, len(em_records))
+    wb.save(path)
+
+
+def make_bag(root, bag_type, subtype, files = 10, file_size = 1024 * 1024,
+    rows = None, seed = 0):
+    '''
+    build an AMI bag with a number of media files of file_size bytes in each
+    payload directory and a preservation sheet of at least rows rows
+    '''
+    profile = BAG_PROFILES[(bag_type, subtype)]
+    division = "myd"
+    bag_name = "{}_{}_{}".format(bag_type, subtype, files)
+    bag_path = os.path.join(root, bag_name)
+    os.makedirs(bag_path)
+
+    block = random.Random(seed).randbytes(max(1, min(file_size, BLOCK_SIZE)))
+    format_type = ami_md_constants.FORMAT_TYPE[FORMATS[subtype]]
+
+    records = {}
+    for directory, ext in profile.items():
+        dir_path = os.path.join(bag_path, directory)
+        os.makedirs(dir_path)
+        records[directory] = []
+        for i in range(files):
+            basename = media_basename(division, i, ROLES[directory])
+            write_payload(os.path.join(dir_path, basename + "." + ext), file_size, block)
+            record = media_record(basename, ext, file_size, subtype)
+            records[directory].append(record)
+            if bag_type != "excel":
+                with open(os.path.join(dir_path, basename + ".json"), 'w') as f:
+                    json.dump(media_json(record, format_type), f)
+
+    if bag_type != "json":
+        metadata_dir = os.path.join(bag_path, "Metadata")
+        os.makedirs(metadata_dir)
+        # named like the media so the bag passes the filename checks
+        workbook_name = media_basename(division, 0, ROLES["PreservationMasters"]) + ".xlsx"
+        write_workbook(os.path.join(metadata_dir, workbook_name),
+            records["PreservationMasters"], records.get("EditMasters"),
+            rows or files)
+
+    bagit.make_bag(bag_path, checksums = ["md5"])
+
+    return SyntheticBag(bag_path, bag_type, subtype, files * len(profile),
+        files * len(profile) * file_size)
+
+
+class StubTrack:
+    def __init__(self, filepath):
+        basename, ext = os.path.splitext(os.path.basename(filepath))
+        techmd = MEDIA_TECHMD.get(ext[1:].lower(), MEDIA_TECHMD["mov"])
+        self.track_type = "General"
+        self.file_name = basename
+        self.file_extension = ext[1:]
+        self.format = techmd["format"]
+        self.file_size = os.path.getsize(filepath)
+        self.encoded_date = "UTC {} 00:00:00".format(DATE_CREATED)
+        self.recorded_date = None
+        self.file_last_modification_date = None
+        self.duration = DURATION_MILLI
+        self.audio_codecs = techmd["audio_codec"]
+        self.codecs_video = techmd["video_codec"]
+
+
+class StubMediaInfo:
+    def __init__(self, filepath):
+        self.tracks = [StubTrack(filepath)]
+
+    @classmethod
+    def parse(cls, filepath):
+        return cls(filepath)
+
+
+@contextmanager
+def stub_mediainfo():
+    '''
+    answer MediaInfo calls from the generated file names so benchmarks do
+    not depend on, or time, the mediainfo library
+    '''
+    with mock.patch.object(ami_file, "MediaInfo", StubMediaInfo):
+        yield
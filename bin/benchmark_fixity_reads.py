@@ -0,0 +1,113 @@
+import os
+import json
+import argparse
+import logging
+from ami_bag.fixity_io import STRATEGIES, ReadOptions, parse_size, measure_throughput
+from ami_metrics.metrics import METRICS
+
+
+LOGGER = logging.getLogger(__name__)
+
+def _configure_logging(args):
+    log_format = "%(asctime)s - %(levelname)s - %(message)s"
+    if args.quiet:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+    if args.log:
+        logging.basicConfig(filename=args.log, level=level, format=log_format)
+    else:
+        logging.basicConfig(level=level, format=log_format)
+
+
+def _make_parser():
+    parser = argparse.ArgumentParser()
+    parser.description = "measure hashing throughput on a mount for each read strategy and block size"
+    parser.add_argument("-p", "--path", required = True,
+                        help = "Path to a file or directory on the mount to test")
+    parser.add_argument("--strategies", nargs='+', choices=STRATEGIES, default=list(STRATEGIES),
+                        help = "Read strategies to compare")
+    parser.add_argument("--block-sizes", nargs='+', type=parse_size, default=[64 * 1024, 1024 * 1024, 8 * 1024 * 1024],
+                        help = "Block sizes to compare, e.g. 64K 1M 8M")
+    parser.add_argument("--algs", nargs='*', default=["md5"],
+                        help = "Hash algorithms to compute while reading (none to only read)")
+    parser.add_argument("--max-bytes", type=parse_size, default=1024 ** 3,
+                        help = "Stop collecting sample files after this many bytes, e.g. 2G")
+    parser.add_argument("--warm", action='store_true',
+                        help = "Leave files in the page cache between runs")
+    parser.add_argument("--output",
+                        help = "Path to a .json file of results")
+    parser.add_argument("--metrics",
+                        help = "Path to a .json file of timings and throughput per strategy and block size")
+    parser.add_argument('--log', help='The name of the log file')
+    parser.add_argument('--quiet', action='store_true')
+    return parser
+
+
+def sample_files(path, max_bytes):
+    if os.path.isfile(path):
+        return [path]
+
+    files = []
+    total = 0
+    for root, dirs, filenames in os.walk(path):
+        dirs.sort()
+        for filename in sorted(filenames):
+            filepath = os.path.join(root, filename)
+            if not os.path.isfile(filepath) or os.path.islink(filepath):
+                continue
+            files.append(filepath)
+            total += os.path.getsize(filepath)
+            if total >= max_bytes:
+                return files
+    return files
+
+
+def main():
+    parser = _make_parser()
+    args = parser.parse_args()
+
+    _configure_logging(args)
+
+    METRICS.enabled = bool(args.metrics)
+
+    files = sample_files(os.path.abspath(args.path), args.max_bytes)
+    if not files:
+        LOGGER.error("No files to read in {}".format(args.path))
+        return
+
+    if not hasattr(os, "posix_fadvise"):
+        LOGGER.warning("posix_fadvise is not available, fadvise reads are plain reads")
+        if not args.warm:
+            LOGGER.warning("Cannot evict files between runs, later runs may read from memory")
+
+    results = []
+    for strategy in args.strategies:
+        for block_size in args.block_sizes:
+            options = ReadOptions(block_size, strategy, False)
+            nbytes, seconds = measure_throughput(files, options, args.algs,
+                cold = not args.warm)
+            mb_per_s = nbytes / 1024 / 1024 / seconds if seconds else 0
+            METRICS.add("{}_{}".format(strategy, block_size), seconds, nbytes,
+                calls = len(files))
+            LOGGER.info("{} with {} byte blocks: {:.1f} MB/s".format(
+                strategy, block_size, mb_per_s))
+            results.append({"strategy": strategy, "block_size": block_size,
+                "files": len(files), "bytes": nbytes,
+                "seconds": round(seconds, 3), "mb_per_s": round(mb_per_s, 3)})
+
+    for result in sorted(results, key = lambda x: -x["mb_per_s"]):
+        print("{:<10} {:>12} {:>10.1f} MB/s".format(result["strategy"],
+            result["block_size"], result["mb_per_s"]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 2)
+        LOGGER.info("Results written to {}".format(args.output))
+
+    if args.metrics:
+        METRICS.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import os
 import argparse
-from tqdm import tqdm
 import logging
 from ami_bag.ami_bag import ami_bag
 from ami_bag.update_bag import Repairable_Bag
+from ami_metrics.metrics import METRICS, stage
+from ami_bag.batch_runner import BatchRunner, add_batch_arguments
+from ami_bag.device_scheduler import job_count
 
 
 LOGGER = logging.getLogger(__name__)
@@ -28,12 +30,37 @@ def _make_parser():
     parser.add_argument("-b", "--bagpath",
                         default = None,
                         help = "Path to the base directory of the bag")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help = "Number of bags to convert in parallel")
+    parser.add_argument("--rotational-jobs", type=job_count, default=1,
+                        help = "Maximum parallel bags on one spinning or unknown disk")
+    parser.add_argument("--ssd-jobs", type=job_count, default=None,
+                        help = "Maximum parallel bags on one solid state disk (default: --jobs)")
+    add_batch_arguments(parser, time_limit = False)
+    parser.add_argument("--metrics",
+                        help = "Path to a .json file of timings and throughput per stage, bag and file")
     parser.add_argument('--log', help='The name of the log file')
     parser.add_argument('--quiet', action='store_true')
     return parser
 
 
 
+def convert_bag(bagpath):
+    LOGGER.info("Checking: {}".format(bagpath))
+    try:
+        bag = ami_bag(path = bagpath)
+    except:
+        LOGGER.error("{}: Not a bag".format(bagpath))
+        return False
+    else:
+        with stage("add_json_from_excel", bag = bag.path):
+            bag.add_json_from_excel()
+        update_bag = Repairable_Bag(path = bagpath)
+        update_bag.add_payload_files_not_in_manifest()
+        bag = ami_bag(path = bagpath)
+        return bag.validate_amibag()
+
+
 def main():
     parser = _make_parser()
     args = parser.parse_args()
@@ -41,6 +68,7 @@ def main():
     bags = []
 
     _configure_logging(args)
+    METRICS.enabled = bool(args.metrics)
 
     if args.directory:
         directory_path = os.path.abspath(args.directory)
@@ -54,18 +82,15 @@ def main():
 
     LOGGER.info("Checking {} folder(s).".format(len(bags)))
 
-    for bagpath in tqdm(bags):
-        LOGGER.info("Checking: {}".format(bagpath))
-        try:
-            bag = ami_bag(bagpath)
-        except:
-            LOGGER.error("{}: Not a bag".format(bagpath))
-        else:
-            bag.add_json_from_excel()
-            update_bag = Repairable_Bag(bagpath)
-            update_bag.add_payload_files_not_in_manifest()
-            bag = ami_bag(bagpath)
-            bag.validate_amibag()
+    runner = BatchRunner.from_args("convert_excelbag_to_jsonbag", args,
+        initializer = _configure_logging, initargs = (args,), succeeded = bool)
+    try:
+        runner.run(convert_bag, bags)
+    finally:
+        runner.close()
+
+    if args.metrics:
+        METRICS.write(args.metrics)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 import os, argparse, re, csv, glob, logging
 from ami_md.ami_excel import ami_excel
+from ami_metrics.metrics import METRICS, stage
 
 LOGGER = logging.getLogger(__name__)
 
@@ -29,6 +30,8 @@ def _make_parser():
     help = "path to an AMI Excel file")
   parser.add_argument("-o", "--output",
     help = "directory to save all json files")
+  parser.add_argument("--metrics",
+    help = "path to a .json file of timings and throughput per stage and file")
   parser.add_argument('--log', help='The name of the log file')
   parser.add_argument('--quiet', action='store_true')
   return parser
@@ -39,6 +42,7 @@ def main():
   args = parser.parse_args()
 
   _configure_logging(args)
+  METRICS.enabled = bool(args.metrics)
 
   excel_paths = []
 
@@ -61,7 +65,11 @@ def main():
 
     print(excel_path)
     print(output_path)
-    excel.pres_sheet.convert_amiExcelToCSV(output_path)
+    with stage("convert_amiExcelToCSV", path = excel.path):
+      excel.pres_sheet.convert_amiExcelToCSV(output_path)
+
+  if args.metrics:
+    METRICS.write(args.metrics)
 
 
 if __name__ == "__main__":
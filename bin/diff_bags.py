@@ -0,0 +1,102 @@
+import os
+import json
+import argparse
+import logging
+from ami_bag.bag_diff import diff_bags, diff_roots, bags_match
+from ami_metrics.metrics import METRICS, stage
+
+
+LOGGER = logging.getLogger(__name__)
+
+def _configure_logging(args):
+    log_format = "%(asctime)s - %(levelname)s - %(message)s"
+    if args.quiet:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+    if args.log:
+        logging.basicConfig(filename=args.log, level=level, format=log_format)
+    else:
+        logging.basicConfig(level=level, format=log_format)
+
+
+def _make_parser():
+    parser = argparse.ArgumentParser()
+    parser.description = "compare two bags, or two directories of bags, from their manifests, Payload-Oxums and file sizes without hashing"
+    parser.add_argument("first",
+                        help = "Path to a bag, or with --roots a directory of bags")
+    parser.add_argument("second",
+                        help = "Path to the bag, or directory of bags, to compare it with")
+    parser.add_argument("--roots", action='store_true',
+                        help = "Compare every bag under two directories, paired by their path below each")
+    parser.add_argument("--no-sizes", dest='sizes', action='store_false',
+                        help = "Compare manifests and Payload-Oxums only, without stat'ing payload files")
+    parser.add_argument("--report",
+                        help = "Path to a .json file of the differences")
+    parser.add_argument("--metrics",
+                        help = "Path to a .json file of timings per stage and bag")
+    parser.add_argument('--log', help='The name of the log file')
+    parser.add_argument('--quiet', action='store_true')
+    return parser
+
+
+def print_diff(name, diff):
+    if bags_match(diff):
+        print("{}: match".format(name))
+        return
+
+    print("{}: differ".format(name))
+    if diff.oxum[0] != diff.oxum[1]:
+        print("  Payload-Oxum {} != {}".format(*diff.oxum))
+    for label, paths in (("added", diff.added), ("missing", diff.missing),
+        ("changed", diff.changed), ("size changed", diff.size_changed),
+        ("malformed digest", diff.malformed)):
+        for path in paths:
+            print("  {}: {}".format(label, path))
+
+
+def main():
+    parser = _make_parser()
+    args = parser.parse_args()
+
+    _configure_logging(args)
+
+    METRICS.enabled = bool(args.metrics)
+
+    first = os.path.abspath(args.first)
+    second = os.path.abspath(args.second)
+
+    if args.roots:
+        with stage("diff_roots"):
+            root_diff = diff_roots(first, second, sizes = args.sizes)
+        for rel_path in root_diff.added:
+            print("{}: only in {}".format(rel_path, second))
+        for rel_path in root_diff.missing:
+            print("{}: only in {}".format(rel_path, first))
+        for rel_path, diff in sorted(root_diff.bags.items()):
+            print_diff(rel_path, diff)
+        differing = [rel_path for rel_path, diff in root_diff.bags.items()
+            if not bags_match(diff)]
+        LOGGER.info("{} bags compared, {} differ, {} only in {}, {} only in {}".format(
+            len(root_diff.bags), len(differing), len(root_diff.missing), first,
+            len(root_diff.added), second))
+        report = {"added": root_diff.added, "missing": root_diff.missing,
+            "bags": dict((rel_path, diff._asdict())
+            for rel_path, diff in root_diff.bags.items())}
+    else:
+        with stage("diff_bags", bag = first):
+            diff = diff_bags(first, second, sizes = args.sizes)
+        print_diff("{} and {}".format(first, second), diff)
+        report = diff._asdict()
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent = 2)
+        LOGGER.info("Report written to {}".format(args.report))
+
+    if args.metrics:
+        METRICS.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+import json
+import argparse
+import logging
+from ami_bag.duplicate_index import DuplicateIndex, default_index_path
+from ami_metrics.metrics import METRICS, stage
+
+
+LOGGER = logging.getLogger(__name__)
+
+def _configure_logging(args):
+    log_format = "%(asctime)s - %(levelname)s - %(message)s"
+    if args.quiet:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+    if args.log:
+        logging.basicConfig(filename=args.log, level=level, format=log_format)
+    else:
+        logging.basicConfig(level=level, format=log_format)
+
+
+def _make_parser():
+    parser = argparse.ArgumentParser()
+    parser.description = "find payload files and bags that are stored more than once, using bag manifests"
+    parser.add_argument("-d", "--directory", nargs='*', default=[],
+                        help = "Paths to drives or directories of bags to index")
+    parser.add_argument("--index", default=default_index_path(),
+                        help = "Path to the index database, kept between runs")
+    parser.add_argument("--prune", action='store_true',
+                        help = "Forget indexed bags under the directories that no longer exist")
+    parser.add_argument("--min-size", type=int, default=1,
+                        help = "Ignore files smaller than this many bytes when finding duplicate files and similar bags")
+    parser.add_argument("--similarity", type=float, default=0.5,
+                        help = "Report bags sharing at least this fraction of their files (Jaccard)")
+    parser.add_argument("--report",
+                        help = "Path to a .json file of duplicate files, identical bags and similar bags")
+    parser.add_argument("--metrics",
+                        help = "Path to a .json file of timings per stage and directory")
+    parser.add_argument('--log', help='The name of the log file')
+    parser.add_argument('--quiet', action='store_true')
+    return parser
+
+
+def main():
+    parser = _make_parser()
+    args = parser.parse_args()
+
+    _configure_logging(args)
+
+    METRICS.enabled = bool(args.metrics)
+
+    index = DuplicateIndex(args.index)
+    try:
+        for directory in args.directory:
+            directory = os.path.abspath(directory)
+            with stage("index_root", bag = directory):
+                found, indexed = index.index_root(directory)
+            LOGGER.info("Found {} bags in {}, {} new or changed".format(found, directory, indexed))
+            if args.prune:
+                for bag_path in index.prune(directory):
+                    LOGGER.info("Removed {} from the index".format(bag_path))
+
+        with stage("duplicate_files"):
+            duplicates = index.duplicate_files(min_size = args.min_size)
+        with stage("identical_bags"):
+            identical = index.identical_bags()
+        with stage("similar_bags"):
+            similar = index.similar_bags(args.similarity,
+                min_size = args.min_size)
+    finally:
+        index.close()
+
+    for bags in identical:
+        print("Identical bags: {}".format(", ".join(bags)))
+    for similarity, bag_a, bag_b in similar:
+        print("{:.0%} of files shared: {}, {}".format(similarity, bag_a, bag_b))
+    for group in duplicates:
+        print("{} bytes in {} copies: {}".format(group["size"], len(group["copies"]),
+            ", ".join(os.path.join(bag_path, rel_path) for bag_path, rel_path in group["copies"])))
+
+    print("{} files stored more than once, {} bytes reclaimable".format(
+        len(duplicates), sum(group["reclaimable"] for group in duplicates)))
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({"duplicate_files": duplicates, "identical_bags": identical,
+                "similar_bags": [{"similarity": similarity, "bags": [bag_a, bag_b]}
+                for similarity, bag_a, bag_b in similar]}, f, indent = 2)
+        LOGGER.info("Report written to {}".format(args.report))
+
+    if args.metrics:
+        METRICS.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
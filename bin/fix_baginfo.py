@@ -2,6 +2,9 @@ import argparse
 import bagit
 import os
 import shutil
+from ami_metrics.metrics import METRICS, stage
+from ami_bag.batch_runner import BatchRunner, add_batch_arguments
+from ami_bag.device_scheduler import job_count
 
 class BagInfo:
     def __init__(self, path = None):
@@ -62,12 +65,37 @@ def _make_parser():
     parser.add_argument("-b", "--bagpath",
                         default = None,
                         help = "Path to the base directory of the bag")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help = "Number of bags to fix in parallel")
+    parser.add_argument("--rotational-jobs", type=job_count, default=1,
+                        help = "Maximum parallel bags on one spinning or unknown disk")
+    parser.add_argument("--ssd-jobs", type=job_count, default=None,
+                        help = "Maximum parallel bags on one solid state disk (default: --jobs)")
+    add_batch_arguments(parser, time_limit = False)
+    parser.add_argument("--metrics",
+                        help = "Path to a .json file of timings per stage and bag")
     return parser
 
 
+def fix_bag(bagpath):
+    print(bagpath)
+    with stage("check_baginfo", bag = bagpath):
+        bag = BagInfo(bagpath)
+    if not bag.baginfo_valid:
+        print("Original oxum: {}".format(bag.bag.info["Payload-Oxum"]))
+        with stage("fix_baginfo", bag = bagpath):
+            fixed = bag.fix_baginfo()
+        if not fixed:
+            print("Could not fix bag-info")
+        print("Updated oxum: {}".format(bag.bag.info["Payload-Oxum"]))
+        return fixed
+    return True
+
+
 def main():
     parser = _make_parser()
     args = parser.parse_args()
+    METRICS.enabled = bool(args.metrics)
 
     bags = []
 
@@ -82,14 +110,14 @@ def main():
     if args.bagpath:
         bags.append(os.path.abspath(args.bagpath))
 
-    for bagpath in bags:
-        print(bagpath)
-        bag = BagInfo(bagpath)
-        if not bag.baginfo_valid:
-            print("Original oxum: {}".format(bag.bag.info["Payload-Oxum"]))
-            if not bag.fix_baginfo():
-                print("Could not fix bag-info")
-            print("Updated oxum: {}".format(bag.bag.info["Payload-Oxum"]))
+    runner = BatchRunner.from_args("fix_baginfo", args, succeeded = bool)
+    try:
+        runner.run(fix_bag, bags)
+    finally:
+        runner.close()
+
+    if args.metrics:
+        METRICS.write(args.metrics)
 
 
 
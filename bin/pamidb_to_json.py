@@ -1,6 +1,7 @@
 import os, argparse
 import pandas as pd
 import ami_md.ami_json as aj
+from ami_metrics.metrics import METRICS, stage
 
 dtypes = {
 	'digitizationProcess.analogDigitalConverter.serialNumber': object,
@@ -22,23 +23,32 @@ def _make_parser():
 	parser.add_argument("-s", "--schema",
 		help = "current schema version, preferred format x.y.z",
 		default = "2.0.0")
+	parser.add_argument("--metrics",
+		help = "path to a .json file of timings and throughput per stage")
 	return parser
 
 
 def main():
 	parser = _make_parser()
 	args = parser.parse_args()
+	METRICS.enabled = bool(args.metrics)
 
-	md = pd.read_csv(args.input, dtype = dtypes)
+	with stage("read_export") as record:
+		record["bytes"] = os.path.getsize(args.input)
+		md = pd.read_csv(args.input, dtype = dtypes)
 	md = md.dropna(axis = 1, how = "all")
 	md = md.drop(['asset.fileExt'], axis = 1)
 
 	json_directory = os.path.abspath(args.output)
 
 	for (index, row) in md.iterrows():
-		json_tree = aj.ami_json(flat_dict = row.to_dict(),
-			schema_version = args.schema)
-		json_tree.write_json(json_directory, indent = 4)
+		with stage("write_json"):
+			json_tree = aj.ami_json(flat_dict = row.to_dict(),
+				schema_version = args.schema)
+			json_tree.write_json(json_directory, indent = 4)
+
+	if args.metrics:
+		METRICS.write(args.metrics)
 
 
 if __name__ == "__main__":
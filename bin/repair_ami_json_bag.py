@@ -1,10 +1,12 @@
 import os
 import argparse
-from tqdm import tqdm
 import logging
 from ami_bag.ami_bag import ami_bag
 from ami_md.ami_json import ami_json
 from ami_bag.update_bag import Repairable_Bag
+from ami_metrics.metrics import METRICS, stage
+from ami_bag.batch_runner import BatchRunner, add_batch_arguments
+from ami_bag.device_scheduler import job_count
 import re
 import sys
 
@@ -42,6 +44,15 @@ def _make_parser():
                         help = "Do not perform any of the flagged repairs")
     parser.add_argument("--validate", action='store_true',
                         help = "Run a quick validation on bag after repair")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help = "Number of bags to repair at once, on threads")
+    parser.add_argument("--rotational-jobs", type=job_count, default=1,
+                        help = "Maximum parallel bags on one spinning or unknown disk")
+    parser.add_argument("--ssd-jobs", type=job_count, default=None,
+                        help = "Maximum parallel bags on one solid state disk (default: --jobs)")
+    add_batch_arguments(parser, time_limit = False)
+    parser.add_argument("--metrics",
+                        help = "Path to a .json file of timings and throughput per stage, bag and file")
     parser.add_argument('--log', help='The name of the log file')
     parser.add_argument('--quiet', action='store_true')
     return parser
@@ -82,7 +93,7 @@ def repair_bag_filenamemd(bag, repairer, dryrun):
                     filename))
 
     if repaired_fn:
-        updateable_bag = Repairable_Bag(bag.path, repairer = repairer, dryrun = dryrun)
+        updateable_bag = Repairable_Bag(path = bag.path, repairer = repairer, dryrun = dryrun)
         updateable_bag.add_premisevent(process = "Repair Metadata",
             msg = "Repaired filename fields: {}".format(
                 ", ".join(repaired_fn)),
@@ -112,7 +123,7 @@ def repair_bag_techmd(bag, repairer, dryrun):
                 json.write_json(os.path.split(json_path)[0])
 
     if updated_json:
-        updateable_bag = Repairable_Bag(bag.path, repairer = repairer, dryrun = dryrun)
+        updateable_bag = Repairable_Bag(path = bag.path, repairer = repairer, dryrun = dryrun)
         updateable_bag.add_premisevent(process = "Repair Metadata",
             msg = "Regenerated tech md fields with MediaInfo: {}".format(
                 ", ".join(updated_json)),
@@ -120,6 +131,24 @@ def repair_bag_techmd(bag, repairer, dryrun):
         updateable_bag.update_hashes(filename_pattern = r"json")
 
 
+def repair_bag(bagpath, args):
+    LOGGER.info("Checking: {}".format(bagpath))
+    try:
+        bag = ami_bag(path = bagpath)
+    except:
+        LOGGER.error("{}: Not an AMI bag".format(bagpath))
+        return False
+    if args.filenames:
+        with stage("repair_filenames", bag = bag.path):
+            repair_bag_filenamemd(bag, args.repairer, args.dryrun)
+        bag._open()
+    if args.techmd:
+        with stage("repair_techmd", bag = bag.path):
+            repair_bag_techmd(bag, args.repairer, args.dryrun)
+        bag._open()
+    return True
+
+
 def main():
     parser = _make_parser()
     args = parser.parse_args()
@@ -134,7 +163,7 @@ def main():
         check_list.append("filename metadata")
     checks = checks + ", ".join(check_list)
     LOGGER.info(checks)
-
+    METRICS.enabled = bool(args.metrics)
 
     if args.directory:
         directory_path = os.path.abspath(args.directory)
@@ -148,18 +177,15 @@ def main():
 
     LOGGER.info("Checking {} folder(s).".format(len(bags)))
 
-    for bagpath in bags:
-        LOGGER.info("Checking: {}".format(bagpath))
-        try:
-            bag = ami_bag(bagpath)
-        except:
-            LOGGER.error("{}: Not an AMI bag".format(bagpath))
-        if args.filenames:
-            repair_bag_filenamemd(bag, args.repairer, args.dryrun)
-            bag._open()
-        if args.techmd:
-            repair_bag_techmd(bag, args.repairer, args.dryrun)
-            bag._open()
+    runner = BatchRunner.from_args("repair_ami_json_bag", args, threaded = True,
+        succeeded = bool)
+    try:
+        runner.run(repair_bag, bags, args)
+    finally:
+        runner.close()
+
+    if args.metrics:
+        METRICS.write(args.metrics)
 
 
 if __name__ == "__main__":
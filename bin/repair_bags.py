@@ -1,8 +1,13 @@
 import os
 import argparse
-from tqdm import tqdm
 import logging
 from ami_bag.update_bag import Repairable_Bag
+from ami_bag.fixity_cache import FixityCache, default_cache_path
+from ami_bag.hash_checkpoint import HashCheckpoint, default_checkpoint_path
+from ami_metrics.metrics import METRICS
+from ami_bag.batch_runner import BatchRunner, add_batch_arguments
+from ami_bag.device_scheduler import job_count
+from ami_bag.fixity_io import STRATEGIES, parse_size, read_options
 
 
 LOGGER = logging.getLogger(__name__)
@@ -31,12 +36,97 @@ def _make_parser():
                         action='store_true')
     parser.add_argument('--deletefiles', help='Delete files not in manifest from the manifest',
                         action='store_true')
+    parser.add_argument('--compact-premis', action='store_true',
+                        help='Fold the PREMIS event journal into premis-events.json')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='Number of threads to use when hashing payload files')
+    parser.add_argument("--fixity-cache", nargs='?', default=None,
+                        const=default_cache_path(),
+                        help = "Reuse digests of unchanged files from a cache (default location if no path is given)")
+    parser.add_argument("--cache-max-age", type=float, default=None,
+                        help = "Re-read files whose cached digests are older than this many days")
+    parser.add_argument("--resume-hashing", action='store_true',
+                        help = "Reuse the digests of unchanged files hashed by an interrupted run of each bag")
+    parser.add_argument("--read-block-size", type=parse_size, default=None,
+                        help = "Bytes to read at a time when hashing, e.g. 64K or 8M (default: 1M)")
+    parser.add_argument("--read-strategy", choices=STRATEGIES, default=None,
+                        help = "How to read files when hashing (default: fadvise)")
+    parser.add_argument("--drop-cache", action='store_true',
+                        help = "Evict hashed files from the page cache as they are read")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help = "Number of bags to repair in parallel")
+    parser.add_argument("--threaded", action='store_true',
+                        help = "Run parallel bags on threads of one process rather than separate processes")
+    parser.add_argument("--rotational-jobs", type=job_count, default=1,
+                        help = "Maximum parallel bags on one spinning or unknown disk")
+    parser.add_argument("--ssd-jobs", type=job_count, default=None,
+                        help = "Maximum parallel bags on one solid state disk (default: --jobs)")
+    add_batch_arguments(parser, time_limit = False)
+    parser.add_argument("--metrics",
+                        help = "Path to a .json file of timings and throughput per stage, bag and file")
     parser.add_argument('--log', help='The name of the log file')
     parser.add_argument('--quiet', action='store_true')
     return parser
 
 
 
+def repair_bag(bagpath, args):
+    if args.fixity_cache:
+        cache = FixityCache(args.fixity_cache, max_age = args.cache_max_age)
+    else:
+        cache = None
+
+    checkpoint = HashCheckpoint(default_checkpoint_path(bagpath),
+        resume = args.resume_hashing)
+
+    LOGGER.info("Checking: {}".format(bagpath))
+    repaired = True
+    try:
+        bag = Repairable_Bag(path = bagpath, hash_threads = args.threads,
+            fixity_cache = cache, checkpoint = checkpoint,
+            read_options = read_options(args.read_block_size,
+                args.read_strategy, args.drop_cache))
+    except:
+        LOGGER.error("{}: Not a bag".format(bagpath))
+        repaired = False
+    else:
+        unhashed_files = list(bag.payload_files_not_in_manifest())
+        if unhashed_files:
+            LOGGER.info("Bag payload includes following files not in manifest: {}".format(unhashed_files))
+            if args.addfiles:
+                try:
+                    LOGGER.info("Adding untracked files to manifest")
+                    bag.add_payload_files_not_in_manifest()
+                    LOGGER.info("Untracked files successfully added to manifest.")
+                except:
+                    LOGGER.error("Updating process incomplete. Run full validation to check status")
+                    repaired = False
+            if args.deletefiles:
+                try:
+                    LOGGER.warning("Deleting untracked files from manifest")
+                    bag.delete_payload_files_not_in_manifest()
+                    LOGGER.info("Untracked files successfully deleted.")
+                except:
+                    LOGGER.error("Deletion process incomplete. Run full validation to check status")
+                    repaired = False
+        else:
+            LOGGER.info("No untracked file in payload directory")
+            if not bag.check_oxum():
+                LOGGER.info("Bag info invalid")
+                bag.write_baginfo()
+            else:
+                LOGGER.info("Bag info valid")
+        if args.compact_premis:
+            if bag.compact_premisjson():
+                LOGGER.info("PREMIS events compacted into premis-events.json")
+    finally:
+        if cache:
+            cache.close()
+        checkpoint.close(remove = checkpoint.empty())
+
+    return repaired
+
+
 def main():
     parser = _make_parser()
     args = parser.parse_args()
@@ -46,6 +136,7 @@ def main():
     _configure_logging(args)
 
     checks = "Running in check mode"
+    METRICS.enabled = bool(args.metrics)
 
 
     if args.directory:
@@ -60,37 +151,15 @@ def main():
 
     LOGGER.info("Checking {} folder(s).".format(len(bags)))
 
-    for bagpath in tqdm(bags):
-        LOGGER.info("Checking: {}".format(bagpath))
-        try:
-            bag = Repairable_Bag(bagpath)
-        except:
-            LOGGER.error("{}: Not a bag".format(bagpath))
-        else:
-            unhashed_files = list(bag.payload_files_not_in_manifest())
-            if unhashed_files:
-                LOGGER.info("Bag payload includes following files not in manifest: {}".format(unhashed_files))
-                if args.addfiles:
-                    try:
-                        LOGGER.info("Adding untracked files to manifest")
-                        bag.add_payload_files_not_in_manifest()
-                        LOGGER.info("Untracked files successfully added to manifest.")
-                    except:
-                        LOGGER.error("Updating process incomplete. Run full validation to check status")
-                if args.deletefiles:
-                    try:
-                        LOGGER.warning("Deleting untracked files from manifest")
-                        bag.delete_payload_files_not_in_manifest()
-                        LOGGER.info("Untracked files successfully deleted.")
-                    except:
-                        LOGGER.error("Deletion process incomplete. Run full validation to check status")
-            else:
-                LOGGER.info("No untracked file in payload directory")
-                if not bag.check_baginfo():
-                    LOGGER.info("Bag info invalid")
-                    bag.update_baginfo()
-                else:
-                    LOGGER.info("Bag info valid")
+    runner = BatchRunner.from_args("repair_bags", args, threaded = args.threaded,
+        initializer = _configure_logging, initargs = (args,), succeeded = bool)
+    try:
+        runner.run(repair_bag, bags, args)
+    finally:
+        runner.close()
+
+    if args.metrics:
+        METRICS.write(args.metrics)
 
 
 
@@ -3,6 +3,8 @@ import glob
 import argparse
 import bagit
 from ami_bag.ami_bag import ami_bag
+from ami_bag.payload_inventory import PayloadInventory
+from ami_metrics.metrics import METRICS, stage
 import shutil
 import csv
 import logging
@@ -25,6 +27,9 @@ def _make_parser():
         help = "whether to overwrite existing files",
         action = 'store_true'
     )
+    parser.add_argument("--metrics",
+        help = "path to a .json file of timings and throughput per stage, bag and file"
+    )
     return parser
 
 def survey_files(path):
@@ -47,35 +52,25 @@ def survey_files(path):
 
 def survey_bag(bag_path):
     try:
-        bag = ami_bag(bag_path)
+        bag = ami_bag(path = bag_path, lazy = True)
         bag_valid = bag.validate_amibag(metadata = True)
         bag_type = bag.type
         bag_subtype = bag.subtype
+        inventory = bag.inventory
     except:
-        bag = bagit.Bag(bag_path)
         bag_valid = False
         bag_type = None
         bag_subtype = None
+        inventory = PayloadInventory(bag_path)
 
-    all_files = glob.iglob(os.path.join(bag_path,'data/**/*.*'), recursive=True)
-
-    bag_files = 0
-    bag_size = 0
-    for filepath in all_files:
-        bag_files += 1
-        filesize = os.stat(filepath).st_size
-        bag_size += filesize
-
-    bag_metadata = [filename for filename in all_files if filename.endswith(('.xlsx', '.json'))]
-    if len(bag_metadata) > 0:
-        bag_metadata = ','.join(bag_metadata)
-    else:
-        bag_metadata = 'no metadata'
+    bag_files = len(inventory)
+    bag_size = inventory.total_bytes()
 
     return [bag_path, bag_type, bag_subtype, bag_size, bag_files,  bag_valid]
 
 def main():
     args = _make_parser().parse_args()
+    METRICS.enabled = bool(args.metrics)
 
     if os.path.exists(args.drive):
         src = os.path.abspath(args.drive)
@@ -90,7 +85,8 @@ def main():
     drive_name = os.path.split(src)[1]
 
 
-    files, bags, metadata = survey_files(src)
+    with stage("survey_files"):
+        files, bags, metadata = survey_files(src)
 
     files_name = drive_name + '_files.csv'
     files_path = os.path.join(dest, files_name)
@@ -134,6 +130,9 @@ def main():
     print('Drive contains {} bags'.format(len(bags)))
     print('Drive contains {} metadata files'.format(len(metadata)))
 
+    if args.metrics:
+        METRICS.write(args.metrics)
+
 
 if __name__ == '__main__':
   main()
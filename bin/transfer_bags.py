@@ -0,0 +1,135 @@
+import os
+import argparse
+import logging
+import bagit
+from ami_bag.transfer import transfer_bag, COPY_METHODS, VERIFY_POLICIES
+from ami_bag.fixity_cache import FixityCache, default_cache_path
+from ami_metrics.metrics import METRICS
+from ami_bag.batch_runner import BatchRunner, add_batch_arguments
+from ami_bag.device_scheduler import job_count
+from ami_bag.fixity_io import STRATEGIES, parse_size, read_options
+
+
+LOGGER = logging.getLogger(__name__)
+
+def _configure_logging(args):
+    log_format = "%(asctime)s - %(levelname)s - %(message)s"
+    if args.quiet:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+    if args.log:
+        logging.basicConfig(filename=args.log, level=level, format=log_format)
+    else:
+        logging.basicConfig(level=level, format=log_format)
+
+
+def _make_parser():
+    parser = argparse.ArgumentParser()
+    parser.description = "copy bags to another drive or volume, checking each file against the manifests"
+    parser.add_argument("-d", "--directory",
+                        help = "Path to a directory full of bags")
+    parser.add_argument("-b", "--bagpath",
+                        default = None,
+                        help = "Path to the base directory of the bag")
+    parser.add_argument("--destination", required = True,
+                        help = "Directory to copy the bags into")
+    parser.add_argument("--repairer",
+                        help = "Name of the person transferring the bags, for the PREMIS event")
+    parser.add_argument("--copy-method", choices=COPY_METHODS, default="auto",
+                        help = "How to copy files: auto uses reflinks, then copy_file_range, then a buffered copy, as the filesystems allow (default: auto)")
+    parser.add_argument("--verify", choices=VERIFY_POLICIES, default="full",
+                        help = "How to check files copied by reflink or copy_file_range: hash the copy, compare sizes, or not at all (default: full)")
+    parser.add_argument('--threads', type=int, default=1,
+                        help='Number of files to copy at once within a bag')
+    parser.add_argument("--fixity-cache", nargs='?', default=None,
+                        const=default_cache_path(),
+                        help = "Record the digests of the copies so later validation need not read them (default location if no path is given)")
+    parser.add_argument("--read-block-size", type=parse_size, default=None,
+                        help = "Bytes to read at a time, e.g. 64K or 8M (default: 1M)")
+    parser.add_argument("--read-strategy", choices=STRATEGIES, default=None,
+                        help = "How to read files (default: fadvise)")
+    parser.add_argument("--drop-cache", action='store_true',
+                        help = "Evict copied files from the page cache as they are read")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help = "Number of bags to transfer in parallel")
+    parser.add_argument("--rotational-jobs", type=job_count, default=1,
+                        help = "Maximum parallel bags on one spinning or unknown disk")
+    parser.add_argument("--ssd-jobs", type=job_count, default=None,
+                        help = "Maximum parallel bags on one solid state disk (default: --jobs)")
+    add_batch_arguments(parser, time_limit = False)
+    parser.add_argument("--metrics",
+                        help = "Path to a .json file of timings and throughput per stage, bag and file")
+    parser.add_argument('--log', help='The name of the log file')
+    parser.add_argument('--quiet', action='store_true')
+    return parser
+
+
+def transfer(bagpath, args):
+    if args.fixity_cache:
+        cache = FixityCache(args.fixity_cache)
+    else:
+        cache = None
+
+    destination = os.path.join(os.path.abspath(args.destination),
+        os.path.basename(bagpath))
+    LOGGER.info("Transferring {} to {}".format(bagpath, destination))
+    try:
+        return transfer_bag(bagpath, destination, threads = args.threads,
+            read_options = read_options(args.read_block_size,
+                args.read_strategy, args.drop_cache),
+            fixity_cache = cache, repairer = args.repairer,
+            method = args.copy_method, verify = args.verify)
+    except bagit.BagValidationError as e:
+        LOGGER.error("{}: {}".format(bagpath, e.message))
+        for detail in e.details:
+            LOGGER.error("{}: {}".format(bagpath, detail))
+    except (bagit.BagError, OSError) as e:
+        LOGGER.error("{}: {}".format(bagpath, e))
+    finally:
+        if cache:
+            cache.close()
+
+
+def main():
+    parser = _make_parser()
+    args = parser.parse_args()
+
+    bags = []
+
+    _configure_logging(args)
+
+    METRICS.enabled = bool(args.metrics)
+
+    if args.directory:
+        directory_path = os.path.abspath(args.directory)
+        for path in os.listdir(directory_path):
+            path = os.path.join(directory_path, path)
+            if os.path.isdir(path):
+                bags.append(path)
+
+    if args.bagpath:
+        bags.append(os.path.abspath(args.bagpath))
+
+    if not os.path.isdir(args.destination):
+        os.makedirs(args.destination)
+
+    LOGGER.info("Transferring {} folder(s).".format(len(bags)))
+
+    runner = BatchRunner.from_args("transfer_bags", args,
+        initializer = _configure_logging, initargs = (args,), succeeded = bool)
+    try:
+        records = runner.run(transfer, bags, args)
+    finally:
+        runner.close()
+
+    transferred = [record["outcome"] for record in records if record["outcome"]]
+    LOGGER.info("Transferred {} of {} bags, {} bytes".format(len(transferred),
+        len(bags), sum(result["bytes"] for result in transferred)))
+
+    if args.metrics:
+        METRICS.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
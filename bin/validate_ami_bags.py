@@ -1,24 +1,16 @@
 import os
 import argparse
-from tqdm import tqdm
 import logging
-from ami_bag.ami_bag import ami_bag
-
+from ami_bag.bag_validation import (configure_logging, add_validation_arguments,
+    apply_validation_defaults, validate_bag, record_result)
+from ami_bag.bag_report import write_report, report_file
+from ami_metrics.metrics import METRICS
+from ami_bag.batch_runner import BatchRunner, add_batch_arguments
+from ami_bag.device_scheduler import job_count
+from ami_bag.results_store import ResultsStore, default_results_path
 
 LOGGER = logging.getLogger(__name__)
 
-def _configure_logging(args):
-    log_format = "%(asctime)s - %(levelname)s - %(message)s"
-    if args.quiet:
-        level = logging.WARNING
-    else:
-        level = logging.INFO
-    if args.log:
-        logging.basicConfig(filename=args.log, level=level, format=log_format)
-    else:
-        logging.basicConfig(level=level, format=log_format)
-
-
 def _make_parser():
     parser = argparse.ArgumentParser()
     parser.description = "check the completeness, fixity, and content of a bag"
@@ -27,15 +19,39 @@ def _make_parser():
     parser.add_argument("-b", "--bagpath",
                         default = None,
                         help = "Path to the base directory of the bag")
-    parser.add_argument("--slow", action='store_false',
-                        help = "Recalculate hashes (very slow)")
-    parser.add_argument("--metadata", action='store_true',
-                        help = "Validate Excel metadata files")
+    add_validation_arguments(parser)
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help = "Number of bags to validate in parallel")
+    parser.add_argument("--rotational-jobs", type=job_count, default=1,
+                        help = "Maximum parallel bags on one spinning or unknown disk")
+    parser.add_argument("--ssd-jobs", type=job_count, default=None,
+                        help = "Maximum parallel bags on one solid state disk (default: --jobs)")
+    parser.add_argument("--history", action='store_true',
+                        help = "Print the results recorded in --results-db for the bags instead of validating")
+    parser.add_argument("--report", type=report_file,
+                        help = "Path to a .json or .csv report of results for each bag")
+    add_batch_arguments(parser)
+    parser.add_argument("--metrics",
+                        help = "Path to a .json file of timings and throughput per stage, bag and file")
     parser.add_argument('--log', help='The name of the log file')
     parser.add_argument('--quiet', action='store_true')
     return parser
 
 
+def print_history(bags, args):
+    store = ResultsStore(args.results_db or default_results_path())
+    try:
+        for bagpath in bags:
+            for result in store.history(bagpath):
+                failed = [name for name, error in result["checks"].items() if error]
+                print("{} {} {} fixity={} metadata={} {}".format(
+                    result["validated"], result["bag"],
+                    "valid" if result["valid"] else "invalid",
+                    result["fixity"], result["metadata"],
+                    result["error"] or ", ".join(failed)))
+    finally:
+        store.close()
+
 
 def main():
     parser = _make_parser()
@@ -43,15 +59,21 @@ def main():
 
     bags = []
 
-    _configure_logging(args)
+    configure_logging(args)
 
     checks = "Performing the following validations: Checking 0xums, Checking bag completeness"
     if not args.slow:
         checks += ", Recalculating hashes"
+    elif args.quick:
+        checks += ", Recalculating hashes for files changed since they were last hashed"
+    elif args.sample:
+        checks += ", Recalculating hashes for a sample of files"
     checks += ", Determing bag type, Checking directory structure, Checking filenames"
     if args.metadata:
         checks += ", Validating Excel metadata files."
     LOGGER.info(checks)
+    METRICS.enabled = bool(args.metrics)
+    apply_validation_defaults(args)
 
 
     if args.directory:
@@ -64,29 +86,37 @@ def main():
     if args.bagpath:
         bags.append(os.path.abspath(args.bagpath))
 
+    if args.history:
+        print_history(bags, args)
+        return
+
     LOGGER.info("Checking {} folder(s).".format(len(bags)))
 
-    invalid_bags = []
-    valid_bags = []
-    for bagpath in tqdm(bags):
-        LOGGER.info("Checking: {}".format(bagpath))
-        try:
-            bag = ami_bag(path = bagpath)
-        except Exception as e:
-            LOGGER.error("Following error encountered while loading {}: {}".format(bagpath, e))
-        else:
-            if bag.validate_amibag(fast = args.slow, metadata = args.metadata):
-                LOGGER.info("Valid {} {} bag: {}".format(bag.type, bag.subtype, bagpath))
-                valid_bags.append(os.path.basename(bagpath))
-            else:
-                LOGGER.error("Invalid bag: {}".format(bagpath))
-                invalid_bags.append(os.path.basename(bagpath))
+    runner = BatchRunner.from_args("validate_ami_bags", args,
+        initializer = configure_logging, initargs = (args,),
+        succeeded = lambda result: result["valid"])
+    try:
+        records = runner.run(validate_bag, bags, args)
+    finally:
+        runner.close()
+
+    results = [record_result(record) for record in records]
+
+    invalid_bags = [result["bag"] for result in results
+        if result["type"] and not result["valid"]]
+    valid_bags = [result["bag"] for result in results if result["valid"]]
 
     if invalid_bags:
         LOGGER.info("The following bags are not ready for media ingest: {}".format(", ".join(invalid_bags)))
     if valid_bags:
         LOGGER.info("The following bags are ready for media ingest: {}".format(", ".join(valid_bags)))
 
+    if args.report:
+        write_report(results, args.report)
+
+    if args.metrics:
+        METRICS.write(args.metrics)
+
 
 
 if __name__ == "__main__":
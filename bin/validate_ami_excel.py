@@ -6,6 +6,7 @@ import sys
 import logging
 from openpyxl import load_workbook
 from ami_md.ami_excel import ami_excel
+from ami_metrics.metrics import METRICS
 
 LOGGER = logging.getLogger(__name__)
 
@@ -33,6 +34,8 @@ def _make_parser():
                         help = "path to an AMI Excel file")
     parser.add_argument("-o", "--output",
                         help = "filename to save Excel file if rewritten")
+    parser.add_argument("--metrics",
+                        help = "Path to a .json file of timings and throughput per stage and file")
     parser.add_argument('--log', help='The name of the log file')
     parser.add_argument('--quiet', action='store_true')
     return parser
@@ -43,6 +46,7 @@ def main():
     args = parser.parse_args()
 
     _configure_logging(args)
+    METRICS.enabled = bool(args.metrics)
 
     if args.excel:
         excel = ami_excel(args.excel)
@@ -59,6 +63,9 @@ def main():
             else:
                 LOGGER.error("{}: invalid".format(args.output))
 
+    if args.metrics:
+        METRICS.write(args.metrics)
+
 
 
 if __name__ == "__main__":
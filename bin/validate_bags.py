@@ -1,8 +1,12 @@
 import os
+import time
 import argparse
-from tqdm import tqdm
 import logging
-from bagit import Bag
+from bagit import Bag, BagError
+from ami_bag.bag_report import write_report, report_file
+from ami_metrics.metrics import METRICS, stage
+from ami_bag.batch_runner import BatchRunner, add_batch_arguments
+from ami_bag.device_scheduler import job_count
 
 
 LOGGER = logging.getLogger(__name__)
@@ -29,12 +33,49 @@ def _make_parser():
                         help = "Path to the base directory of the bag")
     parser.add_argument("--slow", action='store_false',
                         help = "Recalculate hashes (very slow)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help = "Number of bags to validate in parallel")
+    parser.add_argument("--rotational-jobs", type=job_count, default=1,
+                        help = "Maximum parallel bags on one spinning or unknown disk")
+    parser.add_argument("--ssd-jobs", type=job_count, default=None,
+                        help = "Maximum parallel bags on one solid state disk (default: --jobs)")
+    add_batch_arguments(parser)
+    parser.add_argument("--report", type=report_file,
+                        help = "Path to a .json or .csv report of results for each bag")
+    parser.add_argument("--metrics",
+                        help = "Path to a .json file of timings and throughput per stage, bag and file")
     parser.add_argument('--log', help='The name of the log file')
     parser.add_argument('--quiet', action='store_true')
     return parser
 
 
 
+def validate_bag(bagpath, fast):
+    result = {"bag": os.path.basename(bagpath), "path": bagpath,
+        "valid": False, "error": None}
+    start = time.time()
+
+    LOGGER.info("Checking: {}".format(bagpath))
+    try:
+        bag = Bag(bagpath)
+    except Exception:
+        LOGGER.error("{}: Not a bag".format(bagpath))
+        result["error"] = "Not a bag"
+    else:
+        try:
+            with stage("validate_bag", bag = bagpath):
+                bag.validate(fast = fast)
+        except BagError as e:
+            LOGGER.error("{}: invalid".format(bagpath))
+            result["error"] = str(e)
+        else:
+            LOGGER.info("{}: valid".format(bagpath))
+            result["valid"] = True
+
+    result["seconds"] = round(time.time() - start, 3)
+    return result
+
+
 def main():
     parser = _make_parser()
     args = parser.parse_args()
@@ -47,7 +88,7 @@ def main():
     if not args.slow:
         checks += ", Recalculating hashes"
     LOGGER.info(checks)
-
+    METRICS.enabled = bool(args.metrics)
 
     if args.directory:
         directory_path = os.path.abspath(args.directory)
@@ -61,17 +102,27 @@ def main():
 
     LOGGER.info("Checking {} folder(s).".format(len(bags)))
 
-    for bagpath in tqdm(bags):
-        LOGGER.info("Checking: {}".format(bagpath))
-        try:
-            bag = Bag(bagpath)
-        except:
-            LOGGER.error("{}: Not a bag".format(bagpath))
-        else:
-            if bag.validate(fast = args.slow):
-                LOGGER.info("{}: valid".format(bagpath))
-            else:
-                LOGGER.error("{}: invalid".format(bagpath))
+    runner = BatchRunner.from_args("validate_bags", args,
+        initializer = _configure_logging, initargs = (args,),
+        succeeded = lambda result: result["valid"])
+    try:
+        records = runner.run(validate_bag, bags, args.slow)
+    finally:
+        runner.close()
+
+    results = [record["outcome"] or {"bag": os.path.basename(record["bag"]),
+        "path": record["bag"], "valid": False, "error": record["error"]}
+        for record in records]
+
+    invalid_bags = [result["bag"] for result in results if not result["valid"]]
+    if invalid_bags:
+        LOGGER.info("The following bags are invalid: {}".format(", ".join(invalid_bags)))
+
+    if args.report:
+        write_report(results, args.report)
+
+    if args.metrics:
+        METRICS.write(args.metrics)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+import os
+import time
+import signal
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from ami_bag.bag_watcher import BagWatcher
+from ami_bag.bag_report import write_report
+from ami_bag.bag_validation import (configure_logging, add_validation_arguments,
+    apply_validation_defaults, validate_bag, record_result)
+from ami_bag.batch_runner import run_in_worker
+from ami_metrics.metrics import METRICS
+
+
+LOGGER = logging.getLogger(__name__)
+
+def _make_parser():
+    parser = argparse.ArgumentParser()
+    parser.description = "validate bags in a directory as soon as they finish copying in"
+    parser.add_argument("-d", "--directory", required = True,
+                        help = "Path to the directory to watch for bags")
+    parser.add_argument("--report-dir", required = True,
+                        help = "Directory to write a .json report for each bag to")
+    parser.add_argument("--settle", type=float, default=60,
+                        help = "Seconds a bag must go unchanged before it is validated")
+    parser.add_argument("--interval", type=float, default=5,
+                        help = "Seconds between checks for settled bags")
+    parser.add_argument("--poll", action='store_true',
+                        help = "Compare bag sizes every interval instead of using inotify (e.g. for network shares)")
+    add_validation_arguments(parser)
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help = "Number of bags to validate in parallel")
+    parser.add_argument("--time-limit", type=float, default=None,
+                        help = "Give up on a bag after this many seconds")
+    parser.add_argument("--metrics",
+                        help = "Path to a .json file of timings and throughput per stage, bag and file, written when the watcher stops")
+    parser.add_argument('--log', help='The name of the log file')
+    parser.add_argument('--quiet', action='store_true')
+    return parser
+
+
+def _init_worker(args):
+    # leave Ctrl-C to the main process so running validations can finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_logging(args)
+
+
+def submit(executor, bagpath, args):
+    # worker processes are started by submit; ignoring Ctrl-C around it
+    # lets forked workers inherit that before they pick up a bag
+    previous = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        return executor.submit(run_in_worker, bagpath, _init_worker, (args,),
+            METRICS.enabled, args.time_limit, validate_bag, args)
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+
+def report_path(report_dir, result):
+    return os.path.join(report_dir, "{}.json".format(result["bag"]))
+
+
+def handle_result(future, report_dir):
+    try:
+        result, snapshot = future.result()
+        METRICS.merge(snapshot)
+        result = record_result(result)
+    except Exception as e:
+        LOGGER.error("Validation worker failed: {}".format(e))
+        return
+
+    result["validated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    if result["valid"]:
+        LOGGER.info("{} is ready for media ingest".format(result["bag"]))
+    else:
+        LOGGER.error("{} is not ready for media ingest".format(result["bag"]))
+    write_report([result], report_path(report_dir, result))
+
+
+def main():
+    parser = _make_parser()
+    args = parser.parse_args()
+
+    configure_logging(args)
+
+    METRICS.enabled = bool(args.metrics)
+    apply_validation_defaults(args)
+    if not os.path.isdir(args.report_dir):
+        os.makedirs(args.report_dir)
+
+    watcher = BagWatcher(args.directory, settle = args.settle,
+        interval = args.interval, polling = args.poll)
+    LOGGER.info("Watching {} for bags".format(watcher.root))
+
+    running = set()
+    with ProcessPoolExecutor(max_workers = args.jobs) as executor:
+        try:
+            while True:
+                for bagpath in watcher.poll():
+                    LOGGER.info("{} has settled, validating".format(bagpath))
+                    running.add(submit(executor, bagpath, args))
+
+                if running:
+                    done, running = wait(running, timeout = 0,
+                        return_when = FIRST_COMPLETED)
+                    for future in done:
+                        handle_result(future, args.report_dir)
+        except KeyboardInterrupt:
+            LOGGER.info("Stopping, waiting for {} validation(s) to finish".format(len(running)))
+            for future in wait(running).done:
+                handle_result(future, args.report_dir)
+        finally:
+            watcher.close()
+
+    if args.metrics:
+        METRICS.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
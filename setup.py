@@ -40,7 +40,12 @@ setup(
                'bin/survey_drive.py',
                'bin/pamidb_to_json.py',
                'bin/repair_ami_json_bag.py',
-               'bin/convert_excelbag_to_jsonbag.py'],
+               'bin/convert_excelbag_to_jsonbag.py',
+               'bin/benchmark_fixity_reads.py',
+               'bin/watch_ami_bags.py',
+               'bin/find_duplicate_bags.py',
+               'bin/transfer_bags.py',
+               'bin/diff_bags.py'],
     platforms = ['POSIX'],
     install_requires = requirements,
     dependency_links = ['https://github.com/LibraryOfCongress/bagit-python/tarball/master#egg=bagit-1.6.0b8'],
@@ -51,6 +51,17 @@ class TestNotAnAMIBag(SelfCleaningTestCase):
     self.assertRaises(ami_bag.ami_BagError, ami_bag.ami_bag,
       path = self.tmpdir)
 
+  def test_malformed_manifest_digest(self):
+    bagit.make_bag(self.tmpdir)
+    manifest = os.path.join(self.tmpdir, 'manifest-sha256.txt')
+    with open(manifest) as f:
+      lines = f.readlines()
+    lines[0] = lines[0][:10] + lines[0][64:]
+    with open(manifest, 'w') as f:
+      f.writelines(lines)
+    self.assertRaises(ami_bag.ami_BagError, ami_bag.ami_bag,
+      path = self.tmpdir)
+
   def test_no_presmasters(self):
     pres_dir = os.path.join(self.tmpdir, 'PreservationMasters')
     shutil.rmtree(pres_dir)
@@ -87,6 +98,13 @@ class TestJSONVideoAMIBag(SelfCleaningTestCase):
     self.assertTrue(bag.type == 'json')
     self.assertTrue(bag.subtype == 'video')
 
+  def test_lazy_load_bag(self):
+    bagit.make_bag(self.tmpdir)
+    bag = ami_bag.ami_bag(path = self.tmpdir, lazy = True)
+    self.assertEqual(bag.metadata_objects, {})
+    self.assertEqual(bag.media_files_md, set(['myd_263524_v01_pm.mov', 'myd_263524_v01_sc.mp4']))
+    self.assertEqual(len(bag.metadata_objects), 2)
+
   def test_valid_bag(self):
     bagit.make_bag(self.tmpdir)
     bag = ami_bag.ami_bag(path = self.tmpdir)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join as j
+import bagit
+
+from ami_bag.bag_diff import diff_bags, diff_roots, bags_match
+
+
+class TestBagDiff(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+
+  def make_bag(self, name, files, checksums = ['md5']):
+    bag_path = j(self.tmpdir, name)
+    os.makedirs(bag_path)
+    for filename, contents in files.items():
+      with open(j(bag_path, filename), 'w') as f:
+        f.write(contents)
+    bagit.make_bag(bag_path, checksums = checksums)
+    return bag_path
+
+  def test_identical_bags_match(self):
+    bag_a = self.make_bag(j('a', 'bag'), {'a.txt': 'a', 'b.txt': 'b'})
+    bag_b = self.make_bag(j('b', 'bag'), {'a.txt': 'a', 'b.txt': 'b'},
+      checksums = ['md5', 'sha256'])
+    diff = diff_bags(bag_a, bag_b)
+    self.assertTrue(bags_match(diff))
+    self.assertEqual(diff.oxum, ('2.2', '2.2'))
+
+  def test_added_missing_and_changed(self):
+    bag_a = self.make_bag('a', {'a.txt': 'a', 'b.txt': 'b', 'c.txt': 'c'})
+    bag_b = self.make_bag('b', {'b.txt': 'b', 'c.txt': 'C', 'd.txt': 'd'})
+    diff = diff_bags(bag_a, bag_b)
+    self.assertEqual(diff.added, ['data/d.txt'])
+    self.assertEqual(diff.missing, ['data/a.txt'])
+    self.assertEqual(diff.changed, ['data/c.txt'])
+    self.assertEqual(diff.size_changed, [])
+    self.assertFalse(bags_match(diff))
+
+  def test_truncated_file_changes_size(self):
+    bag_a = self.make_bag('a', {'a.txt': 'aaaa'})
+    bag_b = self.make_bag('b', {'a.txt': 'aaaa'})
+    with open(j(bag_b, 'data', 'a.txt'), 'w') as f:
+      f.write('aa')
+    diff = diff_bags(bag_a, bag_b)
+    self.assertEqual(diff.size_changed, ['data/a.txt'])
+    self.assertTrue(bags_match(diff_bags(bag_a, bag_b, sizes = False)))
+
+  def test_malformed_manifest_line(self):
+    files = {'a.txt': 'a', 'b.txt': 'b', 'c.txt': 'c'}
+    bag_a = self.make_bag('a', files)
+    bag_b = self.make_bag('b', files)
+    manifest = j(bag_b, 'manifest-md5.txt')
+    with open(manifest) as f:
+      lines = sorted(f.readlines())
+    lines[0] = lines[0][:20] + lines[0][32:]
+    with open(manifest, 'w') as f:
+      f.writelines(lines)
+    diff = diff_bags(bag_a, bag_b)
+    self.assertEqual(diff.malformed, ['data/a.txt'])
+    self.assertEqual(diff.changed, [])
+    self.assertEqual(diff.added, [])
+    self.assertEqual(diff.missing, [])
+    self.assertFalse(bags_match(diff))
+
+  def test_diff_roots(self):
+    self.make_bag(j('a', 'shared'), {'a.txt': 'a'})
+    self.make_bag(j('b', 'shared'), {'a.txt': 'b'})
+    self.make_bag(j('a', 'only_a'), {'a.txt': 'a'})
+    self.make_bag(j('b', 'nested', 'only_b'), {'a.txt': 'a'})
+    root_diff = diff_roots(j(self.tmpdir, 'a'), j(self.tmpdir, 'b'))
+    self.assertEqual(root_diff.added, [j('nested', 'only_b')])
+    self.assertEqual(root_diff.missing, ['only_a'])
+    self.assertEqual(list(root_diff.bags), ['shared'])
+    self.assertEqual(root_diff.bags['shared'].changed, ['data/a.txt'])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from ami_bag.bag_profiles import ProfileRegistry, DEFAULT_PROFILES
+
+
+class TestProfileRegistry(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.registry = ProfileRegistry.from_constants()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def test_match_excel(self):
+    self.assertEqual(self.registry.match("excel",
+      set(["Metadata", "PreservationMasters"]), set([".mov", ".xlsx"])), "video")
+    self.assertEqual(self.registry.match("excel",
+      set(["Metadata", "PreservationMasters"]), set([".iso", ".xlsx", ".old"])), "dvd")
+    self.assertEqual(self.registry.match("excel",
+      set(["Metadata", "ArchiveOriginals", "EditMasters"]), set([".wav", ".xlsx"])),
+      "born-digital audio")
+
+  def test_first_match_wins(self):
+    # audio comes before audio w/o edit masters, as in the original checks
+    self.assertEqual(self.registry.match("excel",
+      set(["Metadata", "PreservationMasters"]), set([".wav", ".xlsx"])), "audio")
+
+  def test_match_json(self):
+    self.assertEqual(self.registry.match("json",
+      set(["PreservationMasters", "ServiceCopies"]), set([".mov", ".mp4", ".json"])),
+      "video")
+    self.assertEqual(self.registry.match("json",
+      set(["PreservationMasters", "EditMasters"]), set([".wav", ".json", ".jpg"])),
+      "audio")
+
+  def test_no_match(self):
+    self.assertIsNone(self.registry.match("json",
+      set(["PreservationMasters", "Unknown"]), set([".mov", ".json"])))
+    self.assertIsNone(self.registry.match("json",
+      set(["PreservationMasters"]), set([".mov", ".wav", ".json"])))
+    self.assertIsNone(self.registry.match("unknown type",
+      set(["PreservationMasters"]), set([".mov"])))
+
+  def test_match_is_remembered(self):
+    self.registry.match("json", set(["PreservationMasters"]), set([".mov", ".json"]))
+    self.assertEqual(len(self.registry.matches), 1)
+    self.registry.match("json", set(["PreservationMasters"]), set([".json", ".mov"]))
+    self.assertEqual(len(self.registry.matches), 1)
+
+  def test_candidates(self):
+    candidates = self.registry.candidates(set(["PreservationMasters", "Extra"]),
+      set([".wav", ".json"]), bag_type = "json")
+    self.assertEqual([c.profile.subtype for c in candidates], ["video", "audio"])
+    self.assertEqual(candidates[0].reasons, ["unexpected directories: Extra",
+      "unexpected extensions: .wav"])
+    self.assertEqual(candidates[1].reasons, ["unexpected directories: Extra"])
+
+  def test_candidates_all_types(self):
+    candidates = self.registry.candidates(set(["PreservationMasters"]), set([".mov", ".json"]))
+    matches = [(c.profile.type, c.profile.subtype) for c in candidates if not c.reasons]
+    self.assertEqual(matches, [("json", "video"), ("excel-json", "video")])
+
+  def test_from_file(self):
+    profile_path = os.path.join(self.tmpdir, 'profiles.json')
+    with open(profile_path, 'w') as f:
+      json.dump({"json": {"film": {"directories": ["PreservationMasters"],
+        "extensions": [".dpx", ".json"]}}}, f)
+    registry = ProfileRegistry.from_file(profile_path)
+    self.assertEqual(registry.match("json", set(["PreservationMasters"]),
+      set([".dpx", ".json"])), "film")
+    self.assertIsNone(registry.match("json", set(["PreservationMasters"]),
+      set([".mov", ".json"])))
+
+  def test_default_profiles(self):
+    self.assertEqual(list(DEFAULT_PROFILES.profiles.keys()), ["excel", "json", "excel-json"])
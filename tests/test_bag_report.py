@@ -0,0 +1,48 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from ami_bag.bag_report import write_report, report_file
+
+
+RESULTS = [
+  {"bag": "b2", "path": "/bags/b2", "valid": False, "error": "Bag is incomplete"},
+  {"bag": "b1", "path": "/bags/b1", "valid": True, "error": None}
+]
+
+
+class TestBagReport(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def test_json_report(self):
+    report_path = os.path.join(self.tmpdir, 'report.json')
+    write_report(RESULTS, report_path)
+    with open(report_path) as f:
+      report = json.load(f)
+    self.assertEqual([row["bag"] for row in report], ["b1", "b2"])
+
+  def test_csv_report(self):
+    report_path = os.path.join(self.tmpdir, 'report.csv')
+    write_report(RESULTS, report_path)
+    with open(report_path) as f:
+      report = list(csv.DictReader(f))
+    self.assertEqual(report[1]["error"], "Bag is incomplete")
+
+  def test_unknown_format(self):
+    self.assertRaises(ValueError, write_report, RESULTS,
+      os.path.join(self.tmpdir, 'report.txt'))
+
+  def test_report_file_checks_extension(self):
+    self.assertEqual(report_file('report.CSV'), 'report.CSV')
+    self.assertRaises(ValueError, report_file, 'report.txt')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join as j
+import bagit
+
+from ami_bag.bag_validation import (add_validation_arguments,
+  apply_validation_defaults, validate_bag, record_result)
+from ami_bag.results_store import ResultsStore
+
+
+class TestBagValidation(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.bag_path = j(self.tmpdir, 'bag')
+    shutil.copytree('tests/test-data/unbagged', self.bag_path)
+    bagit.make_bag(self.bag_path)
+
+  def tearDown(self):
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+
+  def parse(self, *argv):
+    parser = add_validation_arguments(argparse.ArgumentParser())
+    return apply_validation_defaults(parser.parse_args(list(argv)))
+
+  def test_quick_defaults_the_fixity_cache(self):
+    self.assertIsNone(self.parse().fixity_cache)
+    self.assertTrue(self.parse("--quick").fixity_cache)
+    self.assertTrue(self.parse("--skip-unchanged").results_db)
+
+  def test_bag_that_is_not_an_ami_bag(self):
+    result = validate_bag(self.bag_path, self.parse())
+    self.assertFalse(result["valid"])
+    self.assertIn("PreservationMasters", result["error"])
+
+  def test_slow_run_with_unbounded_cache_is_recorded_as_quick(self):
+    results_db = j(self.tmpdir, 'results.sqlite')
+    for max_age, level in [([], "quick"), (["--cache-max-age", "30"], "full")]:
+      args = self.parse("--slow", "--fixity-cache", j(self.tmpdir, 'cache.sqlite'),
+        "--results-db", results_db, *max_age)
+      validate_bag(self.bag_path, args)
+      store = ResultsStore(results_db)
+      self.assertEqual(store.history(self.bag_path)[0]["fixity"], level)
+      store.close()
+
+  def test_record_result_stands_in_for_failed_bags(self):
+    result = record_result({"bag": self.bag_path, "status": "timeout",
+      "outcome": None, "error": "Stopped after 1 seconds"})
+    self.assertEqual(result["bag"], "bag")
+    self.assertFalse(result["valid"])
+    self.assertEqual(result["error"], "Stopped after 1 seconds")
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join as j
+import bagit
+
+from ami_bag.bag_watcher import BagWatcher, InotifyWatcher, bag_signature
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBagWatcher(unittest.TestCase):
+    polling = True
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        if os.path.isdir(self.tmpdir):
+            shutil.rmtree(self.tmpdir)
+
+    def make_watcher(self):
+        return BagWatcher(self.tmpdir, settle = 10, interval = 0,
+            polling = self.polling, clock = self.clock)
+
+    def copy_bag(self, name):
+        bag_path = j(self.tmpdir, name)
+        shutil.copytree('tests/test-data/unbagged', bag_path)
+        return bag_path
+
+    def settle(self, watcher):
+        ready = []
+        for i in range(3):
+            self.clock.now += 11
+            ready.extend(watcher.poll(0))
+        return ready
+
+    def test_bag_is_ready_once_settled(self):
+        watcher = self.make_watcher()
+        bag_path = self.copy_bag("bag1")
+        self.assertEqual(watcher.poll(0), [])
+        # no tag manifest yet, so the copy is not finished
+        self.assertEqual(self.settle(watcher), [])
+        bagit.make_bag(bag_path)
+        self.assertEqual(watcher.poll(0), [])
+        self.assertEqual(self.settle(watcher), [bag_path])
+        self.assertEqual(self.settle(watcher), [])
+        watcher.close()
+
+    def test_bag_is_rechecked_after_changes(self):
+        bag_path = self.copy_bag("bag1")
+        bagit.make_bag(bag_path)
+        watcher = self.make_watcher()
+        self.assertEqual(self.settle(watcher), [bag_path])
+        with open(j(bag_path, "data", "hello.txt"), 'a') as f:
+            f.write("more")
+        self.assertEqual(watcher.poll(0), [])
+        self.assertEqual(self.settle(watcher), [bag_path])
+        watcher.close()
+
+    def test_deleted_bag_is_forgotten(self):
+        bag_path = self.copy_bag("bag1")
+        bagit.make_bag(bag_path)
+        watcher = self.make_watcher()
+        self.settle(watcher)
+        shutil.rmtree(bag_path)
+        self.assertEqual(self.settle(watcher), [])
+        self.assertEqual(watcher.validated, {})
+        watcher.close()
+
+    def test_signature(self):
+        bag_path = self.copy_bag("bag1")
+        files, size, mtime = bag_signature(bag_path)
+        self.assertEqual(files, sum(len(f) for _, _, f in os.walk(bag_path)))
+
+
+class TestInotifyBagWatcher(TestBagWatcher):
+    polling = False
+
+    def setUp(self):
+        super(TestInotifyBagWatcher, self).setUp()
+        try:
+            InotifyWatcher(self.tmpdir).close()
+        except OSError:
+            self.skipTest("inotify is not available")
+
+    def test_uses_inotify(self):
+        watcher = self.make_watcher()
+        self.assertIsInstance(watcher.backend, InotifyWatcher)
+        bag_path = self.copy_bag("bag1")
+        self.assertIn(bag_path, watcher.backend.changes(1))
+        watcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import json
+import argparse
+import shutil
+import tempfile
+import time
+import unittest
+from os.path import join as j
+
+from ami_bag.batch_runner import BatchJournal, BatchRunner, run_bag, add_batch_arguments
+
+
+def check_bag(path, suffix):
+  if path.endswith("broken"):
+    raise ValueError("cannot read {}".format(path))
+  if path.endswith("slow"):
+    time.sleep(5)
+  return {"path": path + suffix, "valid": not path.endswith("invalid")}
+
+
+def mark_worker(directory):
+  with open(j(directory, 'worker-{}'.format(os.getpid())), 'w'):
+    pass
+
+
+class TestBatchRunner(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.journal_path = j(self.tmpdir, 'batches', 'journal.jsonl')
+    self.bags = [j(self.tmpdir, name) for name in ('a', 'broken', 'invalid', 'b')]
+    self.calls = []
+
+  def tearDown(self):
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+
+  def counting(self, path, suffix):
+    self.calls.append(path)
+    return check_bag(path, suffix)
+
+  def run_batch(self, fn, resume = False, retry_failed = False, **kwargs):
+    runner = BatchRunner(BatchJournal(self.journal_path, resume = resume),
+      retry_failed = retry_failed, succeeded = lambda result: result["valid"],
+      **kwargs)
+    try:
+      return runner.run(fn, self.bags, "!")
+    finally:
+      runner.close()
+
+  def test_records_outcomes(self):
+    records = self.run_batch(self.counting)
+    self.assertEqual([record["bag"] for record in records], self.bags)
+    self.assertEqual([record["status"] for record in records],
+      ["done", "failed", "failed", "done"])
+    self.assertEqual(records[0]["outcome"]["path"], self.bags[0] + "!")
+    self.assertIn("cannot read", records[1]["error"])
+    with open(self.journal_path) as f:
+      self.assertEqual(len(f.readlines()), 4)
+
+  def test_resume_skips_finished_bags(self):
+    self.run_batch(self.counting)
+    self.calls = []
+    records = self.run_batch(self.counting, resume = True)
+    self.assertEqual(self.calls, [])
+    self.assertEqual(len(records), 4)
+
+    records = self.run_batch(self.counting, resume = True, retry_failed = True)
+    self.assertEqual(self.calls, self.bags[1:3])
+    self.assertEqual(records[3]["status"], "done")
+
+  def test_resume_after_interruption(self):
+    self.run_batch(self.counting)
+    with open(self.journal_path) as f:
+      lines = f.readlines()
+    with open(self.journal_path, 'w') as f:
+      f.writelines(lines[:2])
+      f.write(lines[2][:10])
+    self.calls = []
+    self.run_batch(self.counting, resume = True)
+    self.assertEqual(self.calls, self.bags[2:])
+
+  def test_without_resume_starts_over(self):
+    self.run_batch(self.counting)
+    self.calls = []
+    self.run_batch(self.counting)
+    self.assertEqual(self.calls, self.bags)
+
+  def test_time_limit(self):
+    record = run_bag(j(self.tmpdir, 'slow'), 0.1, check_bag, "!")
+    self.assertEqual(record["status"], "timeout")
+    self.assertLess(record["seconds"], 5)
+
+  def test_no_time_limit_for_scripts_that_change_bags(self):
+    parser = argparse.ArgumentParser()
+    for option in ("--directory", "--bagpath", "--jobs", "--rotational-jobs", "--ssd-jobs"):
+      parser.add_argument(option)
+    add_batch_arguments(parser, time_limit = False)
+    args = parser.parse_args(["--directory", self.tmpdir, "--jobs", "1",
+      "--journal", self.journal_path])
+    self.assertFalse(hasattr(args, "time_limit"))
+    runner = BatchRunner.from_args("test", args)
+    runner.close()
+    self.assertIsNone(runner.time_limit)
+
+  def test_processes(self):
+    self.bags.append(j(self.tmpdir, 'slow'))
+    records = self.run_batch(check_bag, jobs = 2, time_limit = 0.5)
+    self.assertEqual([record["status"] for record in records],
+      ["done", "failed", "failed", "done", "timeout"])
+    with open(self.journal_path) as f:
+      self.assertEqual(set(json.loads(line)["bag"] for line in f), set(self.bags))
+
+  def test_initializer_runs_in_workers(self):
+    markers = j(self.tmpdir, 'markers')
+    os.makedirs(markers)
+    self.run_batch(check_bag, jobs = 2, initializer = mark_worker,
+      initargs = (markers,))
+    self.assertTrue(os.listdir(markers))
+    self.assertNotIn('worker-{}'.format(os.getpid()), os.listdir(markers))
+
+
+if __name__ == '__main__':
+  unittest.main()
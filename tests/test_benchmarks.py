@@ -0,0 +1,47 @@
+import unittest
+import tempfile
+import shutil
+
+from ami_bag.ami_bag import ami_bag
+from benchmarks.synthetic_bags import BAG_PROFILES, make_bag, stub_mediainfo
+from benchmarks.run_benchmarks import compare_to_baseline
+
+
+class TestSyntheticBags(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def test_profiles_match_bag_types(self):
+    for bag_type, subtype in BAG_PROFILES:
+      bag = make_bag(self.tmpdir, bag_type, subtype, files = 2, file_size = 100)
+      loaded_bag = ami_bag(path = bag.path, lazy = True)
+      self.assertEqual((loaded_bag.type, loaded_bag.subtype), (bag_type, subtype))
+
+  def test_json_bag_is_valid(self):
+    bag = make_bag(self.tmpdir, "json", "video", files = 2, file_size = 100)
+    with stub_mediainfo():
+      loaded_bag = ami_bag(path = bag.path)
+      self.assertTrue(loaded_bag.validate_amibag(fast = False, metadata = True))
+
+  def test_file_sizes(self):
+    bag = make_bag(self.tmpdir, "json", "audio", files = 3, file_size = 2500)
+    loaded_bag = ami_bag(path = bag.path, lazy = True)
+    media = [loaded_bag.inventory.get(path) for path in loaded_bag.inventory
+      if path.endswith(".wav")]
+    self.assertEqual(len(media), 6)
+    self.assertTrue(all(payload_file.size == 2500 for payload_file in media))
+
+
+class TestBaseline(unittest.TestCase):
+  def test_compare_to_baseline(self):
+    baseline = {"json/video/load": {"seconds": 1.0},
+      "json/video/validate_slow": {"seconds": 1.0}}
+    results = {"json/video/load": {"seconds": 1.05},
+      "json/video/validate_slow": {"seconds": 2.0},
+      "json/audio/load": {"seconds": 1.0}}
+    regressions = compare_to_baseline(results, baseline, 0.1)
+    self.assertEqual(list(regressions.keys()), ["json/video/validate_slow"])
+    self.assertEqual(results["json/video/load"]["baseline_ratio"], 1.05)
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from ami_bag.device_scheduler import DeviceScheduler, device_id, job_count
+
+
+class CountingTask:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.running = 0
+    self.peak = 0
+
+  def __call__(self, path, suffix):
+    with self.lock:
+      self.running += 1
+      self.peak = max(self.peak, self.running)
+    time.sleep(0.01)
+    with self.lock:
+      self.running -= 1
+    return path + suffix
+
+
+class OneDiskScheduler(DeviceScheduler):
+  def device_limit(self, dev):
+    return self.rotational_limit
+
+
+class TestDeviceScheduler(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.paths = []
+    for i in range(6):
+      path = os.path.join(self.tmpdir, 'bag{}'.format(i))
+      os.mkdir(path)
+      self.paths.append(path)
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def test_groups_paths_by_device(self):
+    scheduler = DeviceScheduler(None, 4)
+    queues = scheduler.group_by_device(self.paths)
+    self.assertEqual(list(queues.keys()), [device_id(self.tmpdir)])
+    self.assertEqual(list(queues[device_id(self.tmpdir)]), self.paths)
+
+  def test_respects_device_limit(self):
+    task = CountingTask()
+    with ThreadPoolExecutor(max_workers = 4) as executor:
+      scheduler = OneDiskScheduler(executor, 4, rotational_limit = 2)
+      results = list(scheduler.map(task, self.paths, '-done'))
+    self.assertEqual(sorted(results), sorted(p + '-done' for p in self.paths))
+    self.assertEqual(task.peak, 2)
+
+  def test_limits_below_one_are_rejected(self):
+    self.assertRaises(ValueError, DeviceScheduler, None, 4, rotational_limit = 0)
+    self.assertRaises(ValueError, DeviceScheduler, None, 4, solid_state_limit = 0)
+    self.assertRaises(ValueError, job_count, "0")
+    self.assertEqual(job_count("2"), 2)
+
+  def test_unidentified_devices_are_treated_as_rotational(self):
+    scheduler = DeviceScheduler(None, 4, rotational_limit = 1, solid_state_limit = 4)
+    self.assertEqual(scheduler.device_limit(os.makedev(0, 4242)), 1)
+
+  def test_missing_paths_are_still_run(self):
+    task = CountingTask()
+    missing = os.path.join(self.tmpdir, 'missing')
+    with ThreadPoolExecutor(max_workers = 2) as executor:
+      scheduler = DeviceScheduler(executor, 2)
+      results = list(scheduler.map(task, [missing], ''))
+    self.assertEqual(results, [missing])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join as j
+import bagit
+
+from ami_bag.duplicate_index import DuplicateIndex, find_bags
+
+
+class TestDuplicateIndex(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.root = j(self.tmpdir, 'drive')
+    self.index = DuplicateIndex(j(self.tmpdir, 'index', 'duplicates.sqlite'))
+
+  def tearDown(self):
+    self.index.close()
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+
+  def make_bag(self, name, files):
+    bag_path = j(self.root, name)
+    os.makedirs(bag_path)
+    for filename, contents in files.items():
+      with open(j(bag_path, filename), 'w') as f:
+        f.write(contents)
+    bagit.make_bag(bag_path, checksums = ['md5'])
+    return bag_path
+
+  def test_find_bags(self):
+    bag1 = self.make_bag('bag1', {'a.txt': 'a'})
+    bag2 = self.make_bag(j('nested', 'bag2'), {'a.txt': 'a'})
+    self.assertEqual(list(find_bags(self.root)), [bag1, bag2])
+
+  def test_duplicates_and_identical_bags(self):
+    bag1 = self.make_bag('bag1', {'a.txt': 'aaaa', 'b.txt': 'b'})
+    bag2 = self.make_bag('bag2', {'a.txt': 'aaaa', 'b.txt': 'b'})
+    bag3 = self.make_bag('bag3', {'copy.txt': 'aaaa', 'c.txt': 'c'})
+    self.assertEqual(self.index.index_root(self.root), (3, 3))
+
+    self.assertEqual(self.index.identical_bags(), [[bag1, bag2]])
+
+    duplicates = self.index.duplicate_files()
+    self.assertEqual(duplicates[0]["copies"], [(bag1, 'data/a.txt'),
+      (bag2, 'data/a.txt'), (bag3, 'data/copy.txt')])
+    self.assertEqual(duplicates[0]["size"], 4)
+    self.assertEqual(duplicates[0]["reclaimable"], 8)
+    self.assertEqual(len(duplicates), 2)
+    self.assertEqual(len(self.index.duplicate_files(min_size = 2)), 1)
+
+  def test_similar_bags(self):
+    bag1 = self.make_bag('bag1', {'a.txt': 'a', 'b.txt': 'b', 'c.txt': 'c'})
+    bag2 = self.make_bag('bag2', {'a.txt': 'a', 'b.txt': 'b', 'd.txt': 'd'})
+    self.make_bag('bag3', {'e.txt': 'e'})
+    self.index.index_root(self.root)
+    self.assertEqual(self.index.similar_bags(0.5), [(0.5, bag1, bag2)])
+    self.assertEqual(self.index.similar_bags(0.6), [])
+
+  def test_similar_bags_skip_small_files(self):
+    for i in range(20):
+      self.make_bag('bag{:02}'.format(i), {'empty.txt': '', 'own.txt': str(i)})
+    self.index.index_root(self.root)
+    self.assertEqual(len(self.index.similar_bags(0.3)), 190)
+    self.assertEqual(self.index.similar_bags(0.3, min_size = 1), [])
+
+  def test_reindex_only_changed_bags(self):
+    bag1 = self.make_bag('bag1', {'a.txt': 'a'})
+    self.make_bag('bag2', {'b.txt': 'b'})
+    self.index.index_root(self.root)
+    self.assertEqual(self.index.index_root(self.root), (2, 0))
+
+    with open(j(bag1, 'data', 'a.txt'), 'w') as f:
+      f.write('b')
+    bag = bagit.Bag(bag1)
+    bag.save(manifests = True)
+    self.assertEqual(self.index.index_root(self.root), (2, 1))
+    self.assertEqual(len(self.index.duplicate_files()), 1)
+
+  def test_prune(self):
+    bag1 = self.make_bag('bag1', {'a.txt': 'a'})
+    self.make_bag('bag2', {'a.txt': 'a'})
+    self.index.index_root(self.root)
+    shutil.rmtree(bag1)
+    self.assertEqual(self.index.prune(self.root), [bag1])
+    self.assertEqual(self.index.duplicate_files(), [])
+
+
+if __name__ == '__main__':
+  unittest.main()
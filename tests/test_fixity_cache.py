@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from os.path import join as j
+import bagit
+
+import ami_bag.update_bag as update_bag
+from ami_bag.fixity_cache import FixityCache
+
+
+class TestFixityCache(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.bagdir = j(self.tmpdir, 'bag')
+    shutil.copytree('tests/test-data/unbagged', self.bagdir)
+    bagit.make_bag(self.bagdir, checksums=['md5', 'sha256'])
+    self.cache = FixityCache(j(self.tmpdir, 'cache', 'fixity.sqlite'))
+
+  def tearDown(self):
+    self.cache.close()
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+
+  def test_record_and_lookup(self):
+    f = j(self.bagdir, 'data/hello.txt')
+    stat = os.stat(f)
+    hashes = {'md5': 'a', 'sha256': 'b'}
+    self.cache.record(self.bagdir, 'data/hello.txt', stat, hashes)
+    self.assertEqual(self.cache.lookup(self.bagdir, 'data/hello.txt', stat, ['md5']), {'md5': 'a'})
+    self.assertIsNone(self.cache.lookup(self.bagdir, 'data/hello.txt', stat, ['sha1']))
+
+  def test_lookup_misses_changed_file(self):
+    f = j(self.bagdir, 'data/hello.txt')
+    self.cache.record(self.bagdir, 'data/hello.txt', os.stat(f), {'md5': 'a'})
+    with open(f, 'a') as r:
+      r.write('♡')
+    self.assertIsNone(self.cache.lookup(self.bagdir, 'data/hello.txt', os.stat(f), ['md5']))
+
+  def test_lookup_misses_old_entry(self):
+    f = j(self.bagdir, 'data/hello.txt')
+    self.cache.record(self.bagdir, 'data/hello.txt', os.stat(f), {'md5': 'a'})
+    self.cache.max_age = 1
+    self.cache.conn.execute("UPDATE fixity SET recorded = ?", (time.time() - 2 * 86400,))
+    self.assertIsNone(self.cache.lookup(self.bagdir, 'data/hello.txt', os.stat(f), ['md5']))
+
+  def test_bag_uses_cached_digests(self):
+    bag = update_bag.Repairable_Bag(path = self.bagdir, fixity_cache = self.cache)
+    self.assertTrue(bag.validate_fixity())
+    stat = os.stat(j(self.bagdir, 'data/hello.txt'))
+    self.cache.record(bag.path, 'data/hello.txt', stat, {'md5': '0', 'sha256': '0'})
+    self.assertRaises(bagit.BagValidationError, bag.validate_fixity)
+
+  def test_validate_fixity_detects_modified_file(self):
+    with open(j(self.bagdir, 'data/hello.txt'), 'w') as r:
+      r.write('♡')
+    bag = update_bag.Repairable_Bag(path = self.bagdir, fixity_cache = self.cache)
+    self.assertRaises(bagit.BagValidationError, bag.validate_fixity)
+
+
+  def test_validate_quick_uses_recorded_snapshot(self):
+    bag = update_bag.Repairable_Bag(path = self.bagdir, fixity_cache = self.cache)
+    self.assertEqual(bag.validate_quick()["hashed"], 1)
+    self.assertEqual(bag.validate_quick()["hashed"], 0)
+    with open(j(self.bagdir, 'data/hello.txt'), 'a') as r:
+      r.write('♡')
+    bag.refresh_inventory()
+    self.assertRaises(bagit.BagValidationError, bag.validate_quick)
+
+  def test_validate_quick_checks_cached_digests(self):
+    bag = update_bag.Repairable_Bag(path = self.bagdir, fixity_cache = self.cache)
+    self.assertEqual(bag.validate_quick()["hashed"], 1)
+    stat = os.stat(j(self.bagdir, 'data/hello.txt'))
+    self.cache.record(bag.path, 'data/hello.txt', stat, {'md5': '0', 'sha256': '0'})
+    self.assertRaises(bagit.BagValidationError, bag.validate_quick)
+    self.assertEqual(bag.quick_summary["hashed"], 0)
+
+  def test_validate_quick_rehashes_old_digests(self):
+    bag = update_bag.Repairable_Bag(path = self.bagdir, fixity_cache = self.cache)
+    bag.validate_quick()
+    self.cache.max_age = 1
+    self.cache.conn.execute("UPDATE fixity SET recorded = ?", (time.time() - 2 * 86400,))
+    self.assertEqual(bag.validate_quick()["hashed"], 1)
+    self.assertEqual(bag.validate_quick()["hashed"], 0)
+
+  def test_tag_manifests_reuse_only_unchanged_tag_files(self):
+    bag = update_bag.Repairable_Bag(path = self.bagdir, fixity_cache = self.cache)
+    bag.write_tag_manifests()
+    stat = os.stat(j(self.bagdir, 'bagit.txt'))
+    self.assertIsNotNone(self.cache.lookup(bag.path, 'bagit.txt', stat, ['md5']))
+    with open(j(self.bagdir, 'bag-info.txt'), 'a') as f:
+      f.write('Contact-Name: Someone\n')
+    bag = update_bag.Repairable_Bag(path = self.bagdir, fixity_cache = self.cache)
+    bag.write_tag_manifests()
+    self.assertTrue(update_bag.Repairable_Bag(path = self.bagdir).validate())
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from os.path import join as j
+
+import ami_bag.update_bag as update_bag
+from ami_bag.fixity_io import (STRATEGIES, ReadOptions, read_options,
+  parse_size, iter_blocks, measure_throughput)
+
+
+class TestFixityIO(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.data = os.urandom(100000)
+    self.filepath = j(self.tmpdir, 'data.bin')
+    with open(self.filepath, 'wb') as f:
+      f.write(self.data)
+
+  def tearDown(self):
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+
+  def test_every_strategy_reads_the_whole_file(self):
+    for strategy in STRATEGIES:
+      for drop_cache in (False, True):
+        options = ReadOptions(4096, strategy, drop_cache)
+        blocks = [bytes(block) for block in iter_blocks(self.filepath, options)]
+        self.assertEqual(b"".join(blocks), self.data)
+        self.assertTrue(all(len(block) <= 4096 for block in blocks))
+
+  def test_drop_cache_without_fadvise(self):
+    with mock.patch.dict(os.__dict__), \
+      mock.patch("ami_bag.fixity_io.DROP_CACHE_INTERVAL", 4096):
+      for name in ("posix_fadvise", "POSIX_FADV_DONTNEED", "POSIX_FADV_SEQUENTIAL"):
+        os.__dict__.pop(name, None)
+      for strategy in STRATEGIES:
+        blocks = iter_blocks(self.filepath, ReadOptions(4096, strategy, True))
+        self.assertEqual(b"".join(bytes(block) for block in blocks), self.data)
+
+  def test_empty_file(self):
+    empty = j(self.tmpdir, 'empty')
+    open(empty, 'w').close()
+    for strategy in STRATEGIES:
+      self.assertEqual(list(iter_blocks(empty, ReadOptions(4096, strategy, False))), [])
+
+  def test_stopping_early_closes_the_file(self):
+    blocks = iter_blocks(self.filepath, ReadOptions(4096, "mmap", False))
+    next(blocks)
+    blocks.close()
+
+  def test_hash_file_matches_hashlib(self):
+    expected = hashlib.md5(self.data).hexdigest()
+    for strategy in STRATEGIES:
+      hashes = update_bag.hash_file(self.filepath, ['md5'],
+        read_options(8192, strategy))
+      self.assertEqual(hashes['md5'], expected)
+
+  def test_unknown_strategy(self):
+    with self.assertRaises(ValueError):
+      read_options(strategy = "telepathy")
+
+  def test_parse_size(self):
+    self.assertEqual(parse_size("65536"), 65536)
+    self.assertEqual(parse_size("64K"), 65536)
+    self.assertEqual(parse_size("8mb"), 8 * 1024 * 1024)
+    self.assertEqual(parse_size("1G"), 1024 ** 3)
+
+  def test_measure_throughput(self):
+    nbytes, seconds = measure_throughput([self.filepath],
+      ReadOptions(4096, "fadvise", False))
+    self.assertEqual(nbytes, len(self.data))
+    self.assertGreaterEqual(seconds, 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join as j
+import bagit
+
+import ami_bag.update_bag as update_bag
+from ami_bag.fixity_sample import (choose_sample, max_undetected,
+  sample_summary)
+
+
+class TestFixitySample(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    for directory, count in (("PreservationMasters", 10), ("ServiceCopies", 40)):
+      os.makedirs(j(self.tmpdir, directory))
+      for i in range(count):
+        with open(j(self.tmpdir, directory, "file{:02d}.txt".format(i)), 'w') as f:
+          f.write("{} {}".format(directory, i))
+    bagit.make_bag(self.tmpdir, checksums = ['md5'])
+
+  def tearDown(self):
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+
+  def test_choose_sample_is_seeded_and_weighted(self):
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    strata = choose_sample(bag.payload_entries(), 0.1, "seed")
+    self.assertEqual(strata, choose_sample(bag.payload_entries(), 0.1, "seed"))
+    self.assertEqual(len(strata["PreservationMasters"].sample), 4)
+    self.assertEqual(len(strata["ServiceCopies"].sample), 4)
+    self.assertTrue(set(strata["ServiceCopies"].sample) <=
+      set(strata["ServiceCopies"].files))
+
+  def test_every_stratum_gets_a_file(self):
+    strata = choose_sample(["data/a/1", "data/b/1", "data/b/2"], 0.01, 0)
+    self.assertEqual([len(stratum.sample) for stratum in strata.values()], [1, 1])
+
+  def test_max_undetected(self):
+    self.assertEqual(max_undetected(100, 100, 0.05), 0)
+    self.assertEqual(max_undetected(100, 50, 0.05), 4)
+    self.assertEqual(max_undetected(100, 1, 0.05), 94)
+    self.assertEqual(max_undetected(10, 1, 0.05), 9)
+
+  def test_summary_splits_confidence(self):
+    strata = choose_sample(["data/a/{}".format(i) for i in range(100)] +
+      ["data/b/{}".format(i) for i in range(100)], 0.5, 0, weights = {})
+    summary = sample_summary(strata, 0.9)
+    self.assertEqual(summary["sampled"], 100)
+    self.assertEqual(summary["strata"]["a"]["max_bad_files"], 4)
+    self.assertEqual(summary["max_bad_files"], 8)
+
+  def test_validate_sample_passes(self):
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    summary = bag.validate_sample(0.1)
+    self.assertEqual(summary["files"], 50)
+    self.assertEqual(summary["sampled"], 8)
+    self.assertEqual(bag.sample_summary, summary)
+
+  def test_validate_sample_finds_sampled_corruption(self):
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    for entry in choose_sample(bag.payload_entries(), 0.1,
+      "0:" + os.path.basename(self.tmpdir))["ServiceCopies"].sample:
+      with open(j(self.tmpdir, entry), 'w') as f:
+        f.write("changed")
+    with self.assertRaises(bagit.BagValidationError):
+      update_bag.Repairable_Bag(path = self.tmpdir).validate_sample(0.1)
+
+  def test_validate_sample_finds_truncated_files(self):
+    open(j(self.tmpdir, "data", "ServiceCopies", "file00.txt"), 'w').close()
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    with self.assertRaises(bagit.BagValidationError) as cm:
+      bag.validate_sample(0.01, seed = 1)
+    self.assertTrue(any(e.path == "data/ServiceCopies/file00.txt"
+      for e in cm.exception.details))
+
+
+if __name__ == '__main__':
+  unittest.main()
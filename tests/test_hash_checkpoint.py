@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join as j
+import bagit
+
+import ami_bag.update_bag as update_bag
+from ami_bag.hash_checkpoint import HashCheckpoint
+
+
+class TestHashCheckpoint(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.bagdir = j(self.tmpdir, 'bag')
+    shutil.copytree('tests/test-data/unbagged', self.bagdir)
+    bagit.make_bag(self.bagdir, checksums=['md5'])
+    self.journal = j(self.tmpdir, 'checkpoints', 'bag.jsonl')
+
+  def tearDown(self):
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+
+  def interrupted_run(self, hashes):
+    checkpoint = HashCheckpoint(self.journal)
+    stat = os.stat(j(self.bagdir, 'data/hello.txt'))
+    checkpoint.record(self.bagdir, 'data/hello.txt', stat, hashes)
+    checkpoint.close()
+
+  def test_resume_reuses_recorded_digests(self):
+    self.interrupted_run({'md5': '0'})
+    checkpoint = HashCheckpoint(self.journal, resume = True)
+    bag = update_bag.Repairable_Bag(path = self.bagdir, checkpoint = checkpoint)
+    self.assertRaises(bagit.BagValidationError, bag.validate_fixity)
+    checkpoint.close()
+
+  def test_fresh_run_ignores_journal(self):
+    self.interrupted_run({'md5': '0'})
+    checkpoint = HashCheckpoint(self.journal)
+    bag = update_bag.Repairable_Bag(path = self.bagdir, checkpoint = checkpoint)
+    self.assertTrue(bag.validate_fixity())
+    self.assertEqual(checkpoint.completed, {})
+    checkpoint.close()
+
+  def test_fresh_run_keeps_journal_until_it_finishes(self):
+    self.interrupted_run({'md5': '0'})
+    checkpoint = HashCheckpoint(self.journal)
+    self.assertFalse(checkpoint.empty())
+    checkpoint.close(remove = checkpoint.empty())
+    checkpoint = HashCheckpoint(self.journal, resume = True)
+    self.assertEqual(len(checkpoint.completed), 1)
+    checkpoint.close()
+    checkpoint = HashCheckpoint(self.journal)
+    bag = update_bag.Repairable_Bag(path = self.bagdir, checkpoint = checkpoint)
+    self.assertTrue(bag.validate_fixity())
+    self.assertTrue(checkpoint.empty())
+    checkpoint.close(remove = checkpoint.empty())
+    self.assertFalse(os.path.exists(self.journal))
+
+  def test_resume_rehashes_changed_files(self):
+    self.interrupted_run({'md5': '0'})
+    with open(j(self.bagdir, 'data/hello.txt'), 'a') as r:
+      r.write('♡')
+    checkpoint = HashCheckpoint(self.journal, resume = True)
+    stat = os.stat(j(self.bagdir, 'data/hello.txt'))
+    self.assertIsNone(checkpoint.lookup(self.bagdir, 'data/hello.txt', stat, ['md5']))
+    checkpoint.close()
+
+  def test_truncated_journal_line(self):
+    self.interrupted_run({'md5': '0'})
+    with open(self.journal, 'a') as f:
+      f.write('{"bag": "')
+    checkpoint = HashCheckpoint(self.journal, resume = True)
+    self.assertEqual(len(checkpoint.completed), 1)
+    checkpoint.close(remove = True)
+    self.assertFalse(os.path.exists(self.journal))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join as j
+import bagit
+
+from ami_bag.manifest_store import ManifestStore
+
+
+def md5(value):
+  return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+
+class TestManifestStore(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.entries = {
+      "data/PreservationMasters/b.mov": {"md5": md5("b"), "sha256": hashlib.sha256(b"b").hexdigest()},
+      "data/PreservationMasters/a.mov": {"md5": md5("a"), "sha256": hashlib.sha256(b"a").hexdigest()},
+      "data/PreservationMasters.txt": {"md5": md5("c")},
+      "data/Metadata/♡.json": {"md5": md5("d"), "sha256": hashlib.sha256(b"d").hexdigest()}
+    }
+    self.store = ManifestStore.from_entries(self.entries)
+
+  def tearDown(self):
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+
+  def test_paths_are_sorted_and_found(self):
+    self.assertEqual(list(self.store), sorted(self.entries))
+    self.assertEqual(len(self.store), 4)
+    for path in self.entries:
+      self.assertIn(path, self.store)
+    self.assertNotIn("data/PreservationMasters/c.mov", self.store)
+    self.assertNotIn("data/Metadata", self.store)
+
+  def test_digests(self):
+    for path, hashes in self.entries.items():
+      self.assertEqual(self.store.get(path), hashes)
+    self.assertIsNone(self.store.get("data/missing"))
+    self.assertEqual(dict(self.store.items()), self.entries)
+
+  def test_all_zero_digest_is_kept(self):
+    store = ManifestStore.from_entries({"data/zero": {"md5": "0" * 32}})
+    self.assertEqual(store.get("data/zero"), {"md5": "0" * 32})
+
+  def test_malformed_digests_are_flagged(self):
+    self.entries["data/PreservationMasters/a.mov"]["md5"] = md5("a")[:-2]
+    self.entries["data/PreservationMasters/b.mov"]["sha256"] = "xy" * 32
+    store = ManifestStore.from_entries(self.entries)
+    self.assertEqual(store.malformed, {
+      "data/PreservationMasters/a.mov": {"md5": md5("a")[:-2]},
+      "data/PreservationMasters/b.mov": {"sha256": "xy" * 32}})
+    self.assertEqual(store.get("data/PreservationMasters/a.mov"),
+      {"sha256": hashlib.sha256(b"a").hexdigest()})
+    self.assertEqual(store.get("data/PreservationMasters/b.mov"), {"md5": md5("b")})
+    self.assertEqual(store.get("data/PreservationMasters.txt"), {"md5": md5("c")})
+
+  def test_directories_are_interned(self):
+    self.assertEqual(self.store.directories(),
+      set(["data", "data/Metadata", "data/PreservationMasters"]))
+    self.assertEqual(len(self.store.dirs), 3)
+    self.assertEqual(self.store.extensions(), set([".mov", ".txt", ".json"]))
+
+  def test_save_and_load(self):
+    sidecar = j(self.tmpdir, 'cache', 'store.bin')
+    self.store.save(sidecar, sources = {"manifest-md5.txt": [1, 2]})
+    loaded, header = ManifestStore.load(sidecar)
+    self.assertEqual(dict(loaded.items()), self.entries)
+    self.assertEqual(header["sources"], {"manifest-md5.txt": [1, 2]})
+    self.assertEqual(loaded.malformed, {})
+
+  def test_truncated_sidecar(self):
+    sidecar = j(self.tmpdir, 'store.bin')
+    self.store.save(sidecar)
+    with open(sidecar, 'r+b') as f:
+      f.truncate(os.path.getsize(sidecar) - 1)
+    with self.assertRaises(ValueError):
+      ManifestStore.load(sidecar)
+
+  def test_for_bag_reloads_changed_manifests(self):
+    bag_path = j(self.tmpdir, 'bag')
+    shutil.copytree('tests/test-data/unbagged', bag_path)
+    bag = bagit.make_bag(bag_path, checksums = ['md5', 'sha256'])
+    sidecar = j(self.tmpdir, 'bag.bin')
+
+    store = ManifestStore.for_bag(bag_path, sidecar)
+    self.assertEqual(dict(store.items()), bag.payload_entries())
+    self.assertTrue(os.path.isfile(sidecar))
+    with open(j(bag_path, 'manifest-md5.txt')) as f:
+      self.assertEqual([line.split() for line in store.manifest_lines('md5')],
+        [line.split() for line in f])
+
+    with open(j(bag_path, 'data', 'new.txt'), 'w') as f:
+      f.write('new')
+    bag.save(manifests = True)
+    store = ManifestStore.for_bag(bag_path, sidecar)
+    self.assertIn('data/new.txt', store)
+
+
+if __name__ == '__main__':
+  unittest.main()
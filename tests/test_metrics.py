@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from ami_metrics.metrics import Metrics, METRICS, measured, collect
+from ami_bag.update_bag import hash_file
+
+
+class TestMetrics(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.metrics = Metrics()
+    self.metrics.enabled = True
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+    METRICS.enabled = False
+    METRICS.reset()
+
+  def test_disabled_records_nothing(self):
+    metrics = Metrics()
+    with metrics.stage("hash", bag = "b1") as record:
+      record["bytes"] += 10
+    self.assertEqual(metrics.stages, {})
+
+  def test_stage_rollups(self):
+    with self.metrics.stage("hash", bag = "b1", path = "b1/data/a") as record:
+      record["bytes"] += 10
+    with self.metrics.stage("hash", bag = "b1", path = "b1/data/b") as record:
+      record["bytes"] += 5
+    self.assertEqual(self.metrics.stages["hash"]["calls"], 2)
+    self.assertEqual(self.metrics.bags["b1"]["hash"]["bytes"], 15)
+    self.assertEqual(self.metrics.files["b1/data/b"]["hash"]["bytes"], 5)
+
+  def test_merge(self):
+    self.metrics.add("hash", 1.0, 100, bag = "b1")
+    other = Metrics()
+    other.enabled = True
+    other.add("hash", 2.0, 50, bag = "b2")
+    self.metrics.merge(other.snapshot())
+    self.assertEqual(self.metrics.stages["hash"]["bytes"], 150)
+    self.assertEqual(self.metrics.stages["hash"]["calls"], 2)
+    self.assertEqual(set(self.metrics.bags.keys()), set(["b1", "b2"]))
+
+  def test_write(self):
+    self.metrics.add("hash", 2.0, 4 * 1024 * 1024, bag = "b1")
+    metrics_path = os.path.join(self.tmpdir, 'metrics.json')
+    self.metrics.write(metrics_path)
+    with open(metrics_path) as f:
+      report = json.load(f)
+    self.assertEqual(report["stages"]["hash"]["mb_per_s"], 2.0)
+    self.assertEqual(report["bags"]["b1"]["hash"]["mb_per_s"], 2.0)
+
+  def test_hash_file_counts_bytes(self):
+    filepath = os.path.join(self.tmpdir, 'file.txt')
+    with open(filepath, 'wb') as f:
+      f.write(b'x' * 1000)
+    METRICS.enabled = True
+    hash_file(filepath, ['md5'], bag = self.tmpdir)
+    self.assertEqual(METRICS.stages["hash"]["bytes"], 1000)
+    self.assertEqual(METRICS.bags[self.tmpdir]["hash"]["calls"], 1)
+    self.assertIn(filepath, METRICS.files)
+
+  def test_measured(self):
+    METRICS.enabled = True
+    pairs = [measured(os.path.join(self.tmpdir, name), True, lambda path:
+      METRICS.add("work", 1.0, bag = path) or path) for name in ["b1", "b2"]]
+    METRICS.reset()
+    results = list(collect(pairs))
+    self.assertEqual(len(results), 2)
+    self.assertEqual(METRICS.stages["work"]["calls"], 2)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join as j
+import bagit
+
+import ami_bag.update_bag as update_bag
+from ami_bag.payload_inventory import PayloadInventory
+
+
+class TestPayloadInventory(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+    shutil.copytree('tests/test-data/json-video-bag', self.tmpdir)
+    bagit.make_bag(self.tmpdir)
+
+  def tearDown(self):
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+
+  def test_inventory_matches_bagit_walk(self):
+    bag = bagit.Bag(self.tmpdir)
+    inventory = PayloadInventory(self.tmpdir)
+    self.assertEqual(sorted(inventory), sorted(bag.payload_files()))
+    self.assertEqual(inventory.oxum(), bag.info['Payload-Oxum'])
+
+  def test_inventory_records_extension_and_size(self):
+    inventory = PayloadInventory(self.tmpdir)
+    sc = inventory.get('data/ServiceCopies/myd_263524_v01_sc.mp4')
+    self.assertEqual(sc.ext, '.mp4')
+    self.assertEqual(sc.size,
+      os.stat(j(self.tmpdir, 'data/ServiceCopies/myd_263524_v01_sc.mp4')).st_size)
+
+  def test_inventory_skips_symlinked_directories(self):
+    os.symlink(j(self.tmpdir, 'data/ServiceCopies'), j(self.tmpdir, 'data/Link'))
+    inventory = PayloadInventory(self.tmpdir)
+    self.assertFalse(any(path.startswith('data/Link/') for path in inventory))
+
+  def test_inventory_lists_broken_symlinks_as_unreadable(self):
+    os.symlink(j(self.tmpdir, 'data/missing.mp4'), j(self.tmpdir, 'data/broken.mp4'))
+    inventory = PayloadInventory(self.tmpdir)
+    self.assertIn('data/broken.mp4', inventory)
+    self.assertEqual(inventory.unreadable, ['data/broken.mp4'])
+    self.assertIsNone(inventory.get('data/broken.mp4').size)
+    self.assertEqual(sorted(inventory), sorted(bagit.Bag(self.tmpdir).payload_files()))
+
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    self.assertFalse(bag.is_valid(fast = True))
+    self.assertEqual(list(bag.payload_files_not_in_manifest()), ['data/broken.mp4'])
+
+  def test_validate_sees_new_files(self):
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    self.assertTrue(bag.is_valid(fast = True))
+    with open(j(self.tmpdir, 'data/Thumbs.db'), 'w') as r:
+      r.write('♡')
+    self.assertFalse(bag.is_valid(fast = True))
+    self.assertEqual(list(bag.payload_files_not_in_manifest()), ['data/Thumbs.db'])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join as j
+import bagit
+
+import ami_bag.update_bag as update_bag
+from ami_bag.premis_journal import (iter_json_array, iter_premis_events,
+  append_premis_events, premis_json_lines)
+
+
+class TestPremisJournal(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.bagdir = j(self.tmpdir, 'bag')
+    shutil.copytree('tests/test-data/unbagged', self.bagdir)
+    bagit.make_bag(self.bagdir)
+
+  def tearDown(self):
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+
+  def add_event(self, bag, process):
+    bag.add_premisevent(process = process, msg = "Just looking around",
+      outcome = "Pass", sw_agent = "update_bag.py")
+
+  def test_iter_json_array_small_reads(self):
+    events = [{"Event-Type": "a{}".format(i), "n": [i, {"x": "]"}]} for i in range(20)]
+    f = io.StringIO(json.dumps(events))
+    self.assertEqual(list(iter_json_array(f, read_size = 7)), events)
+
+  def test_iter_json_array_empty(self):
+    self.assertEqual(list(iter_json_array(io.StringIO(" [ ] "))), [])
+
+  def test_premis_json_lines_match_json_dumps(self):
+    events = [{"a": 1}, {"b": "two"}]
+    self.assertEqual("".join(premis_json_lines(events)), json.dumps(events))
+    self.assertEqual("".join(premis_json_lines([])), json.dumps([]))
+
+  def test_events_append_to_journal(self):
+    bag = update_bag.Repairable_Bag(path = self.bagdir)
+    self.add_event(bag, "First")
+    bag.write_bag_updates()
+    bag = update_bag.Repairable_Bag(path = self.bagdir)
+    self.add_event(bag, "Second")
+    bag.write_bag_updates()
+
+    self.assertFalse(os.path.exists(j(self.bagdir, 'premis-events.json')))
+    with open(j(self.bagdir, 'premis-events.jsonl')) as f:
+      self.assertEqual(len(f.readlines()), 2)
+    self.assertEqual([event['Event-Type'] for event in iter_premis_events(self.bagdir)],
+      ["First", "Second"])
+    self.assertTrue(update_bag.Repairable_Bag(path = self.bagdir).validate())
+
+  def test_truncated_journal_line_is_skipped(self):
+    append_premis_events(self.bagdir, [{"Event-Type": "First"}])
+    with open(j(self.bagdir, 'premis-events.jsonl'), 'a') as f:
+      f.write('{"Event-Type": "Sec')
+    self.assertEqual([event['Event-Type'] for event in iter_premis_events(self.bagdir)],
+      ["First"])
+
+  def test_compaction_round_trip(self):
+    with open(j(self.bagdir, 'premis-events.json'), 'w') as f:
+      json.dump([{"Event-Type": "Old"}], f)
+    bag = update_bag.Repairable_Bag(path = self.bagdir)
+    self.add_event(bag, "New")
+    bag.write_bag_updates()
+    self.assertEqual(len(bag.premis_events), 2)
+
+    bag = update_bag.Repairable_Bag(path = self.bagdir)
+    self.add_event(bag, "Pending")
+    self.assertTrue(bag.compact_premisjson())
+
+    self.assertFalse(os.path.exists(j(self.bagdir, 'premis-events.jsonl')))
+    with open(j(self.bagdir, 'premis-events.json')) as f:
+      self.assertEqual([event['Event-Type'] for event in json.load(f)],
+        ["Old", "New", "Pending"])
+    with open(j(self.bagdir, 'tagmanifest-sha256.txt')) as f:
+      tagmanifest = f.read()
+    self.assertIn(" premis-events.json\n", tagmanifest)
+    self.assertNotIn("premis-events.jsonl", tagmanifest)
+    self.assertTrue(update_bag.Repairable_Bag(path = self.bagdir).validate())
+
+  def test_iter_events_filters(self):
+    bag = update_bag.Repairable_Bag(path = self.bagdir)
+    self.add_event(bag, "First")
+    bag.write_bag_updates()
+    bag = update_bag.Repairable_Bag(path = self.bagdir)
+    self.add_event(bag, "Second")
+    self.assertEqual([event['Event-Type'] for event in
+      bag.iter_premis_events(event_type = "Second")], ["Second"])
+    self.assertEqual(len(list(bag.iter_premis_events(since = "99991231000000"))), 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from os.path import join as j
+import bagit
+
+from ami_bag.results_store import ResultsStore, bag_digest, fixity_level
+
+
+class TestResultsStore(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.bagdir = j(self.tmpdir, 'bag')
+    shutil.copytree('tests/test-data/unbagged', self.bagdir)
+    bagit.make_bag(self.bagdir, checksums = ['md5'])
+    self.store = ResultsStore(j(self.tmpdir, 'store', 'results.sqlite'))
+
+  def tearDown(self):
+    self.store.close()
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+
+  def result(self, valid = True):
+    return {"bag": "bag", "path": self.bagdir, "valid": valid,
+      "type": "json", "subtype": "video", "error": None, "seconds": 1.5}
+
+  def test_digest_follows_manifests(self):
+    digest = bag_digest(self.bagdir)
+    self.assertEqual(digest, bag_digest(self.bagdir))
+    with open(j(self.bagdir, 'data', 'hello.txt'), 'a') as f:
+      f.write('payload changes alone do not change the key')
+    self.assertEqual(digest, bag_digest(self.bagdir))
+    with open(j(self.bagdir, 'bag-info.txt'), 'a') as f:
+      f.write('Contact-Name: Someone\n')
+    self.assertNotEqual(digest, bag_digest(self.bagdir))
+
+  def test_fixity_level(self):
+    self.assertEqual(fixity_level(True), "none")
+    self.assertEqual(fixity_level(True, 0.05), "sample")
+    self.assertEqual(fixity_level(False, 0.05), "full")
+    self.assertEqual(fixity_level(True, 0.05, quick = True), "quick")
+    self.assertEqual(fixity_level(False, unbounded_cache = True), "quick")
+
+  def test_lookup_needs_a_passing_run_at_the_same_level(self):
+    digest = bag_digest(self.bagdir)
+    self.store.record(self.result(), digest, "sample", False,
+      {"bag": None, "filenames": None})
+    self.assertTrue(self.store.lookup(self.bagdir, digest, "none", False))
+    self.assertTrue(self.store.lookup(self.bagdir, digest, "sample", False))
+    self.assertIsNone(self.store.lookup(self.bagdir, digest, "full", False))
+    self.assertIsNone(self.store.lookup(self.bagdir, digest, "none", True))
+    self.assertIsNone(self.store.lookup(self.bagdir, "other", "none", False))
+
+  def test_failed_runs_are_not_reused(self):
+    digest = bag_digest(self.bagdir)
+    self.store.record(self.result(valid = False), digest, "full", True,
+      {"filenames": "Non-standard filenames"})
+    self.assertIsNone(self.store.lookup(self.bagdir, digest, "none", False))
+
+  def test_history(self):
+    digest = bag_digest(self.bagdir)
+    self.store.record(self.result(valid = False), digest, "none", False,
+      {"filenames": "Non-standard filenames"})
+    self.store.record(self.result(), digest, "full", False, {"filenames": None})
+    history = self.store.history(self.bagdir)
+    self.assertEqual([result["valid"] for result in history], [True, False])
+    self.assertEqual(history[1]["checks"], {"filenames": "Non-standard filenames"})
+    self.assertEqual(len(self.store.history(limit = 1)), 1)
+    self.assertEqual(self.store.history("elsewhere"), [])
+
+
+if __name__ == '__main__':
+  unittest.main()
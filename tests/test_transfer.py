@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join as j
+import bagit
+
+from ami_bag.transfer import transfer_bag, partial_path, copy_file
+from ami_bag.fixity_cache import FixityCache
+from ami_bag.update_bag import Repairable_Bag
+
+
+class TestTransfer(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.bag_path = j(self.tmpdir, 'source', 'bag')
+    shutil.copytree('tests/test-data/unbagged', self.bag_path)
+    bagit.make_bag(self.bag_path, checksums = ['md5', 'sha256'])
+    self.destination = j(self.tmpdir, 'destination', 'bag')
+    os.makedirs(os.path.dirname(self.destination))
+
+  def tearDown(self):
+    if os.path.isdir(self.tmpdir):
+      shutil.rmtree(self.tmpdir)
+
+  def test_transfer_bag(self):
+    summary = transfer_bag(self.bag_path, self.destination, threads = 2)
+    self.assertFalse(os.path.exists(partial_path(self.destination)))
+    copied = Repairable_Bag(path = self.destination)
+    self.assertTrue(copied.validate())
+    self.assertEqual(copied.payload_entries(),
+      Repairable_Bag(path = self.bag_path).payload_entries())
+    self.assertEqual(summary["files"], len(os.listdir(self.bag_path)) - 1 +
+      len(copied.payload_entries()))
+    events = list(copied.iter_premis_events(event_type = "Bag Transfer"))
+    self.assertEqual(len(events), 1)
+
+  def test_mismatch_is_not_renamed_into_place(self):
+    with open(j(self.bag_path, 'data', 'hello.txt'), 'r+') as f:
+      contents = f.read()
+      f.seek(0)
+      f.write(contents.upper())
+    with self.assertRaises(bagit.BagValidationError) as cm:
+      transfer_bag(self.bag_path, self.destination)
+    self.assertEqual(set(e.path for e in cm.exception.details),
+      set(['data/hello.txt']))
+    self.assertFalse(os.path.exists(self.destination))
+    self.assertFalse(os.path.exists(j(partial_path(self.destination),
+      'data', 'hello.txt')))
+
+  def test_threaded_transfer_reports_every_mismatch(self):
+    for name in ('a.txt', 'b.txt', 'c.txt'):
+      with open(j(self.bag_path, 'data', name), 'w') as f:
+        f.write(name)
+    Repairable_Bag(path = self.bag_path).add_payload_files_not_in_manifest()
+    for name in ('a.txt', 'c.txt'):
+      with open(j(self.bag_path, 'data', name), 'w') as f:
+        f.write(name.upper())
+    with self.assertRaises(bagit.BagValidationError) as cm:
+      transfer_bag(self.bag_path, self.destination, threads = 4)
+    self.assertEqual(set(e.path for e in cm.exception.details),
+      set(['data/a.txt', 'data/c.txt']))
+    self.assertFalse(os.path.exists(self.destination))
+    self.assertTrue(os.path.isfile(j(partial_path(self.destination),
+      'data', 'b.txt')))
+
+  def test_incomplete_source_is_refused(self):
+    with open(j(self.bag_path, 'data', 'untracked.txt'), 'w') as f:
+      f.write('untracked')
+    with self.assertRaises(bagit.BagValidationError):
+      transfer_bag(self.bag_path, self.destination)
+    self.assertFalse(os.path.exists(partial_path(self.destination)))
+
+  def test_existing_destination_is_refused(self):
+    os.makedirs(self.destination)
+    with self.assertRaises(bagit.BagError):
+      transfer_bag(self.bag_path, self.destination)
+
+  def test_resume_skips_verified_files(self):
+    partial = partial_path(self.destination)
+    os.makedirs(j(partial, 'data'))
+    shutil.copy2(j(self.bag_path, 'data', 'hello.txt'), j(partial, 'data', 'hello.txt'))
+    with open(j(partial, 'data', '.stale.tmp'), 'w') as f:
+      f.write('stale')
+    summary = transfer_bag(self.bag_path, self.destination)
+    self.assertEqual(summary["resumed"], 1)
+    self.assertFalse(os.path.exists(j(self.destination, 'data', '.stale.tmp')))
+    self.assertTrue(Repairable_Bag(path = self.destination).validate())
+
+  def test_copy_methods(self):
+    src = j(self.bag_path, 'data', 'hello.txt')
+    expected = Repairable_Bag(path = self.bag_path).entries['data/hello.txt']
+    for method in ('auto', 'reflink', 'copy_file_range', 'stream'):
+      tmp_path, hashes, used = copy_file(src, j(self.tmpdir, 'hello.txt'),
+        ['md5'], method = method)
+      try:
+        self.assertEqual(hashes, {'md5': expected['md5']})
+        if method != 'auto':
+          self.assertIn(used, (method, 'stream'))
+        with open(tmp_path, 'rb') as f, open(src, 'rb') as g:
+          self.assertEqual(f.read(), g.read())
+        self.assertEqual(os.stat(tmp_path).st_mtime_ns, os.stat(src).st_mtime_ns)
+      finally:
+        os.remove(tmp_path)
+
+  def test_size_policy_skips_hashing_kernel_copies(self):
+    tmp_path, hashes, used = copy_file(j(self.bag_path, 'data', 'hello.txt'),
+      j(self.tmpdir, 'hello.txt'), ['md5'], verify = 'size')
+    os.remove(tmp_path)
+    if used == 'stream':
+      self.assertIsNotNone(hashes)
+    else:
+      self.assertIsNone(hashes)
+
+    summary = transfer_bag(self.bag_path, self.destination, method = 'stream',
+      verify = 'none')
+    self.assertEqual(summary["methods"]["stream"], summary["files"])
+    self.assertTrue(Repairable_Bag(path = self.destination).validate())
+
+  def test_full_policy_hashes_kernel_copies(self):
+    with open(j(self.bag_path, 'data', 'hello.txt'), 'a') as f:
+      f.write('!')
+    bag = Repairable_Bag(path = self.bag_path)
+    bag.info["Payload-Oxum"] = bag.inventory.oxum()
+    bagit._make_tag_file(j(self.bag_path, 'bag-info.txt'), bag.info)
+    with self.assertRaises(bagit.BagValidationError):
+      transfer_bag(self.bag_path, self.destination, method = 'copy_file_range')
+
+  def test_records_digests_of_copies(self):
+    cache = FixityCache(j(self.tmpdir, 'fixity.sqlite'))
+    try:
+      transfer_bag(self.bag_path, self.destination, fixity_cache = cache)
+      stat = os.stat(j(self.destination, 'data', 'hello.txt'))
+      self.assertEqual(cache.lookup(self.destination, 'data/hello.txt', stat, ['md5']),
+        {'md5': Repairable_Bag(path = self.bag_path).entries['data/hello.txt']['md5']})
+    finally:
+      cache.close()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -10,6 +10,7 @@ import stat
 import sys
 import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from os.path import join as j
 import bagit
 
@@ -113,6 +114,58 @@ class TestSingleProcessValidation(unittest.TestCase):
     self.assertEqual(bag.entries["data/hello.txt"], updated_bag.entries["data/hello.txt"])
     self.assertTrue(self.validate(updated_bag))
 
+  def test_generate_hashes_matches_manifest(self):
+    bagit.make_bag(self.tmpdir, checksum=['md5', 'sha256'])
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    payload_entries = bag.payload_entries()
+    self.assertEqual(bag.generate_hashes(payload_entries.keys()), payload_entries)
+    self.assertEqual(bag.generate_hashes(payload_entries.keys(), threads = 4), payload_entries)
+
+  def test_update_hashes_with_threads(self):
+    bagit.make_bag(self.tmpdir, checksum=['sha1', 'sha256'])
+    bag = update_bag.Repairable_Bag(path = self.tmpdir, hash_threads = 4)
+    f = j(self.tmpdir, "data/hello.txt")
+    with open(f, 'w') as r:
+      r.write('♡')
+    bag.update_hashes()
+    updated_bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    self.assertTrue(self.validate(updated_bag))
+
+  def test_repairs_leave_working_directory(self):
+    bagit.make_bag(self.tmpdir, checksum=['sha1'])
+    cwd = os.getcwd()
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    with open(j(self.tmpdir, "data/hello.txt"), 'w') as r:
+      r.write('♡')
+    with open(j(self.tmpdir, "data/new.txt"), 'w') as r:
+      r.write('new')
+    with open(j(self.tmpdir, "data/.DS_Store"), 'w') as r:
+      r.write('ds')
+    bag.delete_payload_files_not_in_manifest()
+    bag.add_payload_files_not_in_manifest()
+    bag.update_hashes()
+    self.assertEqual(os.getcwd(), cwd)
+    self.assertFalse(os.path.exists(j(self.tmpdir, "data/.DS_Store")))
+    self.assertTrue(self.validate(update_bag.Repairable_Bag(path = self.tmpdir)))
+
+  def test_repair_bags_on_threads(self):
+    bag_paths = []
+    for i in range(4):
+      bag_path = j(self.tmpdir, "bag{}".format(i))
+      shutil.copytree('tests/test-data/unbagged', bag_path)
+      bagit.make_bag(bag_path, checksum=['md5', 'sha256'])
+      with open(j(bag_path, "data/hello.txt"), 'w') as r:
+        r.write(str(i))
+      bag_paths.append(bag_path)
+
+    def repair(bag_path):
+      update_bag.Repairable_Bag(path = bag_path).update_hashes()
+
+    with ThreadPoolExecutor(max_workers = 4) as executor:
+      list(executor.map(repair, bag_paths))
+    for bag_path in bag_paths:
+      self.assertTrue(self.validate(update_bag.Repairable_Bag(path = bag_path)))
+
   def test_delete_payload_files_not_in_manifest(self):
     bagit.make_bag(self.tmpdir)
     bag = update_bag.Repairable_Bag(path = self.tmpdir)
@@ -147,6 +200,86 @@ class TestSingleProcessValidation(unittest.TestCase):
     self.assertEqual(list(updated_bag.payload_files_not_in_manifest()), ['data/._.SYSTEMFILE.db\r'])
     self.assertRaises(bagit.BagValidationError, bag.validate, updated_bag, fast=False)
 
+  def test_diff_payload(self):
+    bagit.make_bag(self.tmpdir)
+    os.rename(j(self.tmpdir, "data/hello.txt"), j(self.tmpdir, "data/hi.txt"))
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    diff = bag.diff_payload()
+    self.assertEqual(diff.new, ["data/hi.txt"])
+    self.assertEqual(diff.missing, ["data/hello.txt"])
+    self.assertIs(bag.diff_payload(), diff)
+
+  def test_diff_payload_with_snapshot(self):
+    bagit.make_bag(self.tmpdir)
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    stat = os.stat(j(self.tmpdir, "data/hello.txt"))
+    diff = bag.diff_payload(snapshot = {"data/hello.txt": (stat.st_size + 1, stat.st_mtime_ns)})
+    self.assertEqual(diff.size_changed, ["data/hello.txt"])
+    diff = bag.diff_payload(snapshot = {"data/hello.txt": (stat.st_size, stat.st_mtime_ns - 1)})
+    self.assertEqual(diff.mtime_changed, ["data/hello.txt"])
+
+  def test_validate_quick_hashes_changed_files(self):
+    bagit.make_bag(self.tmpdir)
+    stat = os.stat(j(self.tmpdir, "data/hello.txt"))
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    self.assertEqual(bag.validate_quick()["hashed"], 1)
+    snapshot = {"data/hello.txt": (stat.st_size, stat.st_mtime_ns)}
+    self.assertEqual(bag.validate_quick(snapshot = snapshot)["hashed"], 0)
+
+    with open(j(self.tmpdir, "data/hello.txt"), 'w') as r:
+      r.write('♡')
+    bag.refresh_inventory()
+    self.assertRaises(bagit.BagValidationError, bag.validate_quick,
+      snapshot = snapshot)
+    self.assertEqual(bag.quick_summary["hashed"], 1)
+
+  def test_diff_payload_modified_after_manifest(self):
+    bagit.make_bag(self.tmpdir)
+    manifest_mtime = os.stat(j(self.tmpdir, "manifest-sha256.txt")).st_mtime
+    os.utime(j(self.tmpdir, "data/hello.txt"), (manifest_mtime + 10, manifest_mtime + 10))
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    self.assertEqual(bag.diff_payload().mtime_changed, ["data/hello.txt"])
+
+  def test_remove_manifest_entry(self):
+    bagit.make_bag(self.tmpdir, checksum=['md5', 'sha256'])
+    os.remove(j(self.tmpdir, "data/hello.txt"))
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    self.assertTrue(bag.remove_manifest_entry("data/hello.txt"))
+    bag.write_bag_updates()
+    updated_bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    self.assertEqual(updated_bag.payload_entries(), {})
+    self.assertTrue(self.validate(updated_bag))
+
+  def test_tag_manifest_keeps_untouched_lines(self):
+    bagit.make_bag(self.tmpdir)
+    with open(j(self.tmpdir, "tagmanifest-sha256.txt")) as f:
+      bagit_line = [line for line in f if line.endswith(" bagit.txt\n")]
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    f = j(self.tmpdir, "data/hello.txt")
+    with open(f, 'w') as r:
+      r.write('♡')
+    bag.update_hashes()
+    with open(j(self.tmpdir, "tagmanifest-sha256.txt")) as f:
+      tagmanifest = f.readlines()
+    self.assertIn(bagit_line[0], tagmanifest)
+    self.assertTrue(any(line.endswith(" premis-events.jsonl\n") for line in tagmanifest))
+    self.assertEqual([x for x in os.listdir(self.tmpdir) if x.startswith(".")], [])
+    updated_bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    self.assertTrue(self.validate(updated_bag))
+
+  def test_tag_manifest_rehashes_externally_edited_tag_files(self):
+    bagit.make_bag(self.tmpdir)
+    with open(j(self.tmpdir, "bag-info.txt"), 'a') as f:
+      f.write("Contact-Name: Someone\n")
+    bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    with open(j(self.tmpdir, "data/hello.txt"), 'r+') as r:
+      contents = r.read()
+      r.seek(0)
+      r.write(contents[::-1])
+    bag.update_hashes()
+    updated_bag = update_bag.Repairable_Bag(path = self.tmpdir)
+    self.assertTrue(self.validate(updated_bag))
+
   def test_record_premis_events(self):
     bagit.make_bag(self.tmpdir)
     bag = update_bag.Repairable_Bag(path = self.tmpdir)